@@ -0,0 +1,295 @@
+# Round 1B analysis stages shared by the persona-query and search endpoints.
+# Inference runs in the thread pool and TextRank in the process pool, so none
+# of these block the event loop.
+import asyncio
+import time
+import numpy as np
+from pymongo import ReplaceOne, UpdateOne
+from app.executors import run_inference, run_cpu, cpu_workers
+from app.scheduler import DEGRADED_TEXT_CHARS, stage_costs, split_by_cost
+from pdf_pipeline.persona_encoder import cached_query_embedding, compute_query_embedding
+from pdf_pipeline.relevance import encode_section_chunks, score_sections, is_scorable, SECTION_SCORING
+from pdf_pipeline.summarize import summarize_sections, lead_sentences
+from pdf_pipeline.embedding_store import model_hash, text_hash, embedding_docs, match_section_vectors
+from pdf_pipeline.vector_index import get_index, update_index, top_k as top_k_indices
+from pdf_pipeline.metrics import timer, errors_total
+from pdf_pipeline.bulk_writer import current_filter
+
+
+async def query_embedding(text):
+    """Persona/job or search query embedding; a cache hit skips the inference pool."""
+    embedding = cached_query_embedding(text)
+    if embedding is None:
+        embedding = await run_inference(compute_query_embedding, text)
+    return embedding
+
+
+async def pdf_filter(db, pdf_name):
+    """Query for the documents of the ingest a PDF's outline points at, see bulk_writer.current_filter."""
+    outline = await db.outlines.find_one({"pdf_name": pdf_name}, {"ingest_id": 1})
+    return current_filter(pdf_name, outline and outline.get("ingest_id"))
+
+
+async def load_section_embeddings(db, pdf_name, sections, deadline=None, with_chunks=False):
+    """
+    Load the stored embeddings for a PDF's sections, re-encoding (and storing)
+    only those whose vector is missing or was computed from other text or model.
+    If re-encoding the full texts would not fit the deadline, truncated texts
+    are encoded instead and those vectors are not stored.
+    With with_chunks, returns (vectors, chunk matrices per section) for max-sim scoring.
+    Embeddings are read from, and stored under, the sections' ingest.
+    """
+    ingest_id = sections[0].get("ingest_id") if sections else None
+    query = current_filter(pdf_name, ingest_id)
+    cursor = db.embeddings.find({**query, "model_hash": model_hash()})
+    vectors, stale, chunks = match_section_vectors(sections, [doc async for doc in cursor], with_chunks=True)
+    if stale:
+        stale_sections = [sections[i] for i in stale]
+        texts = [s["text"] for s in stale_sections]
+        chars = sum(len(text) for text in texts)
+        degraded = deadline is not None and not deadline.fits("encode", chars)
+        if degraded:
+            texts = [text[:DEGRADED_TEXT_CHARS] for text in texts]
+            deadline.degrade("truncated_section_text", sections=len(texts), chars=DEGRADED_TEXT_CHARS)
+        start = time.perf_counter()
+        fresh, fresh_chunks = await run_inference(encode_section_chunks, texts)
+        stage_costs.observe("encode", sum(len(text) for text in texts), time.perf_counter() - start)
+        for i, vector, vector_chunks in zip(stale, fresh, fresh_chunks):
+            vectors[i] = vector
+            chunks[i] = vector_chunks
+        if degraded:
+            return (np.vstack(vectors), chunks) if with_chunks else np.vstack(vectors)
+        await db.embeddings.bulk_write([
+            ReplaceOne({**query, "section_id": doc["section_id"]}, dict(doc, **query), upsert=True)
+            for doc in embedding_docs(pdf_name, stale_sections, fresh, fresh_chunks)
+        ], ordered=False)
+        await run_inference(update_index, pdf_name, [s["section_id"] for s in stale_sections], fresh, replace=False)
+    return (np.vstack(vectors), chunks) if with_chunks else np.vstack(vectors)
+
+
+async def load_sections(db, pdf_name):
+    """Sections of a PDF with enough text to be worth ranking."""
+    cursor = db.sections.find(await pdf_filter(db, pdf_name))
+    return [doc async for doc in cursor if is_scorable(doc.get("text"))]
+
+
+async def ensure_indexed(db, pdf_names=None):
+    """
+    Add any PDF missing from the vector index (e.g. ingested before it
+    existed, or indexed with another model). Without pdf_names, every
+    ingested PDF is checked, but only when the index may be missing some.
+    """
+    index = get_index()
+    backfill = pdf_names is None
+    if backfill:
+        if not index.needs_backfill:
+            return index
+        pdf_names = await db.outlines.distinct("pdf_name")
+    for pdf_name in pdf_names:
+        if not index.has_pdf(pdf_name):
+            sections = await load_sections(db, pdf_name)
+            if sections:
+                vectors = await load_section_embeddings(db, pdf_name, sections)
+                index = await run_inference(update_index, pdf_name, [s["section_id"] for s in sections], vectors)
+    index = get_index()
+    if backfill:
+        index.needs_backfill = False
+    return index
+
+
+async def fetch_hit_sections(db, hits):
+    """Section documents for (pdf_name, section_id, score) search hits, in hit order."""
+    wanted = {}
+    for pdf_name, section_id, _ in hits:
+        wanted.setdefault(pdf_name, []).append(section_id)
+    found = {}
+    for pdf_name, section_ids in wanted.items():
+        query = {**await pdf_filter(db, pdf_name), "section_id": {"$in": section_ids}}
+        async for doc in db.sections.find(query):
+            found[(pdf_name, doc["section_id"])] = doc
+    return [(found[(p, s)], score) for p, s, score in hits if (p, s) in found]
+
+
+def section_title(meta):
+    # Extract section title (first 100 chars)
+    title = meta.get("text", "")[:100]
+    if len(title) == 100:
+        title += "..."
+    return title
+
+
+async def stored_summaries(db, hashes, sentences_count=2):
+    """Summaries already in `summaries` for the given text hashes."""
+    cursor = db.summaries.find({"text_hash": {"$in": list(set(hashes))}, "sentences_count": sentences_count})
+    return {doc["text_hash"]: doc["summary_text"] async for doc in cursor}
+
+
+async def summarize_batches(texts, sentences_count=2, deadline=None):
+    """
+    TextRank summaries of texts, None for those not done by the deadline.
+    Work in the process pool cannot be cancelled, so instead of one batch
+    under a timeout, texts are submitted in batches of about CPU_BATCH_SECONDS
+    of estimated work, one per worker at a time, and none once the deadline
+    has passed: at most one batch per worker outlives it.
+    """
+    results = [None] * len(texts)
+    batches = split_by_cost(texts, "summarize")
+    pending = {}
+    start = time.perf_counter()
+    done_chars = 0
+    try:
+        while batches or pending:
+            while batches and len(pending) < cpu_workers() and (deadline is None or deadline.remaining() > 0):
+                batch = batches.pop(0)
+                future = asyncio.ensure_future(run_cpu(summarize_sections, [texts[i] for i in batch], sentences_count))
+                pending[future] = batch
+            if not pending:
+                break
+            done, _ = await asyncio.wait(pending, timeout=deadline.remaining() if deadline is not None else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                batch = pending.pop(future)
+                for i, summary in zip(batch, future.result()):
+                    results[i] = summary
+                done_chars += sum(len(texts[i]) for i in batch)
+    finally:
+        # Batches still queued are dropped; running ones finish in the background
+        for future in pending:
+            future.cancel()
+    stage_costs.observe("summarize", done_chars, time.perf_counter() - start)
+    return results
+
+
+async def summarize_metas(db, metas, sentences_count=2, deadline=None, stored=None):
+    """
+    TextRank summaries for the given section documents. Summaries are stored
+    in `summaries` keyed by section text hash and sentence count, so only
+    texts never summarized before are sent, as one batch, to the process pool.
+    With a deadline, metas should come highest value first: texts that no
+    longer fit are summarized from truncated text or by their lead sentences.
+    """
+    hashes = [text_hash(meta["text"]) for meta in metas]
+    summaries = dict(stored) if stored is not None else await stored_summaries(db, hashes, sentences_count)
+    missing = {}
+    for h, meta in zip(hashes, metas):
+        if h not in summaries:
+            missing.setdefault(h, meta["text"])
+    if missing:
+        texts = list(missing.values())
+        modes = deadline.plan_summaries(texts) if deadline is not None else ["full"] * len(texts)
+        run = [i for i, mode in enumerate(modes) if mode != "lead"]
+        inputs = [texts[i] if modes[i] == "full" else texts[i][:DEGRADED_TEXT_CHARS] for i in run]
+        fresh = [None] * len(texts)
+        if run:
+            try:
+                # Step 6: Summarize using TextRank (sumy); timed here, since it runs in another process
+                with timer("summarize_sections"):
+                    results = await summarize_batches(inputs, sentences_count, deadline)
+                for i, summary in zip(run, results):
+                    fresh[i] = summary
+                late = results.count(None)
+                if late:
+                    deadline.degrade("lead_sentence_summaries", sections=late)
+            except Exception as e:
+                print(f"Summarization failed: {e}")
+                errors_total.inc(stage="summarize_sections")
+        updates = []
+        for h, text, summary, mode in zip(missing, texts, fresh, modes):
+            if summary is None:
+                # If summarization fails, use first few sentences (not stored)
+                summaries[h] = lead_sentences(text, sentences_count)
+                continue
+            summaries[h] = summary
+            if mode != "full":
+                continue
+            updates.append(UpdateOne(
+                {"text_hash": h, "sentences_count": sentences_count},
+                {"$set": {"summary_text": summary}},
+                upsert=True
+            ))
+        if updates:
+            await db.summaries.bulk_write(updates, ordered=False)
+    return [summaries[h] for h in hashes]
+
+
+def section_result(pdf_name, meta, rank, refined_text):
+    """
+    Build the Round 1B extracted_sections and sub_section_analysis entries
+    for one ranked section.
+    """
+    # 1. Extracted Section (Round 1B format)
+    extracted = {
+        "document": pdf_name,
+        "page_number": meta.get("page_start", 0),
+        "section_title": section_title(meta),
+        "importance_rank": rank
+    }
+    # 2. Sub-section Analysis (Round 1B format)
+    analysis = {
+        "document": pdf_name,
+        "refined_text": refined_text,
+        "page_number_constraints": {
+            "start": meta.get("page_start", 0),
+            "end": meta.get("page_end", meta.get("page_start", 0))
+        }
+    }
+    return extracted, analysis
+
+
+def reduce_top_k(ranked, deadline):
+    """
+    Keep only the better half of the ranks (at least rank 1) when the deadline
+    is close, so fewer sections are fetched, summarized and returned.
+    """
+    top_k = max((rank for _, _, rank, _ in ranked), default=0)
+    if not deadline.tight() or top_k <= 1:
+        return ranked
+    reduced = max(1, top_k // 2)
+    deadline.degrade("reduced_top_k", top_k=reduced, requested_top_k=top_k)
+    return [entry for entry in ranked if entry[2] <= reduced]
+
+
+async def section_results(db, ranked, deadline=None):
+    """
+    (extracted, analysis) pairs for ranked (pdf_name, meta, rank, score) entries,
+    summarizing all of them in one batch, highest scores first.
+    """
+    if deadline is not None:
+        ranked = reduce_top_k(ranked, deadline)
+    order = sorted(range(len(ranked)), key=lambda i: -ranked[i][3])
+    summaries = await summarize_metas(db, [ranked[i][1] for i in order], sentences_count=2, deadline=deadline)
+    by_entry = dict(zip(order, summaries))
+    return [section_result(pdf_name, meta, rank, by_entry[i]) for i, (pdf_name, meta, rank, _) in enumerate(ranked)]
+
+
+async def rank_document(db, pdf_name, persona_emb, top_k, deadline=None):
+    """
+    Rank one PDF's sections against the persona embedding.
+    Returns the top_k (pdf_name, meta, rank, score) entries, or None if the PDF has no usable sections.
+    """
+    # Step 2: Fetch sections from MongoDB
+    section_metas = await load_sections(db, pdf_name)
+    if not section_metas:
+        return None
+    # Step 3: Load section embeddings stored at ingest (MiniLM-L6-v2)
+    if SECTION_SCORING == "maxsim":
+        section_embs, section_chunks = await load_section_embeddings(db, pdf_name, section_metas, deadline, with_chunks=True)
+    else:
+        section_embs, section_chunks = await load_section_embeddings(db, pdf_name, section_metas, deadline), None
+    # Step 4: Score sections using cosine similarity (of the best chunk with max-sim)
+    scores = score_sections(persona_emb, section_embs, section_chunks)
+    # Step 5: Rank the top sections
+    return [(pdf_name, section_metas[i], rank, float(scores[i])) for rank, i in enumerate(top_k_indices(scores, top_k), 1)]
+
+
+async def rank_global(db, pdf_names, persona_emb, top_k, search_mode="exact"):
+    """
+    One top-k search across all the given PDFs through the vector index.
+    Returns (pdf_name, meta, rank, score) entries ranked globally.
+    """
+    index = await ensure_indexed(db, pdf_names)
+    hits = index.search(persona_emb, k=top_k, pdf_names=pdf_names, mode=search_mode)
+    ranked = await fetch_hit_sections(db, hits)
+    return [(meta["pdf_name"], meta, rank, score) for rank, (meta, score) in enumerate(ranked, 1)]
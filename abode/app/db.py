@@ -1,14 +1,59 @@
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
+from pdf_pipeline.metrics import MongoCommandMetrics
+from pdf_pipeline.mongo_models import MODELS, check_coverage, DUPLICATE_OUTLINES, older_outline_ids, legacy_outline_index
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "abode")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+# Create missing indexes when the app starts
+CREATE_INDEXES = os.getenv("CREATE_INDEXES", "true").lower() in ("1", "true", "yes")
 
-client = AsyncIOMotorClient(MONGO_URI)
+# A single pooled client shared by every request
+client = AsyncIOMotorClient(MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE, event_listeners=[MongoCommandMetrics()])
 db = client[DB_NAME]
 
 def get_db():
-    return db 
\ No newline at end of file
+    return db
+
+async def migrate_outlines(db):
+    """Motor counterpart of mongo_models.migrate_outlines."""
+    ids = older_outline_ids(await db.outlines.aggregate(DUPLICATE_OUTLINES).to_list(None))
+    if ids:
+        await db.outlines.delete_many({"_id": {"$in": ids}})
+    legacy = legacy_outline_index(await db.outlines.index_information())
+    if legacy:
+        await db.outlines.drop_index(legacy)
+    return len(ids)
+
+async def bootstrap_indexes(db):
+    """
+    Create the indexes of every model in pdf_pipeline.mongo_models (existing
+    ones are left alone) and print any query shape they leave uncovered.
+    Runs in the background at startup so a slow build never delays serving.
+    """
+    problems = []
+    try:
+        deleted = await migrate_outlines(db)
+        if deleted:
+            print(f"Index check: deleted {deleted} older duplicate outlines")
+        for model in MODELS:
+            try:
+                await db[model.collection_name].create_indexes(model.indexes)
+            except OperationFailure as e:
+                # e.g. an index of the same name with other options
+                problems.append(f"Could not create {model.collection_name} indexes: {e}")
+        info = {model.collection_name: await db[model.collection_name].index_information() for model in MODELS}
+    except ServerSelectionTimeoutError as e:
+        print(f"Index check skipped, MongoDB unreachable: {e}")
+        return None
+    problems += check_coverage(info)
+    for problem in problems:
+        print(f"Index check: {problem}")
+    if not problems:
+        print("Index check: every query shape is covered")
+    return problems
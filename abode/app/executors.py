@@ -0,0 +1,114 @@
+import asyncio
+import contextvars
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from fastapi import HTTPException
+
+# Threads running torch inference (MiniLM / DistilBERT) off the event loop
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "2"))
+# Worker processes for pure-Python CPU work such as TextRank; 0 runs it in the inference threads
+CPU_PROCESSES = int(os.getenv("CPU_PROCESSES", "2"))
+# Analyses allowed to run at once, and how many more may wait before getting a 429
+MAX_CONCURRENT_ANALYSES = int(os.getenv("MAX_CONCURRENT_ANALYSES", "2"))
+MAX_QUEUED_ANALYSES = int(os.getenv("MAX_QUEUED_ANALYSES", "8"))
+
+_inference_pool = None
+_cpu_pool = None
+
+
+def get_inference_pool():
+    global _inference_pool
+    if _inference_pool is None:
+        _inference_pool = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix="inference")
+    return _inference_pool
+
+
+def get_cpu_pool():
+    global _cpu_pool
+    if _cpu_pool is None:
+        if CPU_PROCESSES <= 0:
+            return get_inference_pool()
+        # spawn, not fork: forking a process that already runs torch threads can deadlock
+        _cpu_pool = ProcessPoolExecutor(max_workers=CPU_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _cpu_pool
+
+
+async def run_inference(fn, *args, **kwargs):
+    """Run a model call in the inference thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context into the thread, so stage timings reach its request
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_inference_pool(), partial(context.run, fn, *args, **kwargs))
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run a picklable CPU-bound function in the process pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_pool(), partial(fn, *args, **kwargs))
+
+
+def cpu_workers():
+    """Tasks the CPU pool runs at once."""
+    return CPU_PROCESSES if CPU_PROCESSES > 0 else INFERENCE_THREADS
+
+
+def shutdown_executors():
+    global _inference_pool, _cpu_pool
+    for pool in (_cpu_pool, _inference_pool):
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    _inference_pool = _cpu_pool = None
+
+
+class AnalysisLimiter:
+    """
+    Caps the number of analyses running at once. Requests beyond the cap wait
+    in a bounded queue; once that is full they are rejected with a 429.
+    """
+
+    def __init__(self, max_running=MAX_CONCURRENT_ANALYSES, max_queued=MAX_QUEUED_ANALYSES):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.running = 0
+        self.waiting = 0
+        self._semaphore = None
+
+    def check(self):
+        """Raise a 429 if a new analysis would find the queue full."""
+        if self._semaphore is None:
+            # Created lazily so it binds to the server's event loop
+            self._semaphore = asyncio.Semaphore(self.max_running)
+        if self._semaphore.locked() and self.waiting >= self.max_queued:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many analyses in progress, please retry shortly",
+                headers={"Retry-After": "5"}
+            )
+
+    async def acquire(self):
+        """Wait for a slot (or get a 429, see check); pair with release()."""
+        self.check()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+analysis_limiter = AnalysisLimiter()
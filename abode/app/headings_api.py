@@ -1,203 +1,231 @@
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Query, Request
+from fastapi.responses import StreamingResponse
 from app.db import get_db
-from pdf_pipeline.persona_encoder import encode_persona_job
-from pdf_pipeline.relevance import encode_sections, score_sections
-from pdf_pipeline.summarize import summarize_section
+from app.analysis import query_embedding, rank_document, rank_global, section_results, ensure_indexed, fetch_hit_sections, section_title, pdf_filter
+from app.executors import analysis_limiter, run_inference
+from app.read_cache import cached_response, pdf_version, split_param
+from app.scheduler import Deadline, ANALYSIS_DEADLINE_SECONDS
+from pdf_pipeline.embedding_store import text_hash
+from pdf_pipeline.metrics import stage_breakdown, rounded, errors_total
+from pdf_pipeline.heading_detection import font_headings
+from pdf_pipeline.bulk_writer import current_filter
+import asyncio
+import json
 import os
 from datetime import datetime
+from typing import Optional
 import time
 
 router = APIRouter()
 
+HEADING_FIELDS = ("text", "level", "font_name", "font_size", "font_weight", "page", "bbox")
+
+async def load_headings(db, pdf_name):
+    """
+    The /headings view stored with the outline at ingest; PDFs ingested
+    before it was stored get it computed from their spans.
+    """
+    doc = await db.outlines.find_one({"pdf_name": pdf_name}, {"headings": 1, "ingest_id": 1})
+    if doc is not None and "headings" in doc:
+        return doc["headings"]
+    query = current_filter(pdf_name, doc and doc.get("ingest_id"))
+    spans = await db.spans.find(query, {"_id": 0, "ingest_id": 0}).to_list(None)
+    if not spans:
+        raise HTTPException(status_code=404, detail="No spans found for this PDF.")
+    return await run_inference(font_headings, spans)
+
 @router.get("/headings/{pdf_name}")
-async def get_headings(pdf_name: str):
+async def get_headings(
+    request: Request,
+    pdf_name: str,
+    fields: Optional[str] = None,
+    level: Optional[str] = None,
+    page_from: Optional[int] = None,
+    page_to: Optional[int] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1)
+):
     """
-    Fetch all heading spans for a given PDF from the spans collection.
+    Bold spans in the three largest font sizes of a PDF, as H1-H3 (computed
+    at ingest). Optional: fields (comma-separated projection), level (e.g.
+    "H1,H2"), page_from/page_to, and limit with cursor for paging; the cursor
+    of the next page is returned in the X-Next-Cursor header.
     """
     db = get_db()
-    cursor = db.spans.find({"pdf_name": pdf_name})
-    spans = []
-    async for doc in cursor:
-        spans.append(doc)
+    fields = split_param(fields, HEADING_FIELDS) or list(HEADING_FIELDS)
+    levels = split_param(level, name="levels")
+    version = await pdf_version(db, pdf_name)
+    params = ("headings", tuple(fields), tuple(levels or ()), page_from, page_to, cursor, limit)
 
-    if not spans:
-        raise HTTPException(status_code=404, detail="No spans found for this PDF.")
+    async def build():
+        matches = []
+        for i, heading in enumerate(await load_headings(db, pdf_name)):
+            if cursor is not None and i <= cursor:
+                continue
+            if levels and heading["level"] not in levels:
+                continue
+            if (page_from is not None and heading["page"] < page_from) or (page_to is not None and heading["page"] > page_to):
+                continue
+            matches.append((i, heading))
+            if limit and len(matches) > limit:
+                break
+        headers = {}
+        if limit and len(matches) > limit:
+            matches = matches[:limit]
+            headers["X-Next-Cursor"] = str(matches[-1][0])
+        return [{f: heading.get(f) for f in fields} for _, heading in matches], headers
 
-    # Heuristic: consider bold and large font as headings
-    font_sizes = [s["font_size"] for s in spans if "font_size" in s]
-    if not font_sizes:
-        return []
-
-    unique_sizes = sorted(set(font_sizes), reverse=True)
-    h1_thresh = unique_sizes[0]
-    h2_thresh = unique_sizes[1] if len(unique_sizes) > 1 else h1_thresh
-    h3_thresh = unique_sizes[2] if len(unique_sizes) > 2 else h2_thresh
-
-    headings = []
-    for s in spans:
-        if s.get("font_weight") == "bold" and s.get("font_size", 0) >= h3_thresh:
-            # Assign level based on font size
-            if s["font_size"] == h1_thresh:
-                level = "H1"
-            elif s["font_size"] == h2_thresh:
-                level = "H2"
-            else:
-                level = "H3"
-            headings.append({
-                "text": s["text"],
-                "level": level,
-                "font_name": s["font_name"],
-                "font_size": s["font_size"],
-                "font_weight": s["font_weight"],
-                "page": s["page"],
-                "bbox": s["bbox"]
-            })
-
-    return headings
+    return await cached_response(request, pdf_name, version, params, build)
 
 @router.get("/summaries/{pdf_name}/{section_id}")
-async def get_summary(pdf_name: str, section_id: str):
+async def get_summary(pdf_name: str, section_id: str, sentences_count: int = 2):
     """
-    Fetch summary for a specific section of a PDF.
+    Fetch summary for a specific section of a PDF, as summarized to
+    sentences_count sentences (2, like /persona-query, by default).
     """
     db = get_db()
     try:
-        section_id_int = int(section_id)
-        summary_doc = await db.summaries.find_one({
-            "pdf_name": pdf_name,
-            "section_id": section_id_int
-        })
+        # Summaries are stored by section text hash, see analysis.summarize_metas
+        section = await db.sections.find_one({**await pdf_filter(db, pdf_name), "section_id": section_id})
+        if not section:
+            raise HTTPException(status_code=404, detail="Section not found")
+        summary_doc = await db.summaries.find_one({"text_hash": text_hash(section.get("text", "")),
+                                                   "sentences_count": sentences_count})
         
         if not summary_doc:
             raise HTTPException(status_code=404, detail="Summary not found")
         
-        return {"summary_text": summary_doc.get("summary", "No summary available")}
+        return {"summary_text": summary_doc.get("summary_text", "No summary available")}
         
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid section ID")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching summary: {str(e)}")
 
+@router.post("/search")
+async def search_sections(
+    query: str = Body(...),
+    pdf_names: Optional[list] = Body(None),
+    top_k: int = Body(10),
+    mode: str = Body("exact")
+):
+    """
+    Global top-k section search across the corpus (or the given PDFs)
+    using the in-process vector index. mode is "exact" or "ivf".
+    """
+    if mode not in ("exact", "ivf"):
+        raise HTTPException(status_code=400, detail="mode must be 'exact' or 'ivf'")
+    db = get_db()
+    index = await ensure_indexed(db, pdf_names or None)
+    query_emb = await query_embedding(query)
+    hits = index.search(query_emb, k=top_k, pdf_names=pdf_names, mode=mode)
+    results = []
+    for meta, score in await fetch_hit_sections(db, hits):
+        results.append({
+            "document": meta["pdf_name"],
+            "section_id": meta["section_id"],
+            "score": round(score, 4),
+            "page_number": meta.get("page_start", 0),
+            "section_title": section_title(meta)
+        })
+    return {"query": query, "results": results}
+
+MODELS_USED = {
+    "embeddings": "MiniLM-L6-v2",
+    "similarity": "cosine_similarity",
+    "summarization": "TextRank (sumy)"
+}
+
+def validate_persona_request(persona, job, pdf_names):
+    # Validate input according to Round 1B requirements
+    if len(pdf_names) < 3:
+        raise HTTPException(status_code=400, detail="Minimum 3 PDFs required for Round 1B")
+    if len(pdf_names) > 10:
+        raise HTTPException(status_code=400, detail="Maximum 10 PDFs allowed for Round 1B")
+    if not persona.strip() or not job.strip():
+        raise HTTPException(status_code=400, detail="Persona and job descriptions cannot be empty")
+
 @router.post("/persona-query")
 async def persona_query(
     persona: str = Body(...),
     job: str = Body(...),
     pdf_names: list = Body(...),
-    top_k: int = Body(5)
+    top_k: int = Body(5),
+    scope: str = Body("document"),
+    search_mode: str = Body("exact"),
+    deadline_seconds: Optional[float] = Body(None),
+    timings: bool = Body(False)
 ):
     """
     Round 1B: Persona-Driven Document Intelligence
     Given persona, job, and a list of pdf_names (3-10 PDFs), return top relevant sections per document.
+    With scope="global", return the top_k sections across all the given PDFs instead,
+    searched through the vector index (search_mode "exact" or "ivf").
     Uses MiniLM embeddings, cosine similarity, and TextRank summarization.
-    CPU-only, ≤1GB model size, ≤60 seconds processing time.
+    CPU-only, ≤1GB model size, ≤60 seconds processing time: work is scheduled
+    against deadline_seconds (default ANALYSIS_DEADLINE_SECONDS) and degraded
+    as it gets close, see metadata.degradations. With timings=true,
+    metadata.stage_seconds breaks the time down by pipeline stage.
     """
     start_time = time.time()
+    deadline = Deadline(deadline_seconds or ANALYSIS_DEADLINE_SECONDS)
     
-    # Validate input according to Round 1B requirements
-    if len(pdf_names) < 3:
-        raise HTTPException(status_code=400, detail="Minimum 3 PDFs required for Round 1B")
-    if len(pdf_names) > 10:
-        raise HTTPException(status_code=400, detail="Maximum 10 PDFs allowed for Round 1B")
-    if not persona.strip() or not job.strip():
-        raise HTTPException(status_code=400, detail="Persona and job descriptions cannot be empty")
+    validate_persona_request(persona, job, pdf_names)
+    if scope not in ("document", "global"):
+        raise HTTPException(status_code=400, detail="scope must be 'document' or 'global'")
+    if search_mode not in ("exact", "ivf"):
+        raise HTTPException(status_code=400, detail="search_mode must be 'exact' or 'ivf'")
     
+    async with analysis_limiter.slot():
+        with stage_breakdown() as stages:
+            return await run_persona_query(persona, job, pdf_names, top_k, scope, search_mode, start_time, deadline,
+                                           stages if timings else None)
+
+async def rank_documents(db, pdf_names, persona_emb, top_k, deadline):
+    """
+    Rank every PDF concurrently. PDFs still being ranked when the deadline
+    passes are dropped. Returns a (pdf_name, ranked or exception) pair per finished PDF.
+    """
+    tasks = [asyncio.ensure_future(rank_document(db, pdf_name, persona_emb, top_k, deadline)) for pdf_name in pdf_names]
+    _, pending = await asyncio.wait(tasks, timeout=deadline.remaining())
+    for task in pending:
+        task.cancel()
+    if pending:
+        deadline.degrade("skipped_documents", documents=[n for n, t in zip(pdf_names, tasks) if t in pending])
+    return [(pdf_name, task.exception() or task.result()) for pdf_name, task in zip(pdf_names, tasks) if task not in pending]
+
+async def run_persona_query(persona, job, pdf_names, top_k, scope, search_mode, start_time, deadline, stages=None):
     db = get_db()
     persona_job = f"{persona}. {job}"
     
     try:
-        # Step 1: Encode persona/job using MiniLM-L6-v2 (CPU-only)
-        persona_emb = encode_persona_job(persona_job)
+        # Step 1: Encode persona/job using MiniLM-L6-v2 (CPU-only), cached across requests
+        persona_emb = await query_embedding(persona_job)
         
-        extracted_sections = []
-        sub_section_analysis = []
+        ranked = []
         processed_count = 0
         
-        for pdf_name in pdf_names:
-            try:
-                # Step 2: Fetch sections from MongoDB
-                cursor = db.sections.find({"pdf_name": pdf_name})
-                sections = []
-                section_texts = []
-                section_metas = []
-                
-                async for doc in cursor:
-                    if doc.get("text") and len(doc["text"].strip()) > 10:  # Filter out very short sections
-                        section_texts.append(doc["text"])
-                        section_metas.append(doc)
-                
-                if not section_texts:
+        if scope == "global":
+            # Steps 2-5: one top-k search over every selected PDF's sections
+            ranked = await rank_global(db, pdf_names, persona_emb, top_k, search_mode)
+            processed_count = len({entry[0] for entry in ranked})
+        else:
+            # Steps 2-5 for every PDF concurrently
+            for pdf_name, results in await rank_documents(db, pdf_names, persona_emb, top_k, deadline):
+                if isinstance(results, Exception):
+                    # Log error but continue with other PDFs
+                    print(f"Error processing {pdf_name}: {str(results)}")
+                    errors_total.inc(stage="rank_document")
+                    continue
+                if results is None:
                     continue
-                
-                # Step 3: Encode sections using MiniLM-L6-v2
-                section_embs = encode_sections(section_texts)
-                
-                # Step 4: Score sections using cosine similarity
-                scores = score_sections(persona_emb, section_embs)
-                
-                # Step 5: Rank and get top sections
-                ranked = sorted(zip(section_metas, scores), key=lambda x: -x[1])
-                
-                for rank, (meta, score) in enumerate(ranked[:top_k], 1):
-                    try:
-                        # Step 6: Summarize using TextRank (sumy)
-                        refined_text = summarize_section(meta["text"], sentences_count=2)
-                        
-                        # Extract section title (first 100 chars)
-                        section_title = meta.get("text", "")[:100]
-                        if len(section_title) == 100:
-                            section_title += "..."
-                        
-                        # 1. Extracted Section (Round 1B format)
-                        extracted_sections.append({
-                            "document": pdf_name,
-                            "page_number": meta.get("page_start", 0),
-                            "section_title": section_title,
-                            "importance_rank": rank
-                        })
-                        
-                        # 2. Sub-section Analysis (Round 1B format)
-                        sub_section_analysis.append({
-                            "document": pdf_name,
-                            "refined_text": refined_text,
-                            "page_number_constraints": {
-                                "start": meta.get("page_start", 0),
-                                "end": meta.get("page_end", meta.get("page_start", 0))
-                            }
-                        })
-                        
-                    except Exception as e:
-                        # If summarization fails, use first few sentences
-                        text = meta["text"]
-                        sentences = text.split('.')[:2]
-                        refined_text = '. '.join(sentences) + '.'
-                        
-                        # Extract section title (first 100 chars)
-                        section_title = meta.get("text", "")[:100]
-                        if len(section_title) == 100:
-                            section_title += "..."
-                        
-                        extracted_sections.append({
-                            "document": pdf_name,
-                            "page_number": meta.get("page_start", 0),
-                            "section_title": section_title,
-                            "importance_rank": rank
-                        })
-                        
-                        sub_section_analysis.append({
-                            "document": pdf_name,
-                            "refined_text": refined_text,
-                            "page_number_constraints": {
-                                "start": meta.get("page_start", 0),
-                                "end": meta.get("page_end", meta.get("page_start", 0))
-                            }
-                        })
-                
+                ranked.extend(results)
                 processed_count += 1
-                
-            except Exception as e:
-                # Log error but continue with other PDFs
-                print(f"Error processing {pdf_name}: {str(e)}")
-                continue
+        
+        # Step 6: summarize every selected section in one batch
+        results = await section_results(db, ranked, deadline)
+        extracted_sections = [extracted for extracted, _ in results]
+        sub_section_analysis = [analysis for _, analysis in results]
         
         processing_time = time.time() - start_time
         
@@ -205,7 +233,7 @@ async def persona_query(
             raise HTTPException(status_code=404, detail="No valid sections found in any of the selected PDFs")
         
         # Round 1B Output Format
-        return {
+        response = {
             "metadata": {
                 "input_documents": pdf_names,
                 "persona": persona,
@@ -213,15 +241,143 @@ async def persona_query(
                 "processing_timestamp": datetime.utcnow().isoformat() + "Z",
                 "processing_time_seconds": round(processing_time, 2),
                 "total_pdfs_processed": processed_count,
-                "models_used": {
-                    "embeddings": "MiniLM-L6-v2",
-                    "similarity": "cosine_similarity",
-                    "summarization": "TextRank (sumy)"
-                }
+                "models_used": MODELS_USED,
+                "deadline_seconds": deadline.seconds,
+                "degradations": deadline.report()
             },
             "extracted_sections": extracted_sections,
             "sub_section_analysis": sub_section_analysis
         }
+        if stages is not None:
+            response["metadata"]["stage_seconds"] = rounded(stages)
+        return response
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}") 
+
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def stream_event(fmt, event, data):
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return json.dumps({"event": event, **data}, ensure_ascii=False) + "\n"
+
+@router.post("/persona-query/stream")
+async def persona_query_stream(
+    persona: str = Body(...),
+    job: str = Body(...),
+    pdf_names: list = Body(...),
+    top_k: int = Body(5),
+    format: str = Body("ndjson"),
+    deadline_seconds: Optional[float] = Body(None),
+    timings: bool = Body(False)
+):
+    """
+    Streaming variant of /persona-query (document scope) as NDJSON or
+    server-sent events. Emits a "metadata" event, then one "document" event
+    per PDF with its ranked sections and summaries as soon as that PDF is
+    done (or an "error" event), and finally a "done" event with the ranking
+    across all documents, the timing and any degradations applied to meet
+    the deadline (see /persona-query), plus stage_seconds with timings=true.
+    """
+    start_time = time.time()
+    deadline = Deadline(deadline_seconds or ANALYSIS_DEADLINE_SECONDS)
+    validate_persona_request(persona, job, pdf_names)
+    if format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+    # The slot is taken before the 200 is sent, so a full queue is a 429
+    # rather than an error mid-stream. Starting the stream here (up to its
+    # metadata event) makes it responsible for releasing the slot, even if
+    # the client disconnects before reading any of it.
+    await analysis_limiter.acquire()
+    events = stream_persona_query(persona, job, pdf_names, top_k, format, start_time, deadline, timings)
+    first = await events.__anext__()
+    return StreamingResponse(stream_from(first, events), media_type=STREAM_MEDIA_TYPES[format])
+
+async def stream_from(first, events):
+    try:
+        yield first
+        async for event in events:
+            yield event
+    finally:
+        await events.aclose()
+
+async def stream_persona_query(persona, job, pdf_names, top_k, fmt, start_time, deadline, timings=False):
+    """Events of /persona-query/stream; holds an analysis slot taken by the caller until it ends."""
+    db = get_db()
+    stages = {}
+    try:
+        yield stream_event(fmt, "metadata", {
+            "input_documents": pdf_names,
+            "persona": persona,
+            "job_to_be_done": job,
+            "processing_timestamp": datetime.utcnow().isoformat() + "Z",
+            "models_used": MODELS_USED
+        })
+        try:
+            with stage_breakdown(stages):
+                persona_emb = await query_embedding(f"{persona}. {job}")
+        except Exception as e:
+            yield stream_event(fmt, "error", {"detail": f"Processing failed: {str(e)}"})
+            return
+
+        async def analyze(pdf_name):
+            # Runs as its own task, so the breakdown context is set per document
+            with stage_breakdown(stages):
+                return await analyze_document(pdf_name)
+
+        async def analyze_document(pdf_name):
+            try:
+                ranked = await rank_document(db, pdf_name, persona_emb, top_k, deadline)
+                return pdf_name, ranked, await section_results(db, ranked, deadline) if ranked else [], None
+            except Exception as e:
+                return pdf_name, None, None, e
+
+        tasks = [asyncio.ensure_future(analyze(pdf_name)) for pdf_name in pdf_names]
+        scored = []
+        processed_count = 0
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=deadline.remaining()):
+                try:
+                    pdf_name, ranked, results, error = await next_done
+                except asyncio.TimeoutError:
+                    deadline.degrade("skipped_documents", documents=[n for n, t in zip(pdf_names, tasks) if not t.done()])
+                    break
+                if error is not None:
+                    print(f"Error processing {pdf_name}: {str(error)}")
+                    errors_total.inc(stage="rank_document")
+                    yield stream_event(fmt, "error", {"document": pdf_name, "detail": str(error)})
+                    continue
+                if not ranked:
+                    continue
+                processed_count += 1
+                for (_, _, _, score), (extracted, _) in zip(ranked, results):
+                    scored.append((score, extracted))
+                yield stream_event(fmt, "document", {
+                    "document": pdf_name,
+                    "elapsed_seconds": round(time.time() - start_time, 2),
+                    "extracted_sections": [extracted for extracted, _ in results],
+                    "sub_section_analysis": [analysis for _, analysis in results]
+                })
+        finally:
+            # The client may disconnect mid-stream; stop the remaining documents
+            for task in tasks:
+                task.cancel()
+
+        scored.sort(key=lambda item: -item[0])
+        yield stream_event(fmt, "done", {
+            "ranking": [{
+                "document": extracted["document"],
+                "section_title": extracted["section_title"],
+                "page_number": extracted["page_number"],
+                "score": round(score, 4),
+                "global_rank": rank
+            } for rank, (score, extracted) in enumerate(scored, 1)],
+            "processing_time_seconds": round(time.time() - start_time, 2),
+            "total_pdfs_processed": processed_count,
+            "deadline_seconds": deadline.seconds,
+            "degradations": deadline.report(),
+            **({"stage_seconds": rounded(stages)} if timings else {})
+        })
+    finally:
+        analysis_limiter.release()
@@ -0,0 +1,74 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+# Finished jobs kept for status polling before the oldest are dropped
+MAX_TRACKED_JOBS = int(os.getenv("MAX_TRACKED_JOBS", "500"))
+
+
+def _now():
+    return datetime.utcnow().isoformat() + "Z"
+
+
+class JobRegistry:
+    """
+    In-process record of background ingest jobs, polled via /ingest/jobs/{job_id}.
+    Past max_jobs, the jobs that finished first are dropped; queued and
+    running jobs are always kept, so the registry grows if all are active.
+    """
+
+    def __init__(self, max_jobs=MAX_TRACKED_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs = {}
+        # Done or failed job ids, in the order they finished
+        self._finished = OrderedDict()
+        # Jobs are updated from executor threads as well as the event loop
+        self._lock = threading.Lock()
+
+    def create(self, pdf_name):
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "pdf_name": pdf_name,
+            "status": "queued",
+            "stage": None,
+            "created_at": _now(),
+            "finished_at": None,
+            "error": None,
+            "result": None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.max_jobs and self._finished:
+                oldest, _ = self._finished.popitem(last=False)
+                del self._jobs[oldest]
+            return dict(job)
+
+    def get(self, job_id):
+        # A copy, so a response is never serialized while a thread updates the job
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stage(self, job_id, stage):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job["status"] = "running"
+                job["stage"] = stage
+
+    def finish(self, job_id, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job["status"] = "failed" if error else "done"
+                job["stage"] = None
+                job["finished_at"] = _now()
+                job["result"] = result
+                job["error"] = error
+                self._finished[job_id] = True
+
+
+jobs = JobRegistry()
@@ -1,16 +1,30 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse
 from pydantic import BaseModel
-import os, tempfile, shutil, subprocess, sys
-from pdf_pipeline.parse_pdf import parse_pdf
-from pdf_pipeline.parse_docx import parse_docx
-from pdf_pipeline.heading_detection import detect_headings
-from pdf_pipeline.mongo_utils import insert_spans, insert_outline, insert_sections
-from app.db import get_db
+from typing import Optional
+import os, shutil, asyncio, time, weakref
+from pdf_pipeline.pipeline import output_path, write_json_atomic
+from pdf_pipeline.heading_detection import font_headings
+from pdf_pipeline.bulk_writer import new_ingest_id, write_pdf_docs_async, switch_outline_async
+from app.db import get_db, bootstrap_indexes, CREATE_INDEXES
 from dotenv import load_dotenv
 from app.headings_api import router as headings_router
-from pdf_pipeline.ingest import extract_sections
+from app.executors import shutdown_executors, run_inference, analysis_limiter
+from app.jobs import jobs
+from app.read_cache import cached_response, pdf_version, split_param, invalidate, read_cache_stats
+from app.analysis import pdf_filter
+from pdf_pipeline.model_registry import WARMUP_MODELS, warmup, model_stats
+from pdf_pipeline.relevance import is_scorable
+from pdf_pipeline.persona_encoder import query_cache_stats
+from pdf_pipeline.heading_cache import heading_cache_stats
+from pdf_pipeline.vector_index import update_index
+from pdf_pipeline.embedding_store import embedding_docs
+from pdf_pipeline.result_cache import file_sha256, cache_key, get_result_cache
+from pdf_pipeline.incremental import previous_results, ingest_results
+from pdf_pipeline.office_converter import close_converter_pool, check_converter
+from pdf_pipeline.metrics import Gauge, Histogram, render, register_collector, stage_breakdown, rounded, errors_total
 
 load_dotenv()
 
@@ -22,10 +36,84 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend read the paging cursor and revalidate with the ETag
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
+# Section text and span lists of large PDFs compress well
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 app.include_router(headings_router)
 
+http_requests_in_flight = Gauge("abode_http_requests_in_flight", "Requests being served.")
+http_request_seconds = Histogram("abode_http_request_seconds", "Request latency by route.",
+                                 labelnames=("method", "route", "status"))
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    http_requests_in_flight.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        http_requests_in_flight.dec()
+        # Route templates, not raw paths, keep the label set small
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        http_request_seconds.observe(time.perf_counter() - start, method=request.method, route=route, status=status)
+
+def collect_app_metrics():
+    families = [
+        ("abode_analyses_running", "gauge", "Persona analyses holding a slot.", [({}, analysis_limiter.running)]),
+        ("abode_analyses_waiting", "gauge", "Persona analyses queued for a slot.", [({}, analysis_limiter.waiting)]),
+    ]
+    caches = {"result": get_result_cache().stats(), "query": query_cache_stats(), "heading": heading_cache_stats()}
+    for field in ("hits", "misses"):
+        families.append((f"abode_cache_{field}_total", "counter", f"Cache {field}.",
+                         [({"cache": name}, stats[field]) for name, stats in caches.items()]))
+    families.append(("abode_cache_hit_ratio", "gauge", "Cache hits per lookup.",
+                     [({"cache": name}, stats["hit_rate"]) for name, stats in caches.items() if stats["hit_rate"] is not None]))
+    return families
+
+register_collector(collect_app_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+async def warmup_models():
+    # Models load lazily on first use unless WARMUP_MODELS is set
+    if WARMUP_MODELS:
+        await asyncio.get_running_loop().run_in_executor(None, warmup)
+
+@app.on_event("startup")
+async def create_indexes():
+    # Background task: building indexes on a large collection can take a while
+    if CREATE_INDEXES:
+        asyncio.ensure_future(bootstrap_indexes(get_db()))
+
+@app.on_event("startup")
+async def report_converter():
+    # Warns when DOCX fallback conversions would each start a cold soffice
+    await asyncio.get_running_loop().run_in_executor(None, check_converter)
+
+@app.on_event("shutdown")
+def close_executors():
+    shutdown_executors()
+    close_converter_pool()
+
+@app.get("/models")
+def get_model_stats():
+    return {"models": model_stats()}
+
+@app.get("/cache")
+def get_cache_stats():
+    return {"result_cache": get_result_cache().stats(), "query_cache": query_cache_stats(),
+            "heading_cache": heading_cache_stats(), "read_cache": read_cache_stats()}
+
 class OutlineResponse(BaseModel):
     pdf_name: str
     title: str
@@ -60,62 +148,221 @@ def download_file(folder: str, filename: str):
         raise HTTPException(status_code=404, detail="File not found")
     return FileResponse(file_path, filename=filename)
 
-@app.post("/ingest/pdf")
-async def ingest_pdf(file: UploadFile = File(...)):
+UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "uploaded_pdfs"))
+OUTPUT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "output"))
+
+def compute_ingest_results(pdf_path, pdf_name, key, job_id, previous_key=None):
+    """
+    Parse, detect headings, extract sections and embed them, or load all of
+    that from the result cache when the same content was ingested before.
+    A revision of a PDF whose previous version is still cached only has its
+    changed pages and sections redone. Runs in the inference thread pool.
+    Returns:
+        Tuple[dict, bool]: The results and whether they came from the cache.
+    """
+    cache = get_result_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, True
+    previous = previous_results(cache, previous_key, key)
+    results = ingest_results(pdf_path, pdf_name, previous, stage=lambda name: jobs.stage(job_id, name))
+    cache.put(key, results["spans"], results["outline"], results["sections"], results["vectors"], results["chunks"],
+              results["page_fingerprints"], results["ml_decisions"])
+    return results, False
+
+# One lock per pdf_name being ingested, dropped once no job holds or awaits it
+_ingest_locks = weakref.WeakValueDictionary()
+
+def ingest_lock(pdf_name):
+    lock = _ingest_locks.get(pdf_name)
+    if lock is None:
+        lock = _ingest_locks[pdf_name] = asyncio.Lock()
+    return lock
+
+async def run_ingest_job(job_id, staged_path, pdf_name):
+    """
+    Single-document pipeline: parse the file once and reuse its spans for the
+    output JSON, Mongo and the section embeddings. Results are cached by file
+    content, so re-uploading a known file (under any name) only links the
+    cached results to pdf_name. Heavy stages run in the inference thread pool
+    so the event loop keeps serving requests. Ingests of the same pdf_name
+    run one at a time, each moving its staged upload into place first.
+    """
+    async with ingest_lock(pdf_name):
+        pdf_path = os.path.join(UPLOAD_DIR, pdf_name)
+        try:
+            os.replace(staged_path, pdf_path)
+        except OSError as e:
+            print(f"Ingest of {pdf_name} failed: {e}")
+            errors_total.inc(stage="ingest")
+            jobs.finish(job_id, error=str(e))
+            return
+        await ingest_file(job_id, pdf_path, pdf_name)
+
+async def ingest_file(job_id, pdf_path, pdf_name):
+    db = get_db()
+    with stage_breakdown() as stages:
+        try:
+            jobs.stage(job_id, "hashing")
+            content_sha256 = await run_inference(file_sha256, pdf_path)
+            key = cache_key(content_sha256)
+            current = await db.outlines.find_one({"pdf_name": pdf_name}, {"cache_key": 1})
+            results, cached = await run_inference(compute_ingest_results, pdf_path, pdf_name, key, job_id,
+                                                  current and current.get("cache_key"))
+            spans, outline, sections, vectors = results["spans"], results["outline"], results["sections"], results["vectors"]
+            summary = {
+                "outline_id": pdf_name,
+                "spans": len(spans),
+                "headings": len(outline["outline"]),
+                "sections": len(sections),
+                "cached": cached
+            }
+            if results.get("incremental"):
+                # What a re-ingest of a revised file actually redid
+                summary["incremental"] = results["incremental"]
+            if cached and current and current.get("cache_key") == key:
+                # Same content re-uploaded under the same name: Mongo is already up to date
+                jobs.finish(job_id, result={**summary, "stage_seconds": rounded(stages)})
+                return
+            jobs.stage(job_id, "storing")
+            # Written alongside the previous ingest, which readers keep seeing
+            # until the outline below points at this one
+            ingest_id = new_ingest_id()
+            await write_pdf_docs_async(db, "spans", pdf_name, spans, ingest_id)
+            await run_inference(write_json_atomic, output_path(OUTPUT_DIR, pdf_name), outline)
+            await write_pdf_docs_async(db, "sections", pdf_name, sections, ingest_id)
+            await write_pdf_docs_async(db, "embeddings", pdf_name,
+                                       embedding_docs(pdf_name, sections, vectors, results["chunks"]), ingest_id)
+            indexed = [i for i, s in enumerate(sections) if is_scorable(s['text'])]
+            await run_inference(update_index, pdf_name, [sections[i]['section_id'] for i in indexed], [vectors[i] for i in indexed])
+            headings = await run_inference(font_headings, spans)
+            # Written last: its cache_key marks pdf_name as fully linked to this content.
+            # Re-ingesting replaces the PDF's previous spans/sections/embeddings
+            await switch_outline_async(db, {
+                "pdf_name": pdf_name, **outline, "headings": headings, "content_sha256": content_sha256, "cache_key": key,
+                "ingest_id": ingest_id
+            })
+            invalidate(pdf_name)
+            jobs.finish(job_id, result={**summary, "stage_seconds": rounded(stages)})
+        except Exception as e:
+            print(f"Ingest of {pdf_name} failed: {e}")
+            errors_total.inc(stage="ingest")
+            jobs.finish(job_id, error=str(e))
+
+@app.post("/ingest/pdf", status_code=202)
+async def ingest_pdf(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     # Save uploaded PDF to abode/uploaded_pdfs
-    upload_dir = os.path.join(os.path.dirname(__file__), "..", "uploaded_pdfs")
-    os.makedirs(upload_dir, exist_ok=True)
-    upload_path = os.path.join(upload_dir, file.filename)
-    with open(upload_path, "wb") as f:
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    pdf_name = os.path.basename(file.filename)
+    # Process in the background; poll /ingest/jobs/{job_id} for completion
+    job = jobs.create(pdf_name)
+    # Staged per job: an ingest of the same name may still be reading the previous upload
+    staged_path = os.path.join(UPLOAD_DIR, f".{job['job_id']}.upload")
+    with open(staged_path, "wb") as f:
         shutil.copyfileobj(file.file, f)
-    # Automatically process the uploaded PDF and write output JSON
-    output_dir = os.path.join(os.path.dirname(__file__), "..", "output")
-    os.makedirs(output_dir, exist_ok=True)
-    # Call batch_extract.py as a module from the project root
-    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    subprocess.run([
-        sys.executable, "-m", "pdf_pipeline.batch_extract",
-        "--input_dir", upload_dir,
-        "--output_dir", output_dir
-    ], check=True, cwd=project_root)
-    # Now process the uploaded file for DB as before
-    with tempfile.TemporaryDirectory() as tmpdir:
-        pdf_path = os.path.join(tmpdir, file.filename)
-        shutil.copyfile(upload_path, pdf_path)
-        pdf_name = file.filename
-        try:
-            spans = parse_pdf(pdf_path)
-        except Exception:
-            spans = parse_docx(pdf_path)
-        for span in spans:
-            span['pdf_name'] = pdf_name
-            await get_db().spans.insert_one(span)
-        outline = detect_headings(spans, pdf_name)
-        await get_db().outlines.insert_one({"pdf_name": pdf_name, **outline})
-        # --- New: Extract and insert sections automatically ---
-        sections = extract_sections(spans, outline)
-        for section in sections:
-            section['pdf_name'] = pdf_name
-            await get_db().sections.insert_one(section)
-        return {"outline_id": str(pdf_name)}
+    background_tasks.add_task(run_ingest_job, job["job_id"], staged_path, pdf_name)
+    return {"job_id": job["job_id"], "outline_id": pdf_name, "status": job["status"]}
+
+@app.get("/ingest/jobs/{job_id}")
+def get_ingest_job(job_id: str):
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @app.get("/outline/{pdf_name}", response_model=OutlineResponse)
-async def get_outline(pdf_name: str):
-    doc = await get_db().outlines.find_one({"pdf_name": pdf_name})
-    if not doc:
+async def get_outline(request: Request, pdf_name: str):
+    db = get_db()
+    version = await pdf_version(db, pdf_name)
+    if version is False:
         raise HTTPException(status_code=404, detail="Outline not found")
-    return OutlineResponse(pdf_name=doc['pdf_name'], title=doc['title'], outline=doc['outline'])
+
+    async def build():
+        doc = await db.outlines.find_one({"pdf_name": pdf_name}, {"title": 1, "outline": 1})
+        if not doc:
+            raise HTTPException(status_code=404, detail="Outline not found")
+        return OutlineResponse(pdf_name=pdf_name, title=doc['title'], outline=doc['outline']), {}
+
+    return await cached_response(request, pdf_name, version, ("outline",), build)
+
+SECTION_FIELDS = ("section_id", "level", "text", "page_start", "page_end")
 
 @app.get("/sections/{pdf_name}", response_model=list[SectionMeta])
-async def get_sections(pdf_name: str):
-    cursor = get_db().sections.find({"pdf_name": pdf_name})
-    sections = []
-    async for doc in cursor:
-        sections.append(SectionMeta(
-            section_id=doc['section_id'],
-            level=doc['level'],
-            text=doc['text'],
-            page_start=doc['page_start'],
-            page_end=doc['page_end']
-        ))
-    return sections 
\ No newline at end of file
+async def get_sections(
+    request: Request,
+    pdf_name: str,
+    fields: Optional[str] = None,
+    level: Optional[str] = None,
+    page_from: Optional[int] = None,
+    page_to: Optional[int] = None,
+    section_from: Optional[str] = None,
+    section_to: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1)
+):
+    """
+    Sections of a PDF in reading order. Optional: fields (comma-separated
+    projection, e.g. "section_id,level,page_start" to leave out the text),
+    level (e.g. "H1,H2"), sections overlapping page_from..page_to, the
+    section_from..section_to id range, and limit with cursor for paging;
+    the cursor of the next page is returned in the X-Next-Cursor header.
+    Filtering and projection happen in MongoDB.
+    """
+    db = get_db()
+    fields = split_param(fields, SECTION_FIELDS) or list(SECTION_FIELDS)
+    levels = split_param(level, name="levels")
+    version = await pdf_version(db, pdf_name)
+    params = ("sections", tuple(fields), tuple(levels or ()), page_from, page_to, section_from, section_to, cursor, limit)
+
+    async def position(current, section_id, legacy):
+        doc = await db.sections.find_one({**current, "section_id": section_id}, {"span_start": 1})
+        if doc is None:
+            raise HTTPException(status_code=404, detail=f"Section {section_id} not found")
+        return int(section_id) if legacy else doc["span_start"]
+
+    async def build():
+        current = await pdf_filter(db, pdf_name)
+        query = dict(current)
+        if levels:
+            query["level"] = {"$in": levels}
+        if page_from is not None:
+            query["page_end"] = {"$gte": page_from}
+        if page_to is not None:
+            query["page_start"] = {"$lte": page_to}
+        # Sections are ordered, and paged, by their reading-order offset.
+        # Those stored before span_start existed are numbered 1..n in reading
+        # order instead, so their number stands in for it.
+        legacy = await db.sections.find_one({**current, "span_start": {"$exists": False}}, {"_id": 1}) is not None
+        low = await position(current, section_from, legacy) if section_from is not None else None
+        high = await position(current, section_to, legacy) if section_to is not None else None
+        projection = {"_id": 0, "span_start": 1, "section_id": 1, **{f: 1 for f in fields}}
+        if legacy:
+            docs = await db.sections.find(query, projection).to_list(None)
+            ordered = sorted((int(doc["section_id"]), n, doc) for n, doc in enumerate(docs))
+            ordered = [(key, doc) for key, _, doc in ordered
+                       if (low is None or key >= low) and (high is None or key <= high)
+                       and (cursor is None or key > cursor)]
+            if limit:
+                ordered = ordered[:limit + 1]
+        else:
+            order = {}
+            if low is not None:
+                order["$gte"] = low
+            if high is not None:
+                order["$lte"] = high
+            if cursor is not None:
+                order["$gt"] = cursor
+            if order:
+                query["span_start"] = order
+            found = db.sections.find(query, projection).sort("span_start", 1)
+            if limit:
+                found = found.limit(limit + 1)
+            ordered = [(doc["span_start"], doc) for doc in await found.to_list(None)]
+        headers = {}
+        if limit and len(ordered) > limit:
+            ordered = ordered[:limit]
+            headers["X-Next-Cursor"] = str(ordered[-1][0])
+        return [{f: doc.get(f) for f in fields} for _, doc in ordered], headers
+
+    return await cached_response(request, pdf_name, version, params, build) 
\ No newline at end of file
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from pdf_pipeline.lru_cache import LRUCache
+
+# Responses of the per-PDF read endpoints kept in memory
+READ_CACHE_SIZE = int(os.getenv("READ_CACHE_SIZE", "64"))
+# Larger responses are not kept (they still get an ETag)
+READ_CACHE_MAX_ENTRY_BYTES = int(os.getenv("READ_CACHE_MAX_ENTRY_BYTES", str(2 * 1024 * 1024)))
+
+_responses = LRUCache(READ_CACHE_SIZE)
+
+
+async def pdf_version(db, pdf_name):
+    """
+    The ingest version of a PDF: the cache_key its outline was written with
+    (file content plus pipeline and model versions), None if the outline
+    predates it, or False if the PDF was never ingested.
+    """
+    doc = await db.outlines.find_one({"pdf_name": pdf_name}, {"cache_key": 1})
+    if doc is None:
+        return False
+    return doc.get("cache_key")
+
+
+def _etag(data):
+    return '"' + hashlib.sha1(data).hexdigest()[:32] + '"'
+
+
+def _not_modified(request, etag):
+    header = request.headers.get("if-none-match", "")
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(",")) or header.strip() == "*"
+
+
+async def cached_response(request: Request, pdf_name, version, params, build):
+    """
+    Serve a read endpoint's JSON from the cache, or build and cache it.
+    A response is fully determined by the PDF's version and the request
+    parameters, so with a version its ETag is derived from those alone and
+    If-None-Match can be answered without touching the data.
+    Args:
+        request (Request): The incoming request (for If-None-Match).
+        pdf_name (str): PDF the response is about.
+        version (Optional[str]): Its pdf_version; None disables caching.
+        params (tuple): Endpoint name and normalized query parameters.
+        build (Callable[[], Awaitable[Tuple[object, dict]]]): Produces the
+            content and any extra headers (e.g. the next page cursor).
+    Returns:
+        Response: 200 with the JSON body, or 304 if the client's copy is current.
+    """
+    key = (pdf_name, version, params)
+    etag = _etag(repr(key).encode("utf-8")) if version else None
+    if etag and _not_modified(request, etag):
+        # The client's copy is current: skip the data entirely
+        return Response(status_code=304, headers={"ETag": etag})
+    entry = _responses.get(key) if version else None
+    if entry is None:
+        content, headers = await build()
+        body = json.dumps(jsonable_encoder(content), ensure_ascii=False).encode("utf-8")
+        entry = (body, headers)
+        if version and len(body) <= READ_CACHE_MAX_ENTRY_BYTES:
+            _responses.put(key, entry)
+    body, headers = entry
+    etag = etag or _etag(body)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, **headers})
+    # no-cache: clients may keep the body but must revalidate it with the ETag
+    return Response(body, media_type="application/json",
+                    headers={"ETag": etag, "Cache-Control": "no-cache", **headers})
+
+
+def split_param(value, allowed=None, name="fields"):
+    """Comma-separated query parameter as a list (None if not given), checked against `allowed`."""
+    if not value:
+        return None
+    items = [item.strip() for item in value.split(",") if item.strip()]
+    unknown = [item for item in items if allowed is not None and item not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown {name}: {', '.join(unknown)}")
+    return items
+
+
+def invalidate(pdf_name):
+    """Drop a PDF's cached responses, e.g. once it has been re-ingested."""
+    _responses.discard(lambda key: key[0] == pdf_name)
+
+
+def read_cache_stats():
+    return _responses.stats()
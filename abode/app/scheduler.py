@@ -0,0 +1,130 @@
+import os
+import time
+
+# Round 1B allows 60 seconds per analysis; keep a margin for the response itself
+ANALYSIS_DEADLINE_SECONDS = float(os.getenv("ANALYSIS_DEADLINE_SECONDS", "55"))
+# Section text is cut to this many characters when the full text will not fit
+DEGRADED_TEXT_CHARS = int(os.getenv("DEGRADED_TEXT_CHARS", "2000"))
+# Below this share of the deadline left, fewer sections per document are returned
+TIGHT_DEADLINE_SHARE = 0.1
+# Share of the remaining time one stage may plan to use, leaving room for the rest
+STAGE_SHARE = 0.8
+# Estimated seconds of work per process pool submission; pool work cannot be
+# cancelled, so this bounds what an analysis past its deadline leaves running
+CPU_BATCH_SECONDS = float(os.getenv("CPU_BATCH_SECONDS", "2"))
+
+# Seconds per character of section text before anything has been measured
+DEFAULT_STAGE_COSTS = {
+    "encode": 2e-5,
+    "summarize": 1e-5,
+}
+
+
+class StageCosts:
+    """
+    Seconds-per-unit estimate for each analysis stage, an exponentially
+    weighted average of what the stage has actually cost so far.
+    """
+
+    def __init__(self, defaults=DEFAULT_STAGE_COSTS, alpha=0.3):
+        self.alpha = alpha
+        self._rates = dict(defaults)
+
+    def estimate(self, stage, units):
+        return self._rates[stage] * units
+
+    def observe(self, stage, units, seconds):
+        if units > 0:
+            rate = seconds / units
+            self._rates[stage] = (1 - self.alpha) * self._rates[stage] + self.alpha * rate
+
+    def stats(self):
+        return dict(self._rates)
+
+
+stage_costs = StageCosts()
+
+
+def split_by_cost(texts, stage, seconds=CPU_BATCH_SECONDS, costs=stage_costs):
+    """
+    Split texts into consecutive batches, each estimated to take at most
+    `seconds` of the stage's work (a single text may exceed it).
+    Returns:
+        List[List[int]]: Indices into texts, in order.
+    """
+    batches, batch, cost = [], [], 0.0
+    for i, text in enumerate(texts):
+        estimate = costs.estimate(stage, len(text))
+        if batch and cost + estimate > seconds:
+            batches.append(batch)
+            batch, cost = [], 0.0
+        batch.append(i)
+        cost += estimate
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class Deadline:
+    """
+    Time budget of one analysis. Stages ask it whether their estimated cost
+    still fits and record any degradation they fall back to, which ends up
+    in the response metadata.
+    """
+
+    def __init__(self, seconds=ANALYSIS_DEADLINE_SECONDS, costs=stage_costs):
+        self.seconds = seconds
+        self.costs = costs
+        self.start = time.perf_counter()
+        self.degradations = {}
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def remaining(self):
+        return max(self.seconds - self.elapsed(), 0.0)
+
+    def fits(self, stage, units, share=STAGE_SHARE):
+        return self.costs.estimate(stage, units) <= self.remaining() * share
+
+    def tight(self):
+        return self.remaining() < self.seconds * TIGHT_DEADLINE_SHARE
+
+    def degrade(self, name, **detail):
+        entry = self.degradations.setdefault(name, {})
+        for key, value in detail.items():
+            if key == "sections" and key in entry:
+                # Counts from several stages or documents add up
+                entry[key] += value
+            else:
+                entry[key] = value
+
+    def report(self):
+        return [{"degradation": name, **detail} for name, detail in self.degradations.items()]
+
+    def plan_summaries(self, texts):
+        """
+        Choose how each text is summarized, spending the budget in the given
+        (highest value first) order.
+        Returns:
+            List[str]: "full" (TextRank on the text), "truncated" (TextRank on
+            its first DEGRADED_TEXT_CHARS characters) or "lead" (lead sentences).
+        """
+        budget = self.remaining() * STAGE_SHARE
+        modes = []
+        for text in texts:
+            full = self.costs.estimate("summarize", len(text))
+            short = self.costs.estimate("summarize", min(len(text), DEGRADED_TEXT_CHARS))
+            if full <= budget:
+                modes.append("full")
+                budget -= full
+            elif short <= budget:
+                modes.append("truncated")
+                budget -= short
+            else:
+                modes.append("lead")
+        if "truncated" in modes:
+            self.degrade("truncated_section_text", sections=modes.count("truncated"), chars=DEGRADED_TEXT_CHARS)
+        if "lead" in modes:
+            self.degrade("lead_sentence_summaries", sections=modes.count("lead"))
+        return modes
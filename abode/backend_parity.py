@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+import numpy as np
+
+from evaluate import evaluate, load_json
+from pdf_pipeline.model_registry import BACKENDS, get_sentence_encoder
+from pdf_pipeline.vector_index import normalize
+
+def run_headings(backend, input_dir, output_dir):
+    """
+    Extract outlines for every PDF in input_dir with the given inference backend.
+    Runs batch_extract in a fresh process, since the backend is read at import,
+    without the persistent heading cache, so every backend's classifier runs.
+    Returns:
+        float: Wall-clock seconds, including model load.
+    """
+    # Decisions stored by an earlier run would turn the timing into SQLite lookups
+    # and make every backend report the first one's headings
+    env = dict(os.environ, INFERENCE_BACKEND=backend, HEADING_CACHE_DB="")
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "pdf_pipeline.batch_extract", "--input_dir", input_dir,
+                    "--output_dir", output_dir, "--force"],
+                   cwd=os.path.dirname(os.path.abspath(__file__)), env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def sample_texts(gt_dir):
+    # Heading texts of the ground truth set double as a small embedding sample
+    texts = []
+    for fname in sorted(os.listdir(gt_dir)):
+        if fname.endswith(".json"):
+            texts.extend(h["text"] for h in load_json(os.path.join(gt_dir, fname)).get("outline", []))
+    return texts
+
+def embedding_parity(backend, texts, baseline):
+    """
+    Encode texts with the given backend and compare against the fp32 vectors.
+    Returns:
+        dict: Encode seconds and mean/min cosine similarity to the baseline.
+    """
+    model = get_sentence_encoder(backend)
+    start = time.perf_counter()
+    vectors = np.asarray(model.encode(texts), dtype=np.float32)
+    seconds = time.perf_counter() - start
+    cosines = np.sum(normalize(vectors) * normalize(baseline), axis=1)
+    return {"encode_seconds": round(seconds, 3), "mean_cosine": float(cosines.mean()), "min_cosine": float(cosines.min())}
+
+def main(input_dir, gt_dir, backends, max_f1_drop, min_cosine):
+    texts = sample_texts(gt_dir)
+    baseline = np.asarray(get_sentence_encoder("torch").encode(texts), dtype=np.float32)
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("torch",) + tuple(b for b in backends if b != "torch"):
+            print(f"\n== {backend}")
+            output_dir = os.path.join(tmp, backend)
+            seconds = run_headings(backend, input_dir, output_dir)
+            report[backend] = {"headings_seconds": round(seconds, 3), **evaluate(output_dir, gt_dir)}
+            report[backend].update(embedding_parity(backend, texts, baseline))
+    failed = []
+    for backend, result in report.items():
+        f1_drop = report["torch"]["f1"] - result["f1"]
+        speedup = report["torch"]["headings_seconds"] / max(result["headings_seconds"], 1e-9)
+        print(f"{backend:10s} F1={result['f1']:.3f} (drop {f1_drop:+.3f})  headings {result['headings_seconds']:.2f}s "
+              f"(x{speedup:.2f})  encode {result['encode_seconds']:.2f}s  cosine mean={result['mean_cosine']:.4f} "
+              f"min={result['min_cosine']:.4f}")
+        if f1_drop > max_f1_drop or result["min_cosine"] < min_cosine:
+            failed.append(backend)
+    print(json.dumps(report, indent=2))
+    if failed:
+        print(f"Parity check failed for: {', '.join(failed)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Check quantized/ONNX inference against the fp32 baseline")
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser.add_argument("--input_dir", default=os.path.join(script_dir, "uploaded_pdfs"), help="PDFs of the ground truth set")
+    parser.add_argument("--gt_dir", default=os.path.join(script_dir, "ground_truth"), help="Directory with ground truth JSONs")
+    parser.add_argument("--backends", nargs="+", default=["quantized", "onnx"], choices=BACKENDS)
+    parser.add_argument("--max_f1_drop", type=float, default=0.01, help="Allowed heading F1 loss against torch")
+    parser.add_argument("--min_cosine", type=float, default=0.98, help="Lowest allowed embedding cosine to torch")
+    args = parser.parse_args()
+    sys.exit(main(args.input_dir, args.gt_dir, args.backends, args.max_f1_drop, args.min_cosine))
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+
+from evaluate import evaluate
+from pdf_pipeline import heading_detection, heading_cache
+from pdf_pipeline.heading_detection import detect_headings
+from pdf_pipeline.ingest import extract_sections
+from pdf_pipeline.model_registry import INFERENCE_BACKEND, get_sentence_encoder
+from pdf_pipeline.pipeline import parse_document, output_path, write_json_atomic
+
+STAGES = ("parse", "headings", "sections", "encode")
+# Run settings a baseline must share with the current run to be compared
+COMPARED_SETTINGS = ("inference_backend", "ml", "embeddings")
+
+# Synthetic pages mirror the sample PDFs: a chapter title, three sections
+# with a short paragraph each, at the sizes the samples use
+SYNTHETIC_SECTIONS = ("Background", "Method", "Results")
+SYNTHETIC_BODY = ("The quick brown fox jumps over the lazy dog while the benchmark counts pages.",
+                  "Each paragraph is long enough to look like body text to the size heuristics.")
+
+def synthetic_pdf(path, pages):
+    """
+    Write a PDF of the given number of pages with a known outline.
+    Returns:
+        dict: Ground truth in the evaluate.py format.
+    """
+    outline = []
+    doc = fitz.open()
+    for number in range(1, pages + 1):
+        page = doc.new_page()
+        chapter = f"Chapter {number} Overview"
+        page.insert_text((72, 72), chapter, fontsize=20, fontname="hebo")
+        outline.append({"level": "H1", "text": chapter, "page": number})
+        y = 120
+        for i, name in enumerate(SYNTHETIC_SECTIONS):
+            title = f"{name} of part {number}"
+            page.insert_text((72, y), title, fontsize=16, fontname="hebo")
+            outline.append({"level": "H2", "text": title, "page": number})
+            # Two of the three sections get a paragraph, keeping body text
+            # below half of the spans as in the samples
+            if i < len(SYNTHETIC_BODY):
+                page.insert_text((72, y + 24), SYNTHETIC_BODY[i], fontsize=12, fontname="helv")
+            y += 80
+    doc.save(path)
+    doc.close()
+    return {"title": outline[0]["text"] if outline else "", "outline": outline}
+
+def _peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux; it is the whole process's peak,
+    # hence run_suite_isolated
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class _CountingClassifier:
+    """Wraps the heading classifier to count forward passes and classified texts."""
+
+    def __init__(self, model, counts):
+        self.model = model
+        self.counts = counts
+
+    def __call__(self, texts, *args, **kwargs):
+        self.counts["classifier_calls"] += 1
+        self.counts["classified_texts"] += 1 if isinstance(texts, str) else len(texts)
+        return self.model(texts, *args, **kwargs)
+
+def benchmark_file(path, pred_dir, counts, use_ml=True, embeddings=False):
+    """
+    Run the ingest stages on one file, writing its outline to pred_dir.
+    Returns:
+        dict: Pages, seconds per stage and spans/headings/sections produced.
+    """
+    timings = {}
+    start = time.perf_counter()
+    spans = parse_document(path)
+    timings["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    candidate_filter = heading_detection.is_ml_candidate if use_ml else (lambda text, level: False)
+    outline = detect_headings(spans, os.path.basename(path), candidate_filter=candidate_filter)
+    timings["headings"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sections = extract_sections(spans, outline)
+    timings["sections"] = time.perf_counter() - start
+
+    if embeddings and sections:
+        from pdf_pipeline.relevance import encode_section_chunks
+        start = time.perf_counter()
+        encode_section_chunks([s["text"] for s in sections])
+        timings["encode"] = time.perf_counter() - start
+        counts["encoded_sections"] += len(sections)
+
+    write_json_atomic(output_path(pred_dir, os.path.basename(path)), outline)
+    with fitz.open(path) as doc:
+        pages = doc.page_count
+    return {"pages": pages, "seconds": {k: round(v, 4) for k, v in timings.items()},
+            "spans": len(spans), "headings": len(outline["outline"]), "sections": len(sections)}
+
+def run_suite(name, pdf_dir, gt_dir, use_ml=True, embeddings=False):
+    """
+    Benchmark every PDF in pdf_dir that has a ground truth JSON in gt_dir.
+    Returns:
+        dict: Per-file results, totals per stage, pages/sec, peak RSS,
+        model inference counts and the evaluate.py metrics.
+    """
+    counts = {"classifier_calls": 0, "classified_texts": 0, "encoded_sections": 0}
+    # Every suite starts cold, so results stored by earlier runs do not skew the numbers
+    heading_cache.HEADING_CACHE_DB = ""
+    heading_cache.clear_memory()
+    get_classifier = heading_detection.get_heading_classifier
+    heading_detection.get_heading_classifier = lambda: _CountingClassifier(get_classifier(), counts)
+    files = {}
+    try:
+        with tempfile.TemporaryDirectory() as pred_dir:
+            for fname in sorted(os.listdir(pdf_dir)):
+                stem, ext = os.path.splitext(fname)
+                if ext.lower() in (".pdf", ".docx") and os.path.exists(os.path.join(gt_dir, stem + ".json")):
+                    files[fname] = benchmark_file(os.path.join(pdf_dir, fname), pred_dir, counts, use_ml, embeddings)
+            print(f"\n== {name}")
+            metrics = evaluate(pred_dir, gt_dir)
+    finally:
+        heading_detection.get_heading_classifier = get_classifier
+    stage_seconds = {stage: round(sum(f["seconds"].get(stage, 0.0) for f in files.values()), 4) for stage in STAGES}
+    total_seconds = sum(stage_seconds.values())
+    pages = sum(f["pages"] for f in files.values())
+    return {
+        "files": files,
+        "pages": pages,
+        "stage_seconds": stage_seconds,
+        "pages_per_sec": round(pages / max(total_seconds, 1e-9), 2),
+        "peak_rss_bytes": _peak_rss_bytes(),
+        "inference": counts,
+        "precision": metrics["precision"],
+        "recall": metrics["recall"],
+        "f1": metrics["f1"],
+    }
+
+def _isolated_suite(name, pdf_dir, gt_dir, use_ml, embeddings):
+    # Models are loaded before timing starts, as they would be in a warm
+    # process; peak RSS still includes them
+    if use_ml:
+        heading_detection.get_heading_classifier()
+    if embeddings:
+        get_sentence_encoder()
+    return run_suite(name, pdf_dir, gt_dir, use_ml, embeddings)
+
+def run_suite_isolated(name, pdf_dir, gt_dir, use_ml=True, embeddings=False):
+    """run_suite in a fresh process, so its peak RSS is its own and not the largest suite's so far."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_isolated_suite, name, pdf_dir, gt_dir, use_ml, embeddings).result()
+
+def settings(use_ml=True, embeddings=False):
+    return {"inference_backend": INFERENCE_BACKEND, "ml": use_ml, "embeddings": embeddings}
+
+def run(gt_pdf_dir, gt_dir, page_counts, use_ml=True, embeddings=False):
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **settings(use_ml, embeddings),
+        "suites": {},
+    }
+    report["suites"]["ground_truth"] = run_suite_isolated("ground_truth", gt_pdf_dir, gt_dir, use_ml, embeddings)
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in page_counts:
+            name = f"synthetic_{pages}p"
+            suite_dir, suite_gt = os.path.join(tmp, name), os.path.join(tmp, name + "_gt")
+            os.makedirs(suite_dir)
+            os.makedirs(suite_gt)
+            gt = synthetic_pdf(os.path.join(suite_dir, name + ".pdf"), pages)
+            write_json_atomic(os.path.join(suite_gt, name + ".json"), gt)
+            report["suites"][name] = run_suite_isolated(name, suite_dir, suite_gt, use_ml, embeddings)
+    return report
+
+def settings_mismatch(report, baseline):
+    """Run settings (see COMPARED_SETTINGS) that differ between a report and a baseline, as messages."""
+    return [f"{key}: baseline {baseline.get(key)!r}, this run {report.get(key)!r}"
+            for key in COMPARED_SETTINGS if baseline.get(key) != report.get(key)]
+
+def compare(report, baseline, max_throughput_drop=0.2, max_f1_drop=0.01):
+    """
+    Check a report against a saved baseline.
+    Raises:
+        ValueError: If the baseline was run with other settings (e.g. without
+        the classifier), which would make the numbers incomparable.
+    Returns:
+        List[str]: One message per suite whose pages/sec dropped by more than
+        max_throughput_drop (a fraction) or whose F1 fell by more than max_f1_drop.
+    """
+    mismatch = settings_mismatch(report, baseline)
+    if mismatch:
+        raise ValueError("Baseline was run with other settings: " + "; ".join(mismatch))
+    failures = []
+    for name, base in baseline["suites"].items():
+        current = report["suites"].get(name)
+        if current is None:
+            continue
+        ratio = current["pages_per_sec"] / max(base["pages_per_sec"], 1e-9)
+        f1_drop = base["f1"] - current["f1"]
+        print(f"{name:22s} pages/sec {base['pages_per_sec']:9.2f} -> {current['pages_per_sec']:9.2f} (x{ratio:.2f})  "
+              f"F1 {base['f1']:.3f} -> {current['f1']:.3f}")
+        if ratio < 1 - max_throughput_drop:
+            failures.append(f"{name}: throughput fell to {ratio:.0%} of the baseline")
+        if f1_drop > max_f1_drop:
+            failures.append(f"{name}: F1 fell by {f1_drop:.3f}")
+    return failures
+
+def print_summary(report):
+    print("\nBenchmark summary:")
+    for name, suite in report["suites"].items():
+        stages = "  ".join(f"{stage}={seconds:.2f}s" for stage, seconds in suite["stage_seconds"].items() if seconds)
+        print(f"  {name:22s} {suite['pages']:6d} pages  {suite['pages_per_sec']:9.2f} pages/sec  F1={suite['f1']:.3f}  "
+              f"peak RSS {suite['peak_rss_bytes'] / 2**20:.0f} MiB  {stages}  "
+              f"classified {suite['inference']['classified_texts']} texts in {suite['inference']['classifier_calls']} calls")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark heading extraction and check it against a baseline")
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser.add_argument("--input_dir", default=os.path.join(script_dir, "uploaded_pdfs"), help="PDFs of the ground truth set")
+    parser.add_argument("--gt_dir", default=os.path.join(script_dir, "ground_truth"), help="Directory with ground truth JSONs")
+    parser.add_argument("--pages", type=int, nargs="*", default=[1, 10, 100, 1000], help="Synthetic PDF sizes")
+    parser.add_argument("--no_ml", action="store_true", help="Skip the heading classifier (heuristics only)")
+    parser.add_argument("--embeddings", action="store_true", help="Also time MiniLM section encoding")
+    parser.add_argument("--save", help="Write the report as a JSON baseline")
+    parser.add_argument("--compare", help="Baseline JSON to check this run against")
+    parser.add_argument("--max_throughput_drop", type=float, default=0.2, help="Allowed pages/sec loss, as a fraction")
+    parser.add_argument("--max_f1_drop", type=float, default=0.01, help="Allowed F1 loss")
+    args = parser.parse_args()
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        # Refuse before spending the time on a run that cannot be compared
+        mismatch = settings_mismatch(settings(not args.no_ml, args.embeddings), baseline)
+        if mismatch:
+            print(f"Cannot compare with {args.compare}: " + "; ".join(mismatch))
+            sys.exit(2)
+    report = run(args.input_dir, args.gt_dir, args.pages, not args.no_ml, args.embeddings)
+    print_summary(report)
+    if args.save:
+        write_json_atomic(args.save, report)
+        print(f"Saved baseline to {args.save}")
+    if baseline is not None:
+        failures = compare(report, baseline, args.max_throughput_drop, args.max_f1_drop)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        sys.exit(1 if failures else 0)
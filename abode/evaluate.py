@@ -34,6 +34,7 @@ def evaluate(pred_dir, gt_dir):
     recall = all_tp / (all_tp + all_fn + 1e-9)
     f1 = 2 * precision * recall / (precision + recall + 1e-9)
     print(f"\nOverall: Precision={precision:.2f}, Recall={recall:.2f}, F1={f1:.2f}")
+    return {"precision": precision, "recall": recall, "f1": f1, "tp": all_tp, "fp": all_fp, "fn": all_fn}
 
 if __name__ == "__main__":
     import argparse
@@ -1,28 +1,110 @@
 import os
 import argparse
-from pdf_pipeline.parse_pdf import parse_pdf
-from pdf_pipeline.parse_docx import parse_docx
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import fitz
 from pdf_pipeline.heading_detection import detect_headings
+from pdf_pipeline.pipeline import parse_document, output_path, write_json_atomic
+from pdf_pipeline.model_registry import get_heading_classifier, configure_threads
+from pdf_pipeline.result_cache import file_sha256
 import json
 
+# Records the input hash each output was produced from, so reruns can skip it
+MANIFEST_NAME = '.batch_manifest.json'
+
 def process_pdf(pdf_path):
-    try:
-        spans = parse_pdf(pdf_path)
-    except Exception:
-        spans = parse_docx(pdf_path)
+    spans = parse_document(pdf_path)
     outline = detect_headings(spans, os.path.basename(pdf_path))
     return outline
 
-def main(input_dir, output_dir):
+def page_count(pdf_path):
+    try:
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
+    except Exception:
+        return 0
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _init_worker(threads):
+    # Each worker loads the classifier once and keeps it for all its PDFs
+    configure_threads(intra_op=threads)
+    get_heading_classifier()
+
+def _run_job(pdf_path):
+    start = time.perf_counter()
+    outline = process_pdf(pdf_path)
+    return outline, time.perf_counter() - start
+
+def main(input_dir, output_dir, workers=1, force=False):
     os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    jobs = []
     for fname in os.listdir(input_dir):
-        if fname.lower().endswith('.pdf'):
+        if fname.lower().endswith(('.pdf', '.docx')):
             pdf_path = os.path.join(input_dir, fname)
-            outline = process_pdf(pdf_path)
-            out_path = os.path.join(output_dir, os.path.splitext(fname)[0] + '.json')
-            with open(out_path, 'w', encoding='utf-8') as f:
-                json.dump(outline, f, ensure_ascii=False, indent=2)
-            print(f"Processed {fname} -> {out_path}")
+            out_path = output_path(output_dir, fname)
+            sha256 = file_sha256(pdf_path)
+            if not force and os.path.exists(out_path) and manifest.get(fname, {}).get('sha256') == sha256:
+                print(f"Skipped {fname} (output is up to date)")
+                continue
+            jobs.append((fname, pdf_path, out_path, sha256, page_count(pdf_path)))
+    # Largest documents first so they do not end up as the stragglers
+    jobs.sort(key=lambda job: -job[4])
+
+    results = []
+    failed = []
+    wall_start = time.perf_counter()
+
+    def finish(job, outline, seconds):
+        fname, _, out_path, sha256, pages = job
+        write_json_atomic(out_path, outline)
+        manifest[fname] = {'sha256': sha256, 'output': os.path.basename(out_path)}
+        write_json_atomic(os.path.join(output_dir, MANIFEST_NAME), manifest)
+        results.append((fname, pages, seconds))
+        print(f"Processed {fname} -> {out_path}")
+
+    if workers > 1 and len(jobs) > 1:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(threads,)) as pool:
+            futures = {pool.submit(_run_job, job[1]): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    outline, seconds = future.result()
+                except Exception as e:
+                    print(f"Failed {job[0]}: {e}")
+                    failed.append(job[0])
+                    continue
+                finish(job, outline, seconds)
+    else:
+        for job in jobs:
+            # One unreadable file must not stop the rest of the run
+            try:
+                outline, seconds = _run_job(job[1])
+            except Exception as e:
+                print(f"Failed {job[0]}: {e}")
+                failed.append(job[0])
+                continue
+            finish(job, outline, seconds)
+
+    wall = time.perf_counter() - wall_start
+    if results or failed:
+        print("\nThroughput summary:")
+        for fname, pages, seconds in sorted(results, key=lambda r: -r[2]):
+            print(f"  {fname}: {pages} pages in {seconds:.2f}s ({pages / max(seconds, 1e-9):.1f} pages/sec)")
+        total_pages = sum(r[1] for r in results)
+        print(f"  Total: {len(results)} files, {total_pages} pages in {wall:.2f}s "
+              f"({total_pages / max(wall, 1e-9):.1f} pages/sec, {workers} worker(s))")
+        if failed:
+            print(f"  Failed: {len(failed)} files ({', '.join(sorted(failed))})")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -31,5 +113,7 @@ if __name__ == "__main__":
     default_output = os.path.abspath(os.path.join(script_dir, '..', 'output'))
     parser.add_argument('--input_dir', default=default_input, help=f'Directory with input PDFs (default: {default_input})')
     parser.add_argument('--output_dir', default=default_output, help=f'Directory for output JSONs (default: {default_output})')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes (default: 1)')
+    parser.add_argument('--force', action='store_true', help='Reprocess PDFs whose output is up to date')
     args = parser.parse_args()
-    main(args.input_dir, args.output_dir) 
\ No newline at end of file
+    main(args.input_dir, args.output_dir, args.workers, args.force)
@@ -0,0 +1,122 @@
+import os
+import uuid
+from itertools import islice
+
+# Documents per insert_many round trip
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+
+def chunked(items, size):
+    """Yield lists of up to `size` items from any iterable without materializing it."""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def collect_into(items, sink):
+    """Pass items through while appending them to `sink`, so a stream can be written and kept."""
+    for item in items:
+        sink.append(item)
+        yield item
+
+
+# Collections holding per-PDF documents tagged with the ingest that wrote them
+PDF_COLLECTIONS = ("spans", "sections", "embeddings")
+
+
+def new_ingest_id():
+    return uuid.uuid4().hex
+
+
+def current_filter(pdf_name, ingest_id=None):
+    """
+    Query for a PDF's documents from the ingest its outline points at.
+    Readers use it so a re-ingest in progress, whose documents are written
+    before the outline switches to them, is never mixed with the current
+    one. Outlines that predate ingest_id match all of the PDF's documents.
+    Args:
+        ingest_id (Optional[str]): The ingest_id of the PDF's outline.
+    """
+    return {"pdf_name": pdf_name, "ingest_id": ingest_id} if ingest_id else {"pdf_name": pdf_name}
+
+
+def _tagged(chunk, pdf_name, ingest_id):
+    # Copies, so callers' dicts are neither tagged nor given an _id
+    return [dict(doc, pdf_name=pdf_name, ingest_id=ingest_id) for doc in chunk]
+
+
+def write_pdf_docs(db, collection, pdf_name, docs, ingest_id, chunk_size=None):
+    """
+    Write a PDF's documents for one ingest (pymongo), alongside those of the
+    ingest readers currently see. The documents are streamed in unordered
+    insert_many chunks tagged with ingest_id; a failed write removes the
+    partial set. switch_outline then points readers at ingest_id and
+    deletes the documents of the ingest it replaced.
+    Returns:
+        int: Number of documents written.
+    """
+    coll = db[collection]
+    written = 0
+    try:
+        for chunk in chunked(docs, chunk_size or BULK_CHUNK_SIZE):
+            coll.insert_many(_tagged(chunk, pdf_name, ingest_id), ordered=False)
+            written += len(chunk)
+    except Exception:
+        coll.delete_many({"pdf_name": pdf_name, "ingest_id": ingest_id})
+        raise
+    return written
+
+
+def _replaced_filter(pdf_name, replaced):
+    # Outlines that predate ingest_id replace the PDF's untagged documents;
+    # {"ingest_id": None} matches documents without the field
+    return {"pdf_name": pdf_name, "ingest_id": replaced.get("ingest_id")}
+
+
+def switch_outline(db, outline_doc, collections=PDF_COLLECTIONS):
+    """
+    Replace a PDF's outline with one naming a fully written ingest, then
+    delete the documents of the ingest the replaced outline pointed at.
+    Only that ingest is deleted, never "everything but ours": a concurrent
+    re-ingest of the same PDF may have written, or even switched to, its
+    own documents in the meantime, and whichever outline lands last
+    replaces (and cleans up after) the other.
+    Args:
+        outline_doc (dict): The new outline, with pdf_name and ingest_id.
+    Returns:
+        Optional[dict]: The replaced outline, None for a new PDF.
+    """
+    pdf_name = outline_doc["pdf_name"]
+    # Returns the document as it was before, atomically with the replace
+    replaced = db.outlines.find_one_and_replace({"pdf_name": pdf_name}, outline_doc, upsert=True)
+    if replaced is not None and replaced.get("ingest_id") != outline_doc.get("ingest_id"):
+        for collection in collections:
+            db[collection].delete_many(_replaced_filter(pdf_name, replaced))
+    return replaced
+
+
+async def write_pdf_docs_async(db, collection, pdf_name, docs, ingest_id, chunk_size=None):
+    """Motor counterpart of write_pdf_docs."""
+    coll = db[collection]
+    written = 0
+    try:
+        for chunk in chunked(docs, chunk_size or BULK_CHUNK_SIZE):
+            await coll.insert_many(_tagged(chunk, pdf_name, ingest_id), ordered=False)
+            written += len(chunk)
+    except Exception:
+        await coll.delete_many({"pdf_name": pdf_name, "ingest_id": ingest_id})
+        raise
+    return written
+
+
+async def switch_outline_async(db, outline_doc, collections=PDF_COLLECTIONS):
+    """Motor counterpart of switch_outline."""
+    pdf_name = outline_doc["pdf_name"]
+    replaced = await db.outlines.find_one_and_replace({"pdf_name": pdf_name}, outline_doc, upsert=True)
+    if replaced is not None and replaced.get("ingest_id") != outline_doc.get("ingest_id"):
+        for collection in collections:
+            await db[collection].delete_many(_replaced_filter(pdf_name, replaced))
+    return replaced
@@ -0,0 +1,187 @@
+import argparse
+import hashlib
+import os
+import numpy as np
+from bson.binary import Binary
+from pdf_pipeline.model_registry import EMBEDDING_MODEL, INFERENCE_BACKEND
+
+# Bump when the way section text is turned into a vector changes
+# (2: long sections are encoded in chunks and mean-pooled)
+EMBEDDING_VERSION = "2"
+
+VECTOR_DTYPE = np.dtype('<f4')
+
+# On-disk dtypes of stored vectors; int8 rows carry a float32 scale each
+STORAGE_DTYPES = {
+    'float32': np.dtype('<f4'),
+    'float16': np.dtype('<f2'),
+    'int8': np.dtype('i1'),
+}
+# How new vectors are stored in the `embeddings` collection
+EMBEDDING_STORAGE_DTYPE = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32")
+
+
+def model_hash():
+    """Short hash identifying the embedding model, encoding version and inference backend."""
+    key = f"{EMBEDDING_MODEL}:{EMBEDDING_VERSION}"
+    if INFERENCE_BACKEND != "torch":
+        # Quantized and ONNX vectors are close to, not equal to, the fp32 ones
+        key += f":{INFERENCE_BACKEND}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def quantize(vectors, dtype):
+    """
+    Convert float rows to a storage dtype.
+    Returns:
+        Tuple[np.ndarray, Optional[np.ndarray]]: Stored rows, and per-row
+        scales for int8 (symmetric, max |x| maps to 127), else None.
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    if dtype == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, np.newaxis]).astype(np.int8), scales.astype(VECTOR_DTYPE)
+    return vectors.astype(STORAGE_DTYPES[dtype]), None
+
+
+def dequantize(rows, scales=None):
+    rows = rows.astype(np.float32)
+    if scales is not None:
+        rows *= scales[:, np.newaxis]
+    return rows
+
+
+def encode_vectors(vectors, dtype=None):
+    """Pack rows as `dtype` bytes for storage. Returns (Binary, Binary scales or None)."""
+    rows, scales = quantize(vectors, dtype or EMBEDDING_STORAGE_DTYPE)
+    return Binary(rows.tobytes()), Binary(scales.tobytes()) if scales is not None else None
+
+
+def decode_vectors(data, dim, dtype='float32', scales=None):
+    rows = np.frombuffer(data, dtype=STORAGE_DTYPES[dtype]).reshape(-1, dim)
+    return dequantize(rows, np.frombuffer(scales, dtype=VECTOR_DTYPE) if scales is not None else None)
+
+
+def decode_doc_vector(doc):
+    """Section vector of an `embeddings` document, whatever dtype it was stored in."""
+    return decode_vectors(doc['vector'], doc['dim'], doc.get('dtype', 'float32'), doc.get('vector_scale'))[0]
+
+
+def decode_doc_chunks(doc):
+    """Chunk vectors of an `embeddings` document, or None if the section was a single chunk."""
+    if not doc.get('chunk_vectors'):
+        return None
+    return decode_vectors(doc['chunk_vectors'], doc['dim'], doc.get('dtype', 'float32'), doc.get('chunk_scales'))
+
+
+def embedding_docs(pdf_name, sections, vectors, section_chunks=None, dtype=None):
+    """
+    Build `embeddings` collection documents for a PDF's sections.
+    Args:
+        pdf_name (str): PDF the sections belong to.
+        sections (List[dict]): Section dicts with section_id and text.
+        vectors (np.ndarray): One embedding row per section.
+        section_chunks (Optional[List[np.ndarray]]): Chunk vectors per section,
+            stored for max-sim scoring where a section has more than one.
+        dtype (Optional[str]): Storage dtype, default EMBEDDING_STORAGE_DTYPE.
+    Returns:
+        List[dict]: Documents keyed by pdf_name, section_id and model_hash.
+    """
+    mhash = model_hash()
+    dtype = dtype or EMBEDDING_STORAGE_DTYPE
+    docs = []
+    for i, (section, vector) in enumerate(zip(sections, vectors)):
+        data, scale = encode_vectors(vector, dtype)
+        doc = {
+            'pdf_name': pdf_name,
+            'section_id': section['section_id'],
+            'model_hash': mhash,
+            'text_hash': text_hash(section['text']),
+            'dim': len(vector),
+            'dtype': dtype,
+            'vector': data,
+            'vector_scale': scale,
+            'chunks': 1,
+        }
+        chunks = section_chunks[i] if section_chunks is not None else None
+        if chunks is not None and len(chunks) > 1:
+            doc['chunks'] = len(chunks)
+            doc['chunk_vectors'], doc['chunk_scales'] = encode_vectors(chunks, dtype)
+        docs.append(doc)
+    return docs
+
+
+def match_section_vectors(sections, stored_docs, with_chunks=False):
+    """
+    Line stored embeddings up with the sections they were computed from.
+    A stored vector is used only if it was produced by the current model
+    and from the section's current text.
+    Args:
+        sections (List[dict]): Section dicts with section_id and text.
+        stored_docs (Iterable[dict]): Documents from the `embeddings` collection.
+        with_chunks (bool): Also return each section's stored chunk vectors.
+    Returns:
+        Tuple[List[Optional[np.ndarray]], List[int]]: Vector per section (None
+        when unusable) and the indices of sections that need re-encoding;
+        with_chunks adds a third list of chunk matrices (or None) per section.
+    """
+    mhash = model_hash()
+    by_id = {doc['section_id']: doc for doc in stored_docs if doc.get('model_hash') == mhash}
+    vectors = []
+    chunks = []
+    stale = []
+    for i, section in enumerate(sections):
+        doc = by_id.get(section['section_id'])
+        if doc is None or doc.get('text_hash') != text_hash(section['text']):
+            vectors.append(None)
+            chunks.append(None)
+            stale.append(i)
+        else:
+            vectors.append(decode_doc_vector(doc))
+            chunks.append(decode_doc_chunks(doc) if with_chunks else None)
+    if with_chunks:
+        return vectors, stale, chunks
+    return vectors, stale
+
+
+def recall_at_k(vectors, queries, k=10, dtype='int8'):
+    """
+    Mean share of the exact float32 top-k (by cosine) that is still found in
+    the top-k when the vectors are stored as `dtype`.
+    """
+    from pdf_pipeline.vector_index import normalize, top_k
+    q = normalize(queries)
+    exact = normalize(vectors) @ q.T
+    approx = normalize(dequantize(*quantize(vectors, dtype))) @ q.T
+    hits = 0
+    for j in range(q.shape[0]):
+        hits += len(set(top_k(exact[:, j], k).tolist()) & set(top_k(approx[:, j], k).tolist()))
+    return hits / (q.shape[0] * min(k, len(vectors)))
+
+
+def main():
+    """Report recall@k and bytes per vector of each storage dtype on the corpus index."""
+    from pdf_pipeline.vector_index import VECTOR_INDEX_PATH, VectorIndex
+    parser = argparse.ArgumentParser(description="Check quantized embedding storage against float32")
+    parser.add_argument("--index", default=VECTOR_INDEX_PATH, help="Vector index .npz to sample")
+    parser.add_argument("--queries", type=int, default=200, help="Stored vectors used as queries")
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+    vectors = VectorIndex.load(args.index).vectors
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+    # Perturb the queries so they are not trivially their own nearest neighbour
+    queries = queries + rng.normal(scale=queries.std(), size=queries.shape).astype(np.float32)
+    for dtype in STORAGE_DTYPES:
+        rows, scales = quantize(vectors[:1], dtype)
+        size = rows.nbytes + (scales.nbytes if scales is not None else 0)
+        print(f"{dtype:8s} {size:5d} bytes/vector  recall@{args.k} {recall_at_k(vectors, queries, args.k, dtype):.4f}")
+
+
+if __name__ == "__main__":
+    main()
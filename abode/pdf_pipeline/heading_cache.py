@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import threading
+import unicodedata
+
+from pdf_pipeline.model_registry import HEADING_MODEL, INFERENCE_BACKEND
+from pdf_pipeline.lru_cache import LRUCache
+
+# Heading classifier results kept in memory, by normalized span text
+HEADING_CACHE_SIZE = int(os.getenv("HEADING_CACHE_SIZE", "65536"))
+# SQLite file the results are also stored in, shared by the API, the ingest
+# CLI and batch_extract workers across runs; empty keeps them in memory only
+HEADING_CACHE_DB = os.getenv(
+    "HEADING_CACHE_DB",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'cache', 'heading_decisions.sqlite'))
+)
+
+_results = LRUCache(HEADING_CACHE_SIZE)
+_store = None
+_store_path = None
+_store_lock = threading.Lock()
+# Guards the counters below, updated from several inference threads at once
+_stats_lock = threading.Lock()
+_store_hits = 0
+_classified = 0
+
+
+def normalize_text(text):
+    """Canonical form of span text: NFKC, with whitespace runs collapsed."""
+    return ' '.join(unicodedata.normalize('NFKC', text).split())
+
+
+def classifier_version():
+    """The heading model and, when not plain torch, the backend it runs on."""
+    if INFERENCE_BACKEND != "torch":
+        return f"{HEADING_MODEL}:{INFERENCE_BACKEND}"
+    return HEADING_MODEL
+
+
+def _store_db():
+    global _store, _store_path
+    if _store_path != HEADING_CACHE_DB:
+        # Path changed (e.g. a benchmark switching the store off)
+        if _store is not None:
+            _store.close()
+        _store, _store_path = None, HEADING_CACHE_DB
+        if HEADING_CACHE_DB:
+            os.makedirs(os.path.dirname(os.path.abspath(HEADING_CACHE_DB)), exist_ok=True)
+            # Several processes write to it; WAL lets readers run alongside a writer
+            _store = sqlite3.connect(HEADING_CACHE_DB, timeout=30, check_same_thread=False)
+            _store.execute("PRAGMA journal_mode=WAL")
+            _store.execute("CREATE TABLE IF NOT EXISTS heading_decisions "
+                           "(model TEXT, text TEXT, label TEXT, score REAL, PRIMARY KEY (model, text))")
+    return _store
+
+
+def cached_results(texts):
+    """
+    Stored classifier results for normalized texts, from memory, then from
+    the SQLite store.
+    Returns:
+        dict: text -> {'label', 'score'} for the texts found.
+    """
+    global _store_hits
+    version = classifier_version()
+    found = {}
+    for text in texts:
+        result = _results.get((version, text))
+        if result is not None:
+            found[text] = result
+    missing = [t for t in texts if t not in found]
+    if not missing:
+        return found
+    with _store_lock:
+        db = _store_db()
+        if db is None:
+            return found
+        for i in range(0, len(missing), 500):
+            batch = missing[i:i + 500]
+            rows = db.execute("SELECT text, label, score FROM heading_decisions WHERE model = ? AND text IN (%s)"
+                              % ','.join('?' * len(batch)), (version, *batch)).fetchall()
+            for text, label, score in rows:
+                found[text] = {'label': label, 'score': score}
+                _results.put((version, text), found[text])
+            with _stats_lock:
+                _store_hits += len(rows)
+    return found
+
+
+def store_results(results):
+    """Remember classifier results (normalized text -> {'label', 'score'})."""
+    global _classified
+    version = classifier_version()
+    for text, result in results.items():
+        _results.put((version, text), result)
+    with _stats_lock:
+        _classified += len(results)
+    with _store_lock:
+        db = _store_db()
+        if db is not None and results:
+            with db:
+                db.executemany("INSERT OR REPLACE INTO heading_decisions VALUES (?, ?, ?, ?)",
+                               [(version, text, r['label'], float(r['score'])) for text, r in results.items()])
+
+
+def clear_memory():
+    _results.clear()
+
+
+def heading_cache_stats():
+    with _stats_lock:
+        counts = {'store_hits': _store_hits, 'classified': _classified}
+    return {**_results.stats(), **counts, 'store': HEADING_CACHE_DB or None}
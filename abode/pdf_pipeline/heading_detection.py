@@ -1,62 +1,216 @@
 import numpy as np
+import os
 import re
-from transformers import pipeline
+from collections import defaultdict
+from pdf_pipeline.model_registry import get_heading_classifier
+from pdf_pipeline.span_table import as_span_table
+from pdf_pipeline.heading_cache import normalize_text, cached_results, store_results
+from pdf_pipeline.metrics import timed, inference_batch_size
 
-# Load DistilBERT or similar model for heading detection
-# You can replace 'distilbert-base-uncased-finetuned-sst-2-english' with your own fine-tuned model
-heading_classifier = pipeline("text-classification", model="distilbert-base-uncased-finetuned-sst-2-english")
+# DistilBERT or similar model for heading detection, loaded lazily by the model registry.
+# Set HEADING_MODEL to replace 'distilbert-base-uncased-finetuned-sst-2-english' with your own fine-tuned model
 
 HEADING_LABELS = {"LABEL_1", "HEADING", "heading"}  # Adjust based on your model's output
 
+LEVEL_NAMES = {1: 'H1', 2: 'H2', 3: 'H3'}
 
+# Numbered ("1.", "IV.") or ALL-CAPS span text
+_HEADING_PATTERN = re.compile(r'[A-Z\s]{4,}$|(\d+\.|[IVXLC]+\.)')
+
+# Number of candidate spans sent to the classifier in one forward pass
+HEADING_BATCH_SIZE = int(os.getenv("HEADING_BATCH_SIZE", "32"))
+
+# Text on at least this fraction of a document's pages (and on at least
+# REPEATED_LINE_MIN_PAGES of them) is a running header, footer or
+# boilerplate line and is never sent to the classifier
+REPEATED_LINE_MIN_FRACTION = float(os.getenv("REPEATED_LINE_MIN_FRACTION", "0.5"))
+REPEATED_LINE_MIN_PAGES = int(os.getenv("REPEATED_LINE_MIN_PAGES", "3"))
+
+_DIGITS = re.compile(r'\d+')
+
+
+def _is_ml_result_heading(result, threshold):
+    return (result['label'] in HEADING_LABELS) and (result['score'] > threshold)
+
+
+@timed("is_heading_ml")
 def is_heading_ml(text, threshold=0.8):
     if not text or len(text) < 4:
         return False
-    result = heading_classifier(text)
-    label = result[0]['label']
-    score = result[0]['score']
-    return (label in HEADING_LABELS) and (score > threshold)
-
-
-def detect_headings(spans, pdf_name):
-    from collections import defaultdict
-    page_spans = defaultdict(list)
-    for span in spans:
-        page_spans[span['page']].append(span)
-    font_sizes = [span['font_size'] for span in spans if span['font_size']]
-    if not font_sizes:
+    return classify_headings([text], threshold, batch_size=1)[0]
+
+
+def is_ml_candidate(text, level):
+    """
+    Default candidate filter: only spans the heuristics left unlabelled can
+    change the outline, so only those are worth a classifier call.
+    """
+    return level is None and len(text) >= 4
+
+
+@timed("classify_headings")
+def classify_headings(texts, threshold=0.8, batch_size=None):
+    """
+    Batched version of is_heading_ml. Results are cached by normalized text
+    and model (see heading_cache), so only text never seen before reaches
+    the classifier.
+    Args:
+        texts (List[str]): Candidate span texts.
+        threshold (float): Minimum classifier score for a heading.
+        batch_size (int): Texts per forward pass (default HEADING_BATCH_SIZE).
+    Returns:
+        List[bool]: Heading decision per input text.
+    """
+    batch_size = batch_size or HEADING_BATCH_SIZE
+    keys = [normalize_text(t) if t and len(t) >= 4 else None for t in texts]
+    unique = {k for k in keys if k}
+    if not unique:
+        return [False] * len(texts)
+    results = cached_results(unique)
+    # Classify each distinct uncached text once; sorting by length keeps
+    # similar lengths in the same batch so little padding is wasted.
+    missing = sorted(unique - results.keys(), key=len)
+    if missing:
+        heading_classifier = get_heading_classifier()
+        classified = {}
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            inference_batch_size.observe(len(batch), model="heading_classifier")
+            outputs = heading_classifier(batch, batch_size=len(batch), truncation=True)
+            for text, result in zip(batch, outputs):
+                classified[text] = {'label': result['label'], 'score': float(result['score'])}
+        store_results(classified)
+        results.update(classified)
+    return [bool(k) and _is_ml_result_heading(results[k], threshold) for k in keys]
+
+
+def repeated_lines(table, stripped):
+    """
+    Mask of spans whose text repeats on most pages (see
+    REPEATED_LINE_MIN_FRACTION). On a page's top and bottom lines digits
+    are ignored when comparing, so "Page 3 of 12" and bare page numbers
+    count as one running footer; elsewhere only identical text repeats.
+    """
+    mask = np.zeros(len(stripped), dtype=bool)
+    page_count = len(np.unique(table.page))
+    if page_count < REPEATED_LINE_MIN_PAGES:
+        return mask
+    # Spans on the topmost or bottommost line of their page
+    edge = np.zeros(len(stripped), dtype=bool)
+    has_bbox = table.has_bbox
+    if has_bbox.any():
+        y0, y1 = table.bbox[has_bbox, 1], table.bbox[has_bbox, 3]
+        _, page_index = np.unique(table.page[has_bbox], return_inverse=True)
+        top = np.full(page_index.max() + 1, np.inf)
+        bottom = np.full(page_index.max() + 1, -np.inf)
+        np.minimum.at(top, page_index, y0)
+        np.maximum.at(bottom, page_index, y1)
+        edge[has_bbox] = (y0 <= top[page_index] + 1) | (y1 >= bottom[page_index] - 1)
+    keys = [normalize_text(t).casefold() for t in stripped]
+    keys = [_DIGITS.sub('#', k) if on_edge else k for k, on_edge in zip(keys, edge.tolist())]
+    pages = defaultdict(set)
+    for key, page in zip(keys, table.page.tolist()):
+        if key:
+            pages[key].add(page)
+    min_pages = max(REPEATED_LINE_MIN_PAGES, REPEATED_LINE_MIN_FRACTION * page_count)
+    repeated = {key for key, on in pages.items() if len(on) >= min_pages}
+    if repeated:
+        mask = np.fromiter((key in repeated for key in keys), dtype=bool, count=len(keys))
+    return mask
+
+
+def _heading_levels(table, stripped):
+    """
+    Heuristic level per span (0 = none, 1-3 = H1-H3): font-size percentile
+    thresholds computed over the whole column, then the numbered/ALL-CAPS
+    regexes for spans the sizes left unlabelled.
+    """
+    sizes = table.size
+    h1_thresh, h2_thresh, h3_thresh = np.percentile(sizes[sizes != 0], [90, 70, 50])
+    # Heuristic font size
+    levels = np.select(
+        [sizes >= h1_thresh, sizes >= h2_thresh, sizes >= h3_thresh],
+        [1, 2, 3], default=0
+    ).astype(np.int8)
+    # Regex for numbered or ALL-CAPS; it can only fill in a missing level
+    for i in np.flatnonzero(levels == 0):
+        if _HEADING_PATTERN.match(stripped[i]):
+            levels[i] = 2
+    return levels
+
+
+def font_headings(spans):
+    """
+    Bold spans in the three largest font sizes, levelled H1-H3 by size: the
+    /headings view of a document, stored at ingest (detect_headings builds
+    the outline instead).
+    Returns:
+        List[dict]: text, level, font_name, font_size, font_weight, page and
+        bbox per heading span, in document order.
+    """
+    table = as_span_table(spans)
+    if not len(table):
+        return []
+    unique_sizes = np.unique(table.size)[::-1]
+    h1_thresh = unique_sizes[0]
+    h2_thresh = unique_sizes[1] if len(unique_sizes) > 1 else h1_thresh
+    h3_thresh = unique_sizes[2] if len(unique_sizes) > 2 else h2_thresh
+    headings = []
+    for i in np.flatnonzero(table.bold & (table.size >= h3_thresh)):
+        span = table[i]
+        size = table.size[i]
+        headings.append({
+            "text": span["text"],
+            "level": "H1" if size == h1_thresh else "H2" if size == h2_thresh else "H3",
+            "font_name": span["font_name"],
+            "font_size": span["font_size"],
+            "font_weight": span["font_weight"],
+            "page": span["page"],
+            "bbox": span["bbox"]
+        })
+    return headings
+
+
+@timed("detect_headings")
+def detect_headings(spans, pdf_name, batch_size=None, candidate_filter=is_ml_candidate, decisions=None):
+    """
+    Outline of a document: font-size and regex heuristics, then the heading
+    classifier for candidates they left unlabelled.
+    Args:
+        decisions (dict): Classifier decision per candidate text. Texts found
+            in it are not classified again, and new decisions are added to it,
+            so a re-ingest can pass the previous version's decisions.
+    Returns:
+        dict: title and outline ([{level, text, page}]).
+    """
+    table = as_span_table(spans)
+    if not np.any(table.size != 0):
         return {'title': '', 'outline': []}
-    size_arr = np.array(font_sizes)
-    h1_thresh = np.percentile(size_arr, 90)
-    h2_thresh = np.percentile(size_arr, 70)
-    h3_thresh = np.percentile(size_arr, 50)
-    outline = []
+    texts = table.texts()
     title = ''
-    page1_spans = page_spans.get(1, [])
-    if page1_spans:
-        max_span = max(page1_spans, key=lambda s: s['font_size'])
-        title = max_span['text']
-    for span in spans:
-        text = span['text'].strip()
-        if not text:
-            continue
-        level = None
-        # Heuristic font size
-        if span['font_size'] >= h1_thresh:
-            level = 'H1'
-        elif span['font_size'] >= h2_thresh:
-            level = 'H2'
-        elif span['font_size'] >= h3_thresh:
-            level = 'H3'
-        # Regex for numbered or ALL-CAPS
-        if re.match(r'^[A-Z\s]{4,}$', text):
-            level = level or 'H2'
-        if re.match(r'^(\d+\.|[IVXLC]+\.)', text):
-            level = level or 'H2'
-        # ML-based heading detection
-        if is_heading_ml(text):
-            if not level:
-                level = 'H2'  # Default to H2 if ML says heading but no size/regex match
-        if level:
-            outline.append({'level': level, 'text': text, 'page': span['page']})
-    return {'title': title, 'outline': outline} 
\ No newline at end of file
+    page1 = np.flatnonzero(table.page == 1)
+    if len(page1):
+        title = texts[page1[np.argmax(table.size[page1])]]
+    # Pass 1: font-size and regex heuristics over every span
+    stripped = [t.strip() for t in texts]
+    levels = _heading_levels(table, stripped)
+    nonempty = np.fromiter((bool(t) for t in stripped), dtype=bool, count=len(stripped))
+    # Pass 2: ML-based heading detection, batched over the remaining candidates
+    unlabelled = np.flatnonzero(nonempty & (levels == 0))
+    candidates = [i for i in unlabelled if candidate_filter(stripped[i], None)]
+    if candidates:
+        # Headers and footers are recognised once per document instead of
+        # being classified on every page
+        repeated = repeated_lines(table, stripped)
+        candidates = [i for i in candidates if not repeated[i]]
+    decisions = {} if decisions is None else decisions
+    unseen = [t for t in dict.fromkeys(stripped[i] for i in candidates) if t not in decisions]
+    decisions.update(zip(unseen, classify_headings(unseen, batch_size=batch_size)))
+    for i in candidates:
+        if decisions[stripped[i]]:
+            levels[i] = 2  # Default to H2 if ML says heading but no size/regex match
+    outline = []
+    pages = table.page.tolist()
+    for i in np.flatnonzero(nonempty & (levels > 0)):
+        outline.append({'level': LEVEL_NAMES[levels[i]], 'text': stripped[i], 'page': pages[i]})
+    return {'title': title, 'outline': outline}
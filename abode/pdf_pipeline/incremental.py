@@ -0,0 +1,177 @@
+import os
+import numpy as np
+from pdf_pipeline.parse_pdf import parse_pdf, parse_pages, page_fingerprints
+from pdf_pipeline.parse_docx import parse_docx, is_docx
+from pdf_pipeline.span_table import SpanTable
+from pdf_pipeline.heading_detection import detect_headings
+from pdf_pipeline.ingest import extract_sections
+from pdf_pipeline.relevance import encode_section_chunks
+from pdf_pipeline.result_cache import pipeline_versions
+from pdf_pipeline.metrics import errors_total
+
+# Re-ingest a revised PDF from its previous version's cached results,
+# parsing, classifying and embedding only what changed
+INCREMENTAL_INGEST = os.getenv("INCREMENTAL_INGEST", "true").lower() in ("1", "true", "yes")
+
+
+def previous_results(cache, previous_key, key):
+    """
+    Cached results of the version of a PDF that is being replaced, if they
+    can seed an incremental re-ingest: same pipeline and models, and stored
+    with page fingerprints.
+    Args:
+        cache (ResultCache): The result cache.
+        previous_key (Optional[str]): cache_key of the PDF's current outline.
+        key (str): cache_key of the new file.
+    Returns:
+        Optional[dict]: As from ResultCache.get, or None.
+    """
+    if not INCREMENTAL_INGEST or not previous_key or previous_key == key:
+        return None
+    previous = cache.get(previous_key)
+    if previous is None or previous['page_fingerprints'] is None or previous['versions'] != pipeline_versions():
+        return None
+    return previous
+
+
+def _page_rows(table):
+    # (first, end) row of each page's spans; parsing emits them page by page
+    if not len(table):
+        return {}
+    bounds = np.flatnonzero(np.r_[True, table.page[1:] != table.page[:-1], True])
+    return {int(table.page[a]): (a, b) for a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist())}
+
+
+def parse_revision(pdf_path, fingerprints, previous):
+    """
+    Spans of a revised PDF. Pages whose fingerprint the previous version also
+    had (wherever they were) are copied from its spans and renumbered; only
+    the others are parsed.
+    Returns:
+        Tuple[SpanTable, List[int]]: The spans and the page numbers parsed.
+    """
+    old = previous['spans']
+    old_rows = _page_rows(old)
+    reusable = {}
+    for number, fingerprint in enumerate(previous['page_fingerprints'], 1):
+        # Pages that had no spans (blank or failed) are parsed again
+        if number in old_rows:
+            reusable.setdefault(fingerprint, old_rows[number])
+    parse = [n for n, fingerprint in enumerate(fingerprints, 1) if fingerprint not in reusable]
+    parsed = parse_pages(pdf_path, parse)
+    parsed_rows = _page_rows(parsed)
+    # Rows of old + parsed, in the new page order, gathered in one take
+    rows, pages = [], []
+    for number, fingerprint in enumerate(fingerprints, 1):
+        if fingerprint in reusable:
+            a, b = reusable[fingerprint]
+        elif number in parsed_rows:
+            a, b = (len(old) + i for i in parsed_rows[number])
+        else:
+            continue
+        rows.append(np.arange(a, b))
+        pages.append(np.full(b - a, number, dtype=np.int32))
+    table = SpanTable.concat([old, parsed])
+    if rows:
+        table = table.take(np.concatenate(rows))
+        table.page = np.concatenate(pages)
+    else:
+        table = table.take(np.empty(0, dtype=np.int64))
+    table.failed_pages = parsed.failed_pages
+    return table, parse
+
+
+def encode_changed_sections(sections, previous=None):
+    """
+    Section vectors, reusing the previous version's for sections whose text
+    is unchanged and encoding the rest.
+    Returns:
+        Tuple[np.ndarray, List[np.ndarray], int]: Vectors and chunk matrices
+        as from encode_section_chunks, and the number of sections encoded.
+    """
+    known = {}
+    if previous is not None:
+        for section, vector, chunks in zip(previous['sections'], previous['vectors'], previous['chunks']):
+            known[section['text']] = (vector, chunks)
+    missing = [s['text'] for s in sections if s['text'] not in known]
+    if len(missing) == len(sections):
+        vectors, chunks = encode_section_chunks(missing)
+        return vectors, chunks, len(missing)
+    new_vectors, new_chunks = encode_section_chunks(list(dict.fromkeys(missing)))
+    known.update((text, encoded) for text, encoded in zip(dict.fromkeys(missing), zip(new_vectors, new_chunks)))
+    vectors = np.stack([known[s['text']][0] for s in sections]).astype(np.float32)
+    return vectors, [known[s['text']][1] for s in sections], len(set(missing))
+
+
+def _parse_full(pdf_path):
+    # parse_document, plus page fingerprints when the file was read as a PDF
+    if is_docx(pdf_path):
+        return SpanTable.from_dicts(parse_docx(pdf_path)), None
+    try:
+        fingerprints = page_fingerprints(pdf_path)
+        return parse_pdf(pdf_path), fingerprints
+    except Exception:
+        # fitz cannot read the file: the DOCX route, as in parse_document
+        return SpanTable.from_dicts(parse_docx(pdf_path)), None
+
+
+def _ingest(pdf_path, pdf_name, previous, stage):
+    stage("parsing")
+    if previous is not None:
+        fingerprints = page_fingerprints(pdf_path)
+        spans, parsed = parse_revision(pdf_path, fingerprints, previous)
+    else:
+        (spans, fingerprints), parsed = _parse_full(pdf_path), None
+    stage("detecting headings")
+    decisions = dict(previous['ml_decisions'] or {}) if previous is not None else {}
+    known = len(decisions)
+    outline = detect_headings(spans, pdf_name, decisions=decisions)
+    classified = len(decisions) - known
+    # Keep only decisions about text still in the document
+    texts = {t.strip() for t in spans.texts()}
+    decisions = {t: d for t, d in decisions.items() if t in texts}
+    stage("extracting sections")
+    sections = extract_sections(spans, outline)
+    # Section embeddings are computed once here so /persona-query can reuse them
+    stage("embedding sections")
+    vectors, chunks, encoded = encode_changed_sections(sections, previous)
+    results = {"spans": spans, "outline": outline, "sections": sections, "vectors": vectors, "chunks": chunks,
+               "page_fingerprints": fingerprints, "ml_decisions": decisions}
+    if previous is not None:
+        results["incremental"] = {
+            "pages": len(fingerprints),
+            "parsed_pages": len(parsed),
+            "classified_texts": classified,
+            "sections": len(sections),
+            "encoded_sections": encoded,
+        }
+    return results
+
+
+def ingest_results(pdf_path, pdf_name, previous=None, stage=None):
+    """
+    Parse, detect headings, extract sections and embed them; with the
+    previous version's results, only changed pages are parsed, only texts
+    not classified before go to the heading classifier and only changed
+    sections are encoded. Font-size thresholds are still computed over the
+    whole document, so the outline is the same as a full ingest's. If the
+    incremental path fails (e.g. on a malformed cache entry), the file is
+    ingested in full instead.
+    Only the computation is incremental: callers still replace the PDF's
+    spans, sections and embeddings in Mongo and its vector index rows.
+    Args:
+        previous (Optional[dict]): From previous_results.
+        stage (Callable[[str], None]): Progress callback.
+    Returns:
+        dict: spans, outline, sections, vectors and chunks, plus
+        page_fingerprints and ml_decisions to cache, and, when incremental,
+        what was redone under 'incremental'.
+    """
+    stage = stage or (lambda name: None)
+    if previous is not None:
+        try:
+            return _ingest(pdf_path, pdf_name, previous, stage)
+        except Exception as e:
+            print(f"Incremental re-ingest of {pdf_path} failed ({e}); ingesting it in full")
+            errors_total.inc(stage="incremental_ingest")
+    return _ingest(pdf_path, pdf_name, None, stage)
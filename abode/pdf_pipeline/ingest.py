@@ -1,59 +1,168 @@
 import argparse
 import os
-from pdf_pipeline.parse_pdf import parse_pdf
-from pdf_pipeline.parse_docx import parse_docx
-from pdf_pipeline.mongo_utils import insert_spans, insert_outline, insert_sections
-from pdf_pipeline.heading_detection import detect_headings
+from collections import defaultdict, deque
+import numpy as np
+from pdf_pipeline.parse_pdf import iter_spans, page_fingerprints
+from pdf_pipeline.parse_docx import parse_docx, is_docx
+from pdf_pipeline.mongo_utils import get_db, insert_spans, insert_outline, insert_sections, insert_embeddings, close_clients
+from pdf_pipeline.heading_detection import detect_headings, font_headings
+from pdf_pipeline.relevance import encode_section_chunks, is_scorable
+from pdf_pipeline.vector_index import update_index
+from pdf_pipeline.bulk_writer import collect_into, new_ingest_id
+from pdf_pipeline.span_table import SpanTable, SpanTableBuilder, as_span_table
+from pdf_pipeline.embedding_store import embedding_docs
+from pdf_pipeline.result_cache import file_sha256, cache_key, get_result_cache
+from pdf_pipeline.metrics import timed, stage_breakdown, rounded
+from pdf_pipeline.mongo_models import ensure_indexes
 
 
+def reading_order(table):
+    """Span indices sorted by page, then top-to-bottom, then left-to-right."""
+    # Spans without layout (DOCX) sort at (0, 0), keeping document order within the page
+    has_bbox = table.has_bbox
+    y0 = np.where(has_bbox, table.bbox[:, 1], 0.0)
+    x0 = np.where(has_bbox, table.bbox[:, 0], 0.0)
+    return np.lexsort((x0, y0, table.page))
+
+
+def locate_headings(table, stripped, headings):
+    """
+    Index of the span each outline heading was detected on. Headings are
+    matched on (page, stripped text) in document order; one that cannot be
+    matched falls back to the first span of its page.
+    """
+    occurrences = defaultdict(deque)
+    first_on_page = {}
+    for i, (page, text) in enumerate(zip(table.page.tolist(), stripped)):
+        occurrences[(page, text)].append(i)
+        first_on_page.setdefault(page, i)
+    positions = []
+    last = -1
+    for heading in headings:
+        candidates = occurrences.get((heading['page'], heading['text']))
+        while candidates and candidates[0] <= last:
+            candidates.popleft()
+        if candidates:
+            last = candidates.popleft()
+            positions.append(last)
+        else:
+            positions.append(first_on_page.get(heading['page']))
+    return positions
+
+
+@timed("extract_sections")
 def extract_sections(spans, outline):
     """
     Group spans into sections based on outline headings.
-    Returns a list of section dicts with section_id, level, text, page_start, page_end.
+    Spans are walked once in reading order and cut at each heading span, so
+    headings sharing a page get their own text.
+    Returns a list of section dicts with section_id, level, text, page_start,
+    page_end, and span_start/span_end (reading-order offsets, end exclusive).
     """
-    if not outline or not outline.get('outline'):
+    if not outline or not outline.get('outline') or not len(spans):
         return []
+    table = as_span_table(spans)
+    texts = table.texts()
+    order = reading_order(table)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
     headings = outline['outline']
+    cuts = []
+    for heading, span_index in zip(headings, locate_headings(table, [t.strip() for t in texts], headings)):
+        if span_index is not None:
+            cuts.append((int(rank[span_index]), heading))
+    cuts.sort(key=lambda cut: cut[0])
+    order = order.tolist()
+    pages = table.page.tolist()
     sections = []
-    current_section = None
-    section_id = 0
-    for i, heading in enumerate(headings):
-        section_id += 1
-        start_page = heading['page']
-        end_page = headings[i+1]['page']-1 if i+1 < len(headings) else max(s['page'] for s in spans)
-        # Collect all spans between start_page and end_page
-        section_spans = [s for s in spans if start_page <= s['page'] <= end_page]
-        section_text = '\n'.join(s['text'] for s in section_spans)
+    for n, (start, heading) in enumerate(cuts):
+        end = cuts[n + 1][0] if n + 1 < len(cuts) else len(order)
+        section_spans = order[start:end]
         sections.append({
-            'section_id': f"{section_id}",
+            'section_id': f"{n + 1}",
             'level': heading['level'],
-            'text': section_text,
-            'page_start': start_page,
-            'page_end': end_page
+            'text': '\n'.join(texts[i] for i in section_spans),
+            'page_start': pages[section_spans[0]] if section_spans else heading['page'],
+            'page_end': pages[section_spans[-1]] if section_spans else heading['page'],
+            'span_start': start,
+            'span_end': end
         })
     return sections
 
 
 def main():
     parser = argparse.ArgumentParser(description="Intelligent PDF Processing Pipeline")
-    parser.add_argument("input", nargs='+', help="Input PDF file(s)")
+    parser.add_argument("input", nargs='+', help="Input PDF or DOCX file(s)")
     parser.add_argument("--mongo-uri", default="mongodb://localhost:27017", help="MongoDB URI")
     parser.add_argument("--db", default="abode", help="MongoDB database name")
+    parser.add_argument("--skip-indexes", action="store_true", help="Do not create missing MongoDB indexes")
     args = parser.parse_args()
 
+    # Imported here: incremental builds on extract_sections above
+    from pdf_pipeline.incremental import previous_results, ingest_results
+    db, _ = get_db(args.mongo_uri, args.db)
+    if not args.skip_indexes:
+        for problem in ensure_indexes(db):
+            print(f"Index check: {problem}")
+    cache = get_result_cache()
     for pdf_path in args.input:
-        pdf_name = os.path.basename(pdf_path)
-        try:
-            spans = parse_pdf(pdf_path)
-        except Exception as e:
-            print(f"PDF parsing failed for {pdf_path}: {e}. Attempting DOCX fallback...")
-            spans = parse_docx(pdf_path)
-        insert_spans(spans, pdf_name, args.mongo_uri, args.db)
-        outline = detect_headings(spans, pdf_name)
-        insert_outline(outline, pdf_name, args.mongo_uri, args.db)
-        # --- New: Extract and insert sections ---
-        sections = extract_sections(spans, outline)
-        insert_sections(sections, pdf_name, args.mongo_uri, args.db)
+        with stage_breakdown() as stages:
+            pdf_name = os.path.basename(pdf_path)
+            content_sha256 = file_sha256(pdf_path)
+            key = cache_key(content_sha256)
+            cached = cache.get(key)
+            current = db.outlines.find_one({'pdf_name': pdf_name}, {'cache_key': 1})
+            previous = None if cached is not None else previous_results(cache, current and current.get('cache_key'), key)
+            # Readers keep seeing the previous ingest until the outline points at this one
+            ingest_id = new_ingest_id()
+            if cached is not None:
+                # Same content ingested before: reuse its results under this pdf_name
+                print(f"Using cached results for {pdf_path}")
+                spans, outline, sections = cached['spans'], cached['outline'], cached['sections']
+                vectors, chunks = cached['vectors'], cached['chunks']
+                insert_spans(spans, pdf_name, args.mongo_uri, args.db, ingest_id)
+            elif previous is not None:
+                # Revision of a PDF ingested before: redo only what changed
+                results = ingest_results(pdf_path, pdf_name, previous)
+                spans, outline, sections = results['spans'], results['outline'], results['sections']
+                vectors, chunks = results['vectors'], results['chunks']
+                print(f"Incremental re-ingest of {pdf_path}: {results.get('incremental')}")
+                insert_spans(spans, pdf_name, args.mongo_uri, args.db, ingest_id)
+                cache.put(key, spans, outline, sections, vectors, chunks, results['page_fingerprints'], results['ml_decisions'])
+            else:
+                fingerprints = None
+                if is_docx(pdf_path):
+                    spans = SpanTable.from_dicts(parse_docx(pdf_path))
+                    insert_spans(spans, pdf_name, args.mongo_uri, args.db, ingest_id)
+                else:
+                    spans = SpanTableBuilder()
+                    try:
+                        # Spans are written in chunks as the parser yields them, and kept for detection
+                        fingerprints = page_fingerprints(pdf_path)
+                        insert_spans(collect_into(iter_spans(pdf_path), spans), pdf_name, args.mongo_uri, args.db, ingest_id)
+                        spans = spans.build()
+                    except Exception as e:
+                        print(f"PDF parsing failed for {pdf_path}: {e}. Attempting DOCX fallback...")
+                        fingerprints = None
+                        spans = SpanTable.from_dicts(parse_docx(pdf_path))
+                        insert_spans(spans, pdf_name, args.mongo_uri, args.db, ingest_id)
+                decisions = {}
+                outline = detect_headings(spans, pdf_name, decisions=decisions)
+                # --- New: Extract and insert sections ---
+                sections = extract_sections(spans, outline)
+                # Section embeddings are computed once here so /persona-query can reuse them
+                vectors, chunks = encode_section_chunks([s['text'] for s in sections])
+                cache.put(key, spans, outline, sections, vectors, chunks, fingerprints, decisions)
+            insert_sections(sections, pdf_name, args.mongo_uri, args.db, ingest_id)
+            insert_embeddings(embedding_docs(pdf_name, sections, vectors, chunks), pdf_name, args.mongo_uri, args.db, ingest_id)
+            indexed = [i for i, s in enumerate(sections) if is_scorable(s['text'])]
+            update_index(pdf_name, [sections[i]['section_id'] for i in indexed], [vectors[i] for i in indexed])
+            # Written last, as by the API: its cache_key marks pdf_name as fully linked to this content
+            insert_outline(outline, pdf_name, args.mongo_uri, args.db, font_headings(spans), content_sha256, key,
+                           ingest_id)
+        # Seconds per stage, MongoDB round trips included, as /ingest jobs report them
+        print(f"Stage seconds for {pdf_path}: {rounded(stages)}")
+    close_clients()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
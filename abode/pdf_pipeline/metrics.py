@@ -0,0 +1,210 @@
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from pymongo import monitoring
+
+# Upper bounds of the histogram buckets, in seconds and in items per batch
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+_registry = []
+_collectors = []
+_lock = threading.Lock()
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic count per label set."""
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with _lock:
+            items = list(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, per label set."""
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with _lock:
+            self._values[key] = value
+
+
+class Histogram:
+    """Bucketed distribution per label set, rendered with cumulative buckets as Prometheus expects."""
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._values = {}
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with _lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with _lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                samples.append((self.name + '_bucket', {**labels, 'le': le}, cumulative))
+            samples.append((self.name + '_sum', labels, total))
+            samples.append((self.name + '_count', labels, cumulative))
+        return samples
+
+
+stage_seconds = Histogram('abode_stage_seconds', 'Wall time of pipeline stages.', labelnames=('stage',))
+inference_batch_size = Histogram('abode_inference_batch_size', 'Texts per model forward pass.',
+                                 BATCH_BUCKETS, labelnames=('model',))
+errors_total = Counter('abode_errors_total', 'Errors caught and logged instead of failing the request.',
+                       labelnames=('stage',))
+mongo_command_seconds = Histogram('abode_mongo_command_seconds', 'MongoDB command round trips.',
+                                  labelnames=('command', 'status'))
+
+# Stage timings of the current request, when one is collecting them
+_breakdown = contextvars.ContextVar('stage_breakdown', default=None)
+
+
+@contextmanager
+def timer(stage):
+    """Time the enclosed block into abode_stage_seconds and the request's stage breakdown."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stage_seconds.observe(seconds, stage=stage)
+        _add_to_breakdown(stage, seconds)
+
+
+def _add_to_breakdown(stage, seconds):
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        with _lock:
+            breakdown[stage] = breakdown.get(stage, 0.0) + seconds
+
+
+def timed(stage):
+    """Decorator form of timer()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def stage_breakdown(breakdown=None):
+    """
+    Collect the seconds spent per stage by everything run in this context
+    (including tasks it starts and inference threads it hands work to), into
+    `breakdown` if given. Stages of concurrent documents add up, so totals
+    can exceed wall time.
+    """
+    breakdown = {} if breakdown is None else breakdown
+    token = _breakdown.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _breakdown.reset(token)
+
+
+def rounded(breakdown, digits=4):
+    with _lock:
+        return {stage: round(seconds, digits) for stage, seconds in sorted(breakdown.items())}
+
+
+def register_collector(collect):
+    """
+    Add a callable run at every scrape, for values owned elsewhere (cache
+    statistics, queue lengths). It returns (name, kind, help, samples) tuples,
+    samples being (labels, value) pairs.
+    """
+    _collectors.append(collect)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    families = [(m.name, m.kind, m.help, m.samples()) for m in _registry]
+    for collect in _collectors:
+        families.extend((name, kind, help, [(name, labels, value) for labels, value in samples])
+                        for name, kind, help, samples in collect())
+    for name, kind, help, samples in families:
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for sample_name, labels, value in samples:
+            lines.append(f'{sample_name}{_label_text(labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Times every MongoDB command a client sends; pass it in the client's
+    event_listeners. Commands sent from a thread collecting a stage
+    breakdown (pymongo runs listeners in the calling thread) also add up
+    under its "mongo" stage.
+    """
+
+    def started(self, event):
+        pass
+
+    def _record(self, event, status):
+        seconds = event.duration_micros / 1e6
+        mongo_command_seconds.observe(seconds, command=event.command_name, status=status)
+        _add_to_breakdown('mongo', seconds)
+
+    def succeeded(self, event):
+        self._record(event, 'ok')
+
+    def failed(self, event):
+        self._record(event, 'failed')
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+
+# Model names can be overridden to point at local or fine-tuned checkpoints
+HEADING_MODEL = os.getenv("HEADING_MODEL", "distilbert-base-uncased-finetuned-sst-2-english")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+# Load every model at startup instead of on first use
+WARMUP_MODELS = os.getenv("WARMUP_MODELS", "false").lower() in ("1", "true", "yes")
+
+# How models run on CPU: "torch" (fp32), "quantized" (torch dynamic int8
+# Linear layers) or "onnx" (exported to ONNX Runtime, needs optimum[onnxruntime])
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+BACKENDS = ("torch", "quantized", "onnx")
+# Threads inside one operator and across independent operators; 0 keeps the runtime default
+INTRA_OP_THREADS = int(os.getenv("INTRA_OP_THREADS", "0"))
+INTER_OP_THREADS = int(os.getenv("INTER_OP_THREADS", "0"))
+
+_models = {}
+_stats = {}
+_lock = threading.Lock()
+# Guards _stats; separate from _lock so counting uses never waits on a model load
+_stats_lock = threading.Lock()
+_threads_configured = False
+
+
+def configure_threads(intra_op=None, inter_op=None):
+    """
+    Apply the torch thread settings. Inter-op threads can only be set before
+    torch runs anything in parallel, so this happens once, before the first load.
+    """
+    global _threads_configured
+    import torch
+    intra_op = intra_op if intra_op is not None else INTRA_OP_THREADS
+    inter_op = inter_op if inter_op is not None else INTER_OP_THREADS
+    if intra_op > 0:
+        torch.set_num_threads(intra_op)
+    if inter_op > 0 and not _threads_configured:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:
+            print(f"Could not set inter-op threads: {e}")
+    _threads_configured = True
+
+
+def _session_options():
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    if INTRA_OP_THREADS > 0:
+        options.intra_op_num_threads = INTRA_OP_THREADS
+    if INTER_OP_THREADS > 0:
+        options.inter_op_num_threads = INTER_OP_THREADS
+    return options
+
+
+def _quantize(module):
+    # Weights of every Linear layer stored as int8, activations quantized on the fly
+    import torch
+    from torch.ao.quantization import quantize_dynamic
+    return quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_text_classifier(name, backend):
+    from transformers import pipeline
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from transformers import AutoTokenizer
+        model = ORTModelForSequenceClassification.from_pretrained(
+            name, export=True, provider="CPUExecutionProvider", session_options=_session_options())
+        return pipeline("text-classification", model=model, tokenizer=AutoTokenizer.from_pretrained(name))
+    classifier = pipeline("text-classification", model=name, device=-1)
+    if backend == "quantized":
+        classifier.model = _quantize(classifier.model)
+    return classifier
+
+
+def _load_sentence_encoder(name, backend):
+    from sentence_transformers import SentenceTransformer
+    if backend == "onnx":
+        return SentenceTransformer(name, device='cpu', backend="onnx",
+                                   model_kwargs={"provider": "CPUExecutionProvider",
+                                                 "session_options": _session_options()})
+    encoder = SentenceTransformer(name, device='cpu')
+    if backend == "quantized":
+        encoder = _quantize(encoder)
+    return encoder
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def _param_bytes(model):
+    # transformers pipelines wrap the torch module in .model
+    module = getattr(model, 'model', model)
+    parameters = getattr(module, 'parameters', None)
+    if parameters is None:
+        return 0
+    return sum(p.numel() * p.element_size() for p in parameters())
+
+
+def _registry_key(name, backend):
+    return name if backend == "torch" else f"{name} [{backend}]"
+
+
+def get_model(name, loader, backend=None):
+    """
+    Return the shared instance of a model, loading it on first use.
+    Args:
+        name (str): Model name.
+        loader (Callable[[str, str], object]): Builds the model from its name and backend.
+        backend (Optional[str]): One of BACKENDS, default INFERENCE_BACKEND.
+    Returns:
+        object: The loaded model.
+    """
+    backend = backend or INFERENCE_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {BACKENDS}")
+    key = _registry_key(name, backend)
+    model = _models.get(key)
+    if model is None:
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                if not _threads_configured:
+                    configure_threads()
+                rss_before = _rss_bytes()
+                start = time.perf_counter()
+                model = loader(name, backend)
+                stats = {
+                    'backend': backend,
+                    'load_seconds': round(time.perf_counter() - start, 3),
+                    'rss_delta_bytes': max(_rss_bytes() - rss_before, 0),
+                    'param_bytes': _param_bytes(model),
+                    'uses': 0,
+                }
+                with _stats_lock:
+                    _stats[key] = stats
+                _models[key] = model
+    # += from several inference threads at once would lose updates
+    with _stats_lock:
+        _stats[key]['uses'] += 1
+    return model
+
+
+def get_heading_classifier(backend=None):
+    return get_model(HEADING_MODEL, _load_text_classifier, backend)
+
+
+def get_sentence_encoder(backend=None):
+    return get_model(EMBEDDING_MODEL, _load_sentence_encoder, backend)
+
+
+def warmup():
+    """Load all pipeline models now rather than on the first request."""
+    get_heading_classifier()
+    get_sentence_encoder()
+
+
+def model_stats():
+    """Load time, memory and use count for every model loaded so far."""
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
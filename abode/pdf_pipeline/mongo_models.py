@@ -1,6 +1,11 @@
 from pymongo import MongoClient, ASCENDING
+from pymongo.errors import OperationFailure
 from pymongo.operations import IndexModel
 
+# Each model lists its indexes and the filter shapes the app and CLIs
+# query it with: the fields used together, equality fields first, then the
+# range or sort field. check_coverage matches the two against the database.
+
 class Span:
     collection_name = 'spans'
     schema = {
@@ -10,25 +15,41 @@ class Span:
         'font_name': str,
         'font_size': float,
         'font_weight': str,
-        'bbox': list  # [x0, y0, x1, y1]
+        'bbox': list,  # [x0, y0, x1, y1]
+        'ingest_id': str  # ingest run that wrote the document, see bulk_writer
     }
+    indexes = [
+        IndexModel([('pdf_name', ASCENDING), ('ingest_id', ASCENDING), ('page', ASCENDING)]),
+    ]
+    query_shapes = [
+        ('pdf_name', 'ingest_id'),  # legacy /headings, bulk_writer dropping stale spans
+    ]
     @classmethod
     def create_indexes(cls, db):
-        db[cls.collection_name].create_index([
-            ('pdf_name', ASCENDING),
-            ('page', ASCENDING)
-        ])
+        db[cls.collection_name].create_indexes(cls.indexes)
 
 class Outline:
     collection_name = 'outlines'
     schema = {
         'pdf_name': str,
         'title': str,
-        'outline': list  # [{level, text, page}]
+        'outline': list,  # [{level, text, page}]
+        'headings': list,  # /headings view, see heading_detection.font_headings
+        'content_sha256': str,
+        'cache_key': str,  # ingest version, also what read endpoint ETags derive from
+        'ingest_id': str  # ingest whose spans, sections and embeddings readers see
     }
+    indexes = [
+        # One outline per PDF, upserted by name
+        IndexModel([('pdf_name', ASCENDING)], unique=True),
+        IndexModel([('content_sha256', ASCENDING)]),
+    ]
+    query_shapes = [
+        ('pdf_name',),  # /outline, /headings, read_cache.pdf_version, ingest
+    ]
     @classmethod
     def create_indexes(cls, db):
-        db[cls.collection_name].create_index('pdf_name')
+        db[cls.collection_name].create_indexes(cls.indexes)
 
 class Section:
     collection_name = 'sections'
@@ -38,49 +59,172 @@ class Section:
         'level': str,
         'text': str,
         'page_start': int,
-        'page_end': int
+        'page_end': int,
+        'span_start': int,  # reading-order span offsets, end exclusive
+        'span_end': int,
+        'ingest_id': str
     }
+    indexes = [
+        IndexModel([('pdf_name', ASCENDING), ('ingest_id', ASCENDING), ('section_id', ASCENDING)]),
+        # /sections pages through a PDF's sections in reading order
+        IndexModel([('pdf_name', ASCENDING), ('ingest_id', ASCENDING), ('span_start', ASCENDING)]),
+    ]
+    # Readers match the ingest_id of the PDF's outline, see bulk_writer.current_filter
+    query_shapes = [
+        ('pdf_name', 'ingest_id'),  # analysis.load_sections, bulk_writer
+        ('pdf_name', 'ingest_id', 'section_id'),  # /summaries, fetch_hit_sections, /sections ranges
+        ('pdf_name', 'ingest_id', 'span_start'),  # /sections paging
+    ]
     @classmethod
     def create_indexes(cls, db):
-        db[cls.collection_name].create_index([
-            ('pdf_name', ASCENDING),
-            ('section_id', ASCENDING)
-        ])
+        db[cls.collection_name].create_indexes(cls.indexes)
 
 class Embedding:
     collection_name = 'embeddings'
     schema = {
         'pdf_name': str,
         'section_id': str,
-        'vector': list,  # float array
-        'persona_job': str
+        'model_hash': str,  # embedding model + version, see embedding_store.model_hash
+        'text_hash': str,  # sha1 of the section text the vector was computed from
+        'dim': int,
+        'dtype': str,  # storage dtype of vector, see embedding_store.STORAGE_DTYPES
+        'vector': bytes,  # little-endian array of dtype
+        'vector_scale': bytes,  # float32 row scale when dtype is int8
+        'chunks': int,  # windows the section was encoded in
+        'chunk_vectors': bytes,  # per-window vectors when chunks > 1
+        'chunk_scales': bytes,
+        'ingest_id': str
     }
+    # For MongoDB Atlas vector search, you would add a special vector index,
+    # e.g. db.embeddings.create_index([('vector', 'vector')])
+    indexes = [
+        IndexModel([('pdf_name', ASCENDING), ('ingest_id', ASCENDING), ('model_hash', ASCENDING)]),
+        IndexModel([('pdf_name', ASCENDING), ('ingest_id', ASCENDING), ('section_id', ASCENDING)]),
+    ]
+    query_shapes = [
+        ('pdf_name', 'ingest_id', 'model_hash'),  # analysis.load_section_embeddings
+        ('pdf_name', 'ingest_id', 'section_id'),  # re-encoded vectors replaced one by one
+    ]
     @classmethod
     def create_indexes(cls, db):
-        # For MongoDB Atlas vector search, you would use a special vector index.
-        # Here, we use a placeholder for a 2dsphere index for demonstration.
-        db[cls.collection_name].create_index('pdf_name')
-        # Example for Atlas: db.embeddings.create_index([('vector', 'vector')])
-        # Placeholder for local: db.embeddings.create_index([('vector', '2dsphere')])
+        db[cls.collection_name].create_indexes(cls.indexes)
 
 class Summary:
     collection_name = 'summaries'
     schema = {
-        'pdf_name': str,
-        'section_id': str,
+        'text_hash': str,  # sha1 of the summarized section text, shared by identical sections
+        'sentences_count': int,
         'summary_text': str
     }
+    indexes = [
+        IndexModel([('text_hash', ASCENDING), ('sentences_count', ASCENDING)], unique=True),
+    ]
+    query_shapes = [
+        ('text_hash', 'sentences_count'),  # analysis.stored_summaries, upserts and /summaries
+    ]
     @classmethod
     def create_indexes(cls, db):
-        db[cls.collection_name].create_index('pdf_name')
+        db[cls.collection_name].create_indexes(cls.indexes)
+
+MODELS = (Span, Outline, Section, Embedding, Summary)
+
+# Outlines used to be inserted on every upload, under a non-unique pdf_name
+# index. Before the unique index can be built, all but the newest outline
+# of each PDF are deleted and the old index is dropped.
+DUPLICATE_OUTLINES = [
+    {'$sort': {'_id': -1}},
+    {'$group': {'_id': '$pdf_name', 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+    {'$match': {'count': {'$gt': 1}}},
+]
+
+def older_outline_ids(groups):
+    """_ids of every outline but the newest, from DUPLICATE_OUTLINES groups."""
+    return [_id for group in groups for _id in group['ids'][1:]]
+
+def legacy_outline_index(index_information):
+    """Name of the pre-unique pdf_name index on outlines, if it still exists."""
+    for name, info in index_information.items():
+        if [key for key, _ in info['key']] == ['pdf_name'] and not info.get('unique'):
+            return name
+    return None
+
+def migrate_outlines(db):
+    """
+    Make outlines unique per pdf_name so Outline's unique index can be built.
+    Returns:
+        int: Older duplicate outlines deleted.
+    """
+    ids = older_outline_ids(db.outlines.aggregate(DUPLICATE_OUTLINES))
+    if ids:
+        db.outlines.delete_many({'_id': {'$in': ids}})
+    legacy = legacy_outline_index(db.outlines.index_information())
+    if legacy:
+        db.outlines.drop_index(legacy)
+    return len(ids)
+
+def covering_index(shape, index_keys):
+    """
+    How well an index serves a query shape: 'full' if the shape's fields are
+    the index's leading keys (in any order for the equality part), 'partial'
+    if only some leading keys match, else None.
+    """
+    prefix = [key for key, _ in index_keys][:len(shape)]
+    if set(prefix) == set(shape):
+        return 'full'
+    if prefix and prefix[0] in shape:
+        return 'partial'
+    return None
+
+def check_coverage(index_information):
+    """
+    Compare every model's query shapes with the indexes that exist, and
+    check that its unique indexes exist as unique ones.
+    Args:
+        index_information (dict): collection name -> collection.index_information().
+    Returns:
+        List[str]: One line per shape without full index coverage or
+        missing unique index.
+    """
+    problems = []
+    for model in MODELS:
+        indexes = index_information.get(model.collection_name, {})
+        unique = {tuple(info['key']) for info in indexes.values() if info.get('unique')}
+        for index in model.indexes:
+            spec = index.document
+            if spec.get('unique') and tuple(spec['key'].items()) not in unique:
+                keys = ', '.join(spec['key'])
+                problems.append(f"{model.collection_name} unique index on {keys} is missing (duplicates are possible)")
+        for shape in model.query_shapes:
+            coverage = [covering_index(shape, info['key']) for info in indexes.values()]
+            if 'full' in coverage:
+                continue
+            state = 'only partially covered' if 'partial' in coverage else 'not covered (collection scan)'
+            problems.append(f"{model.collection_name} query on {', '.join(shape)} is {state}")
+    return problems
+
+def ensure_indexes(db):
+    """
+    Create every model's indexes (a no-op for those that exist) and report
+    query shapes the resulting indexes do not cover. An index that conflicts
+    with an existing one is reported and skipped rather than failing.
+    Returns:
+        List[str]: Problems found, as from check_coverage.
+    """
+    problems = []
+    deleted = migrate_outlines(db)
+    if deleted:
+        print(f"Deleted {deleted} older duplicate outlines")
+    for model in MODELS:
+        try:
+            model.create_indexes(db)
+        except OperationFailure as e:
+            problems.append(f"Could not create {model.collection_name} indexes: {e}")
+    info = {model.collection_name: db[model.collection_name].index_information() for model in MODELS}
+    return problems + check_coverage(info)
 
 # Example usage to create all indexes:
 def create_all_indexes(mongo_uri, db_name):
     client = MongoClient(mongo_uri)
-    db = client[db_name]
-    Span.create_indexes(db)
-    Outline.create_indexes(db)
-    Section.create_indexes(db)
-    Embedding.create_indexes(db)
-    Summary.create_indexes(db)
-    client.close() 
\ No newline at end of file
+    for problem in ensure_indexes(client[db_name]):
+        print(problem)
+    client.close()
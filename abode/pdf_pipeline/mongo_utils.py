@@ -1,33 +1,66 @@
+import os
 from pymongo import MongoClient
+from pdf_pipeline.bulk_writer import write_pdf_docs, switch_outline
+from pdf_pipeline.metrics import MongoCommandMetrics
+
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+
+# One pooled client per URI, shared by every helper in the process
+_clients = {}
 
 def get_db(mongo_uri, db_name):
-    client = MongoClient(mongo_uri)
+    client = _clients.get(mongo_uri)
+    if client is None:
+        # Same command timings as the API's client, see app/db.py
+        client = _clients[mongo_uri] = MongoClient(mongo_uri, maxPoolSize=MONGO_MAX_POOL_SIZE,
+                                                   event_listeners=[MongoCommandMetrics()])
     return client[db_name], client
 
-def insert_spans(spans, pdf_name, mongo_uri, db_name):
-    db, client = get_db(mongo_uri, db_name)
-    for span in spans:
-        span['pdf_name'] = pdf_name
-        db.spans.insert_one(span)
-    client.close()
+def close_clients():
+    for client in _clients.values():
+        client.close()
+    _clients.clear()
 
-def insert_outline(outline, pdf_name, mongo_uri, db_name):
-    db, client = get_db(mongo_uri, db_name)
+def insert_spans(spans, pdf_name, mongo_uri, db_name, ingest_id):
+    """Write the PDF's spans for an ingest; `spans` may be any iterable, e.g. parse_pdf.iter_spans."""
+    db, _ = get_db(mongo_uri, db_name)
+    return write_pdf_docs(db, 'spans', pdf_name, spans, ingest_id)
+
+def insert_outline(outline, pdf_name, mongo_uri, db_name, headings=None, content_sha256=None, cache_key=None,
+                   ingest_id=None):
+    """
+    Replace the PDF's outline. With ingest_id, readers switch to that
+    ingest's spans, sections and embeddings, and those of the ingest the
+    replaced outline pointed at are deleted (see bulk_writer.switch_outline).
+    """
+    db, _ = get_db(mongo_uri, db_name)
     outline_doc = {'pdf_name': pdf_name, 'outline': outline}
-    db.outlines.insert_one(outline_doc)
-    client.close()
+    if headings is not None:
+        # The /headings view, see heading_detection.font_headings
+        outline_doc['headings'] = headings
+    if cache_key is not None:
+        # Which results the PDF was ingested with, so a revision can reuse them
+        outline_doc['content_sha256'] = content_sha256
+        outline_doc['cache_key'] = cache_key
+    if ingest_id is not None:
+        outline_doc['ingest_id'] = ingest_id
+    if ingest_id is not None:
+        switch_outline(db, outline_doc)
+    else:
+        db.outlines.replace_one({'pdf_name': pdf_name}, outline_doc, upsert=True)
 
 def get_outline(pdf_name, mongo_uri, db_name):
-    db, client = get_db(mongo_uri, db_name)
+    db, _ = get_db(mongo_uri, db_name)
     doc = db.outlines.find_one({'pdf_name': pdf_name})
-    client.close()
     if doc:
         return doc['outline']
     return []
 
-def insert_sections(sections, pdf_name, mongo_uri, db_name):
-    db, client = get_db(mongo_uri, db_name)
-    for section in sections:
-        section['pdf_name'] = pdf_name
-        db.sections.insert_one(section)
-    client.close() 
\ No newline at end of file
+def insert_sections(sections, pdf_name, mongo_uri, db_name, ingest_id):
+    db, _ = get_db(mongo_uri, db_name)
+    return write_pdf_docs(db, 'sections', pdf_name, sections, ingest_id)
+
+def insert_embeddings(embedding_docs, pdf_name, mongo_uri, db_name, ingest_id):
+    # Vectors from a previous ingest of this PDF are superseded once the outline switches
+    db, _ = get_db(mongo_uri, db_name)
+    return write_pdf_docs(db, 'embeddings', pdf_name, embedding_docs, ingest_id)
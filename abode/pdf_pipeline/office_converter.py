@@ -0,0 +1,343 @@
+import atexit
+import functools
+import json
+import os
+import queue
+import select
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# LibreOffice binary used for the DOCX fallback
+SOFFICE_PATH = os.getenv("SOFFICE_PATH", shutil.which("soffice") or "libreoffice")
+# Python with LibreOffice's UNO bridge, used to drive the long-lived instances
+# when this interpreter has none; by default the one bundled next to soffice,
+# then the system python3 (with e.g. the python3-uno package)
+SOFFICE_PYTHON = os.getenv("SOFFICE_PYTHON", "")
+# Long-lived soffice instances, i.e. conversions that can run at once
+CONVERTER_INSTANCES = int(os.getenv("CONVERTER_INSTANCES", "1"))
+# Seconds a single conversion may take before its instance is killed
+CONVERT_TIMEOUT = float(os.getenv("CONVERT_TIMEOUT", "120"))
+# Seconds to wait for a freshly started instance to accept connections
+CONVERTER_START_TIMEOUT = float(os.getenv("CONVERTER_START_TIMEOUT", "60"))
+# Conversions an instance serves before it is restarted, to bound leaks
+CONVERTER_MAX_CONVERSIONS = int(os.getenv("CONVERTER_MAX_CONVERSIONS", "200"))
+
+# Import PDFs as Writer documents so they can be saved as .docx; other
+# formats (.doc, .odt, .rtf) are opened with the filter soffice detects
+PDF_IMPORT_FILTER = "writer_pdf_import"
+DOCX_EXPORT_FILTER = "MS Word 2007 XML"
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+except ImportError:  # LibreOffice's Python bridge is not on every interpreter
+    uno = None
+
+
+class ConversionError(Exception):
+    pass
+
+
+def _properties(**values):
+    props = []
+    for name, value in values.items():
+        prop = PropertyValue()
+        prop.Name = name
+        prop.Value = value
+        props.append(prop)
+    return tuple(props)
+
+
+def _profile_url(profile_dir):
+    return "file://" + os.path.abspath(profile_dir)
+
+
+@functools.lru_cache(maxsize=1)
+def bridge_python():
+    """An interpreter that can import uno, to run this module as a bridge (see serve), or None."""
+    soffice = shutil.which(SOFFICE_PATH) or SOFFICE_PATH
+    candidates = [SOFFICE_PYTHON] if SOFFICE_PYTHON else [
+        os.path.join(os.path.dirname(os.path.realpath(soffice)), "python"), shutil.which("python3")]
+    for candidate in candidates:
+        if not candidate or not (os.path.isfile(candidate) or shutil.which(candidate)):
+            continue
+        try:
+            found = subprocess.run([candidate, "-c", "import uno"], stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL, timeout=30).returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            found = False
+        if found:
+            return candidate
+    return None
+
+
+def converter_mode():
+    """
+    How conversions run: "uno" (this interpreter drives long-lived soffice
+    instances), "bridge" (a helper under LibreOffice's Python drives them)
+    or "cli" (a cold `soffice --convert-to` process per conversion).
+    """
+    if uno is not None:
+        return "uno"
+    return "bridge" if bridge_python() else "cli"
+
+
+def check_converter():
+    """Report at startup how the DOCX fallback will run, warning when it is slow or missing."""
+    if not (shutil.which(SOFFICE_PATH) or os.path.isfile(SOFFICE_PATH)):
+        print(f"WARNING: LibreOffice ({SOFFICE_PATH}) not found: PDFs fitz cannot read will fail to ingest")
+        return None
+    mode = converter_mode()
+    if mode == "cli":
+        print("WARNING: no Python with LibreOffice's UNO bridge found (set SOFFICE_PYTHON): "
+              "every DOCX fallback conversion starts a new soffice process")
+    else:
+        print(f"Office converter: long-lived soffice instances driven via {mode}")
+    return mode
+
+
+def _connect(pipe_name, process=None, timeout=CONVERTER_START_TIMEOUT):
+    # Desktop of the soffice listening on pipe_name, retried until it accepts
+    local = uno.getComponentContext()
+    resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            ctx = resolver.resolve(f"uno:pipe,name={pipe_name};urp;StarOffice.ComponentContext")
+            break
+        except Exception:
+            if (process is not None and process.poll() is not None) or time.monotonic() > deadline:
+                raise ConversionError(f"soffice on pipe {pipe_name} did not start")
+            time.sleep(0.2)
+    return ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+
+
+def _import_filter(src_path):
+    """The import filter to force for src_path, or None to let soffice detect it."""
+    return PDF_IMPORT_FILTER if src_path.lower().endswith(".pdf") else None
+
+
+def _convert_uno(desktop, src_path, docx_path):
+    load_filter = _import_filter(src_path)
+    doc = desktop.loadComponentFromURL(
+        uno.systemPathToFileUrl(os.path.abspath(src_path)), "_blank", 0,
+        _properties(Hidden=True, **({"FilterName": load_filter} if load_filter else {})))
+    if doc is None:
+        raise ConversionError(f"soffice could not open {src_path}")
+    try:
+        doc.storeToURL(uno.systemPathToFileUrl(os.path.abspath(docx_path)),
+                       _properties(FilterName=DOCX_EXPORT_FILTER))
+    finally:
+        doc.close(True)
+
+
+class SofficeInstance:
+    """
+    One headless soffice process with its own user profile, so concurrent
+    instances never contend for the same profile lock. The process stays up
+    and serves conversions over a named pipe, driven through UNO from this
+    interpreter or, when it has no UNO bridge, from a helper running this
+    module under LibreOffice's Python. Without either, each conversion is a
+    short-lived `--convert-to` run that reuses the instance's profile.
+    """
+
+    def __init__(self, slot, root):
+        self.slot = slot
+        self.profile_dir = os.path.join(root, f"profile-{slot}")
+        self.pipe_name = f"abode_soffice_{os.getpid()}_{slot}"
+        self.mode = converter_mode()
+        self.process = None
+        self.bridge = None
+        self.desktop = None
+        self.conversions = 0
+
+    def start(self):
+        self.process = subprocess.Popen([
+            SOFFICE_PATH, "--headless", "--invisible", "--nologo", "--norestore", "--nodefault",
+            f"-env:UserInstallation={_profile_url(self.profile_dir)}",
+            f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext",
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if self.mode == "uno":
+                self.desktop = _connect(self.pipe_name, self.process)
+            else:
+                self.bridge = subprocess.Popen(
+                    [bridge_python(), os.path.abspath(__file__), "--serve", self.pipe_name],
+                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+                # The bridge prints one line once it is connected to soffice
+                if json.loads(self._read_line(CONVERTER_START_TIMEOUT) or "{}").get("ready") is not True:
+                    raise ConversionError(f"soffice instance {self.slot} did not start")
+        except Exception:
+            self.stop()
+            raise
+        self.conversions = 0
+
+    def stop(self):
+        self.desktop = None
+        for process in (self.bridge, self.process):
+            if process is not None and process.poll() is None:
+                process.kill()
+                process.wait()
+        self.bridge = self.process = None
+
+    def _read_line(self, timeout):
+        ready, _, _ = select.select([self.bridge.stdout], [], [], timeout)
+        if not ready:
+            raise ConversionError(f"soffice instance {self.slot} did not answer within {timeout}s")
+        return self.bridge.stdout.readline()
+
+    def _convert_bridge(self, src_path, docx_path, timeout):
+        try:
+            self.bridge.stdin.write(json.dumps({"src": src_path, "dst": docx_path}) + "\n")
+            self.bridge.stdin.flush()
+            line = self._read_line(timeout)
+        except (OSError, ConversionError) as e:
+            # Timed out or the bridge died: restart both on the next conversion
+            self.stop()
+            raise ConversionError(f"Converting {src_path} failed: {e}")
+        reply = json.loads(line) if line else {"error": "bridge exited"}
+        if reply.get("error"):
+            self.stop()
+            raise ConversionError(f"Converting {src_path} failed: {reply['error']}")
+
+    def _convert_cli(self, src_path, docx_path, timeout):
+        out_dir = os.path.dirname(docx_path)
+        load_filter = _import_filter(src_path)
+        try:
+            subprocess.run([
+                SOFFICE_PATH, "--headless", "--norestore",
+                f"-env:UserInstallation={_profile_url(self.profile_dir)}",
+                *([f"--infilter={load_filter}"] if load_filter else []),
+                "--convert-to", "docx", "--outdir", out_dir, src_path
+            ], check=True, timeout=timeout, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except subprocess.TimeoutExpired:
+            raise ConversionError(f"Converting {src_path} timed out after {timeout}s")
+        except (subprocess.CalledProcessError, OSError) as e:
+            raise ConversionError(f"Converting {src_path} failed: {e}")
+        produced = os.path.join(out_dir, os.path.splitext(os.path.basename(src_path))[0] + ".docx")
+        if not os.path.exists(produced):
+            raise ConversionError(f"soffice produced no .docx for {src_path}")
+        if produced != docx_path:
+            os.replace(produced, docx_path)
+
+    def convert(self, src_path, docx_path, timeout):
+        """Convert src_path to docx_path, killing the instance if it exceeds the timeout."""
+        self.conversions += 1
+        if self.mode == "cli":
+            return self._convert_cli(src_path, docx_path, timeout)
+        if self.process is None or self.process.poll() is not None:
+            self.stop()
+            self.start()
+        if self.mode == "bridge":
+            return self._convert_bridge(src_path, docx_path, timeout)
+        errors = []
+
+        def run():
+            try:
+                _convert_uno(self.desktop, src_path, docx_path)
+            except Exception as e:
+                errors.append(e)
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        worker.join(timeout)
+        if worker.is_alive():
+            # A hung import blocks the UNO call; killing soffice unblocks it
+            self.stop()
+            raise ConversionError(f"Converting {src_path} timed out after {timeout}s")
+        if errors:
+            self.stop()
+            raise ConversionError(f"Converting {src_path} failed: {errors[0]}")
+
+    @property
+    def worn_out(self):
+        return self.conversions >= CONVERTER_MAX_CONVERSIONS
+
+
+class ConverterPool:
+    """Fixed set of SofficeInstances handed out one conversion at a time."""
+
+    def __init__(self, size=CONVERTER_INSTANCES):
+        self.root = tempfile.mkdtemp(prefix="abode-soffice-")
+        self._idle = queue.Queue()
+        self.instances = [SofficeInstance(slot, self.root) for slot in range(max(1, size))]
+        for instance in self.instances:
+            self._idle.put(instance)
+
+    def convert(self, src_path, docx_path, timeout=CONVERT_TIMEOUT):
+        instance = self._idle.get()
+        try:
+            instance.convert(src_path, docx_path, timeout)
+        finally:
+            if instance.worn_out:
+                instance.stop()
+                instance.conversions = 0
+            self._idle.put(instance)
+
+    def close(self):
+        for instance in self.instances:
+            instance.stop()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_converter_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConverterPool()
+            atexit.register(close_converter_pool)
+        return _pool
+
+
+def close_converter_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def convert_to_docx(src_path, out_dir, timeout=CONVERT_TIMEOUT):
+    """
+    Convert a document (e.g. a PDF fitz cannot read) to .docx with LibreOffice.
+    Args:
+        src_path (str): File to convert.
+        out_dir (str): Directory the .docx is written to.
+        timeout (float): Seconds before the conversion is abandoned.
+    Returns:
+        str: Path of the converted .docx.
+    """
+    docx_path = os.path.join(out_dir, os.path.splitext(os.path.basename(src_path))[0] + ".docx")
+    get_converter_pool().convert(src_path, docx_path, timeout)
+    return docx_path
+
+
+def serve(pipe_name):
+    """
+    Bridge loop, run under LibreOffice's Python: connect to the soffice on
+    pipe_name, then convert one {"src", "dst"} JSON request per stdin line,
+    answering each with a JSON line on stdout.
+    """
+    desktop = _connect(pipe_name)
+    print(json.dumps({"ready": True}), flush=True)
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            _convert_uno(desktop, request["src"], request["dst"])
+            reply = {"ok": True}
+        except Exception as e:
+            reply = {"error": str(e) or type(e).__name__}
+        print(json.dumps(reply), flush=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--serve":
+        serve(sys.argv[2])
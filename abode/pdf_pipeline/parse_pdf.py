@@ -1,26 +1,135 @@
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 import fitz
+from pdf_pipeline.span_table import SpanTable, SpanTableBuilder
+from pdf_pipeline.metrics import timed, errors_total
 
-def parse_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
+# get_text("dict") flags: the defaults minus image blocks, which we never use
+TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+# Worker processes for parse_pdf, and the smallest document worth sharding
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "1"))
+PARSE_MIN_PAGES_PER_WORKER = int(os.getenv("PARSE_MIN_PAGES_PER_WORKER", "64"))
+
+def _page_spans(page, page_number):
+    # (page, text, font, size, bold, bbox) per span on one page, in document order
     spans = []
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        try:
-            blocks = page.get_text("dict")['blocks']
-            for block in blocks:
-                if 'lines' not in block:
-                    continue
-                for line in block['lines']:
-                    for span in line['spans']:
-                        font_weight = 'bold' if 'Bold' in span['font'] else 'normal'
-                        spans.append({
-                            'page': page_num + 1,
-                            'text': span['text'],
-                            'font_name': span['font'],
-                            'font_size': span['size'],
-                            'font_weight': font_weight,
-                            'bbox': span['bbox'],
-                        })
-        except Exception as e:
-            raise Exception(f"Failed to parse page {page_num+1}: {e}")
-    return spans 
\ No newline at end of file
+    for block in page.get_text("dict", flags=TEXT_FLAGS)['blocks']:
+        if 'lines' not in block:
+            continue
+        for line in block['lines']:
+            for span in line['spans']:
+                spans.append((page_number, span['text'], span['font'], span['size'], 'Bold' in span['font'], span['bbox']))
+    return spans
+
+def iter_page_spans(pdf_path, start_page=1, end_page=None, failed_pages=None, pages=None):
+    """
+    Yield (page_number, spans) for each page in [start_page, end_page], or
+    for the given `pages` numbers, with spans as raw (page, text, font, size,
+    bold, bbox) tuples. A page that fails to parse is logged, recorded in
+    `failed_pages` and skipped, instead of discarding the rest of the document.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        end_page = min(end_page or len(doc), len(doc))
+        if pages is None:
+            page_nums = range(start_page - 1, end_page)
+        else:
+            page_nums = [p - 1 for p in pages if 0 < p <= len(doc)]
+        for page_num in page_nums:
+            try:
+                spans = _page_spans(doc[page_num], page_num + 1)
+            except Exception as e:
+                print(f"Failed to parse page {page_num+1} of {pdf_path}: {e}")
+                errors_total.inc(stage="parse_page")
+                if failed_pages is not None:
+                    failed_pages.append(page_num + 1)
+                continue
+            yield page_num + 1, spans
+    finally:
+        doc.close()
+
+def iter_spans(pdf_path, start_page=1, end_page=None):
+    """
+    Yield text spans page by page, so callers can write or process them
+    before the whole document has been parsed.
+    """
+    for _, spans in iter_page_spans(pdf_path, start_page, end_page):
+        for page, text, font, size, bold, bbox in spans:
+            yield {
+                'page': page,
+                'text': text,
+                'font_name': font,
+                'font_size': size,
+                'font_weight': 'bold' if bold else 'normal',
+                'bbox': bbox,
+            }
+
+def _parse_range(pdf_path, start_page, end_page, pages=None):
+    # Runs in a worker process, which opens its own fitz document
+    builder = SpanTableBuilder()
+    failed_pages = []
+    for _, spans in iter_page_spans(pdf_path, start_page, end_page, failed_pages, pages):
+        for span in spans:
+            builder.add(*span)
+    return builder.build(), failed_pages
+
+@timed("parse_pdf")
+def parse_pdf(pdf_path, workers=None):
+    """
+    Parse a PDF into a columnar SpanTable (iterates like a list of span dicts).
+    With workers > 1, long documents are split into page ranges parsed in
+    separate processes and merged back in page order. Pages that fail are
+    skipped and listed in the table's `failed_pages`; if every page fails the
+    document is treated as unreadable.
+    """
+    workers = min(workers or PARSE_WORKERS, os.cpu_count() or 1)
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+    shards = min(workers, page_count // PARSE_MIN_PAGES_PER_WORKER)
+    if shards > 1:
+        bounds = [round(i * page_count / shards) for i in range(shards + 1)]
+        # spawn, not fork: callers may already be running torch threads
+        with ProcessPoolExecutor(max_workers=shards, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(_parse_range, [pdf_path] * shards, [b + 1 for b in bounds[:-1]], bounds[1:]))
+        table = SpanTable.concat([t for t, _ in results])
+        failed_pages = [p for _, failed in results for p in failed]
+    else:
+        table, failed_pages = _parse_range(pdf_path, 1, page_count)
+    if page_count and len(failed_pages) == page_count:
+        raise Exception(f"Failed to parse any of the {page_count} pages of {pdf_path}")
+    table.failed_pages = failed_pages
+    return table
+
+@timed("parse_pdf")
+def parse_pages(pdf_path, pages):
+    """
+    Parse only the given page numbers (1-based, in order) into a SpanTable,
+    with failed pages listed in `failed_pages` as for parse_pdf.
+    """
+    table, failed_pages = _parse_range(pdf_path, 1, None, pages)
+    table.failed_pages = failed_pages
+    return table
+
+def page_fingerprints(pdf_path):
+    """
+    One hash per page of everything parsing reads from it: the content
+    stream (text and its placement), the fonts and form XObjects it uses and
+    the page geometry. Far cheaper than extracting the text, so a revised
+    file can be compared with its previous version before it is parsed.
+    Returns:
+        List[str]: Hex digest per page, in page order.
+    """
+    fingerprints = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            digest = hashlib.sha1(repr((tuple(page.rect), page.rotation)).encode('utf-8'))
+            digest.update(page.read_contents())
+            # xref numbers are left out: they change whenever the file is re-saved
+            for font in page.get_fonts():
+                digest.update(repr(font[1:6]).encode('utf-8'))
+            for xobject in page.get_xobjects():
+                digest.update(doc.xref_stream(xobject[0]) or b'')
+            fingerprints.append(digest.hexdigest())
+    return fingerprints
@@ -1,13 +1,88 @@
-from sentence_transformers import SentenceTransformer
+import os
+import sqlite3
+import threading
+import unicodedata
 import numpy as np
 
-# Load MiniLM model (CPU only)
-_model = None
+from pdf_pipeline.model_registry import get_sentence_encoder
+from pdf_pipeline.embedding_store import model_hash, VECTOR_DTYPE
+from pdf_pipeline.lru_cache import LRUCache
+from pdf_pipeline.metrics import timer, inference_batch_size
+
+# Persona/job embeddings kept in memory; the frontend repeats the same few
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+# Optional SQLite file the cache spills to, so it survives restarts
+QUERY_CACHE_DB = os.getenv("QUERY_CACHE_DB", "")
+
+_query_cache = LRUCache(QUERY_CACHE_SIZE)
+_spill = None
+_spill_lock = threading.Lock()
+# Guards the counters below, updated from several inference threads at once
+_stats_lock = threading.Lock()
+_spill_hits = 0
+_encodes = 0
+
+# MiniLM model (CPU only), shared with the other pipeline modules
 def get_model():
-    global _model
-    if _model is None:
-        _model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2', device='cpu')
-    return _model
+    return get_sentence_encoder()
+
+def normalize_query(text):
+    """Canonical form of a query: NFKC, with whitespace runs collapsed."""
+    return ' '.join(unicodedata.normalize('NFKC', text).split())
+
+def _cache_key(text):
+    return f"{model_hash()}:{normalize_query(text)}"
+
+def _spill_db():
+    global _spill
+    if _spill is None and QUERY_CACHE_DB:
+        os.makedirs(os.path.dirname(os.path.abspath(QUERY_CACHE_DB)), exist_ok=True)
+        _spill = sqlite3.connect(QUERY_CACHE_DB, check_same_thread=False)
+        _spill.execute("CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+    return _spill
+
+def _spill_get(key):
+    with _spill_lock:
+        db = _spill_db()
+        if db is None:
+            return None
+        row = db.execute("SELECT vector FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+    return np.frombuffer(row[0], dtype=VECTOR_DTYPE) if row else None
+
+def _spill_put(key, embedding):
+    with _spill_lock:
+        db = _spill_db()
+        if db is not None:
+            with db:
+                db.execute("INSERT OR REPLACE INTO query_embeddings VALUES (?, ?)",
+                           (key, np.asarray(embedding, dtype=VECTOR_DTYPE).tobytes()))
+
+def cached_query_embedding(text):
+    """In-memory cache lookup only; cheap enough to call from the event loop."""
+    return _query_cache.get(_cache_key(text))
+
+def compute_query_embedding(text):
+    """
+    Embedding for a query missing from the in-memory cache: read from the
+    SQLite spill if enabled, otherwise encoded with MiniLM, then cached.
+    """
+    global _spill_hits, _encodes
+    key = _cache_key(text)
+    embedding = _spill_get(key)
+    if embedding is not None:
+        with _stats_lock:
+            _spill_hits += 1
+    else:
+        inference_batch_size.observe(1, model="sentence_encoder")
+        with timer("encode_query"):
+            embedding = np.asarray(get_model().encode(normalize_query(text)), dtype=np.float32)
+        with _stats_lock:
+            _encodes += 1
+        _spill_put(key, embedding)
+    # Shared between requests, so callers must not modify it in place
+    embedding.setflags(write=False)
+    _query_cache.put(key, embedding)
+    return embedding
 
 def encode_persona_job(text: str) -> np.ndarray:
     """
@@ -15,8 +90,14 @@ def encode_persona_job(text: str) -> np.ndarray:
     Args:
         text (str): Persona and job description.
     Returns:
-        np.ndarray: Embedding vector.
+        np.ndarray: Embedding vector (read-only, possibly cached).
     """
-    model = get_model()
-    embedding = model.encode(text)
-    return embedding 
\ No newline at end of file
+    embedding = cached_query_embedding(text)
+    if embedding is None:
+        embedding = compute_query_embedding(text)
+    return embedding
+
+def query_cache_stats():
+    with _stats_lock:
+        counts = {'spill_hits': _spill_hits, 'encodes': _encodes}
+    return {**_query_cache.stats(), **counts, 'spill': QUERY_CACHE_DB or None}
@@ -0,0 +1,30 @@
+import json
+import os
+from pdf_pipeline.parse_pdf import parse_pdf
+from pdf_pipeline.parse_docx import parse_docx, is_docx
+from pdf_pipeline.span_table import SpanTable
+
+
+def parse_document(pdf_path):
+    """
+    Parse a PDF into a SpanTable, falling back to the DOCX route if fitz
+    cannot read it. Native .docx files go straight to python-docx.
+    """
+    if is_docx(pdf_path):
+        return SpanTable.from_dicts(parse_docx(pdf_path))
+    try:
+        return parse_pdf(pdf_path)
+    except Exception:
+        return SpanTable.from_dicts(parse_docx(pdf_path))
+
+
+def output_path(output_dir, pdf_name):
+    return os.path.join(output_dir, os.path.splitext(pdf_name)[0] + '.json')
+
+
+def write_json_atomic(path, data):
+    # Write next to the target and rename, so an interrupted run never leaves a partial file
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
@@ -1,14 +1,84 @@
-from sentence_transformers import SentenceTransformer
+import os
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
-# Load MiniLM model (CPU only)
-_model = None
+from pdf_pipeline.model_registry import get_sentence_encoder
+from pdf_pipeline.vector_index import normalize
+from pdf_pipeline.metrics import timed, inference_batch_size
+
+# Tokens shared by consecutive windows of a long section
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+# Chunks per model.encode batch
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", "32"))
+# "mean": score the pooled section vector; "maxsim": score the best matching chunk
+SECTION_SCORING = os.getenv("SECTION_SCORING", "mean")
+
+# MiniLM model (CPU only), shared with the other pipeline modules
 def get_model():
-    global _model
-    if _model is None:
-        _model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2', device='cpu')
-    return _model
+    return get_sentence_encoder()
+
+def is_scorable(text):
+    """Whether a section has enough text to be worth embedding and ranking."""
+    return bool(text) and len(text.strip()) > 10
+
+def chunk_texts(texts, tokenizer, max_tokens, overlap=CHUNK_OVERLAP_TOKENS):
+    """
+    Split texts into windows of at most max_tokens tokens, overlapping by
+    `overlap` tokens, cut at token boundaries of the model's own tokenizer.
+    Args:
+        texts (List[str]): Section texts.
+        tokenizer: Hugging Face fast tokenizer (needs offset mappings).
+        max_tokens (int): Tokens per window, excluding special tokens.
+        overlap (int): Tokens repeated at the start of the next window.
+    Returns:
+        Tuple[List[str], List[int], List[int]]: Chunk texts, the index of the
+        text each chunk came from, and each chunk's token count.
+    """
+    offsets = tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+    # Overlap is capped at half a window so each window still advances
+    step = max_tokens - min(overlap, max_tokens // 2)
+    chunks, owners, lengths = [], [], []
+    for owner, (text, spans) in enumerate(zip(texts, offsets)):
+        if len(spans) <= max_tokens:
+            chunks.append(text)
+            owners.append(owner)
+            lengths.append(max(len(spans), 1))
+            continue
+        for start in range(0, len(spans), step):
+            window = spans[start:start + max_tokens]
+            chunks.append(text[window[0][0]:window[-1][1]])
+            owners.append(owner)
+            lengths.append(len(window))
+            if start + max_tokens >= len(spans):
+                break
+    return chunks, owners, lengths
+
+@timed("encode_sections")
+def encode_section_chunks(section_texts):
+    """
+    Encode sections longer than the model's window as several token-bounded
+    chunks instead of letting the model truncate them.
+    Args:
+        section_texts (List[str]): List of section texts.
+    Returns:
+        Tuple[np.ndarray, List[np.ndarray]]: Section vectors (token-weighted
+        mean of their chunk vectors) and each section's chunk matrix.
+    """
+    model = get_model()
+    if not len(section_texts):
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32), []
+    max_tokens = model.max_seq_length - 2  # room for [CLS] and [SEP]
+    chunks, owners, lengths = chunk_texts(list(section_texts), model.tokenizer, max_tokens)
+    # One encode call over every chunk; sentence-transformers batches it by
+    # length, so windows of similar size are padded together
+    for start in range(0, len(chunks), ENCODE_BATCH_SIZE):
+        inference_batch_size.observe(min(ENCODE_BATCH_SIZE, len(chunks) - start), model="sentence_encoder")
+    chunk_vectors = np.asarray(model.encode(chunks, batch_size=ENCODE_BATCH_SIZE), dtype=np.float32)
+    owners = np.asarray(owners)
+    bounds = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1], True])
+    weights = np.asarray(lengths, dtype=np.float32)[:, np.newaxis]
+    sums = np.add.reduceat(chunk_vectors * weights, bounds[:-1], axis=0)
+    vectors = sums / np.add.reduceat(weights, bounds[:-1], axis=0)
+    return vectors, [chunk_vectors[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
 
 def encode_sections(section_texts):
     """
@@ -18,17 +88,29 @@ def encode_sections(section_texts):
     Returns:
         np.ndarray: Embedding matrix.
     """
-    model = get_model()
-    return model.encode(section_texts)
+    vectors, _ = encode_section_chunks(section_texts)
+    return vectors
 
-def score_sections(persona_embedding, section_embeddings):
+@timed("score_sections")
+def score_sections(persona_embedding, section_embeddings, section_chunks=None):
     """
     Compute cosine similarity scores between persona embedding and section embeddings.
     Args:
         persona_embedding (np.ndarray): Embedding for persona/job.
         section_embeddings (np.ndarray): Embeddings for sections.
+        section_chunks (Optional[List[Optional[np.ndarray]]]): Chunk vectors per
+            section; when given, a section scores as its best matching chunk
+            (max-sim), falling back to its section vector where it has none.
     Returns:
         np.ndarray: Similarity scores.
     """
-    scores = cosine_similarity([persona_embedding], section_embeddings)[0]
-    return scores 
\ No newline at end of file
+    query = normalize(persona_embedding)[0]
+    # Normalized float32 rows make this a single BLAS matrix-vector product
+    scores = normalize(section_embeddings) @ query
+    if section_chunks is not None:
+        with_chunks = [i for i, chunks in enumerate(section_chunks) if chunks is not None and len(chunks)]
+        if with_chunks:
+            counts = [len(section_chunks[i]) for i in with_chunks]
+            chunk_scores = normalize(np.vstack([section_chunks[i] for i in with_chunks])) @ query
+            scores[with_chunks] = np.maximum.reduceat(chunk_scores, np.r_[0, np.cumsum(counts)[:-1]])
+    return scores
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from pdf_pipeline.model_registry import HEADING_MODEL
+from pdf_pipeline.embedding_store import model_hash
+from pdf_pipeline.span_table import SpanTable
+from pdf_pipeline.metrics import errors_total
+
+# Bump when parsing, heading detection or sectioning change their output,
+# so results cached by an older pipeline are not served
+# (2: span bboxes stored as float64 instead of rounded to float32)
+PIPELINE_VERSION = "2"
+# Where ingest results are cached, one .npz per distinct file content
+RESULT_CACHE_DIR = os.getenv(
+    "RESULT_CACHE_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'cache'))
+)
+# Least recently used entries are evicted once the cache grows past this
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(1 << 30)))
+
+_SPAN_COLUMNS = ('page', 'size', 'bbox', 'font_id', 'flags', 'offsets')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def pipeline_versions():
+    """Every model and pipeline version ingest results depend on."""
+    return f"{PIPELINE_VERSION}:{HEADING_MODEL}:{model_hash()}"
+
+
+def cache_key(content_sha256):
+    """Key for a file's ingest results: its content hash plus pipeline_versions()."""
+    key = f"{content_sha256}:{pipeline_versions()}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _json_bytes(data):
+    return np.frombuffer(json.dumps(data, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+
+
+class ResultCache:
+    """
+    Content-addressed store of ingest results (spans, outline, sections and
+    section vectors). Each entry is a single .npz file named by its cache
+    key; reads touch the file's mtime, and eviction removes the least
+    recently used files until the directory fits in max_bytes.
+    """
+
+    def __init__(self, root=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.root, key + '.npz')
+
+    def get(self, key):
+        """
+        Cached results for a key, or None on a miss.
+        Returns:
+            Optional[dict]: spans (SpanTable), outline, sections, vectors (np.ndarray),
+            chunks (chunk vectors per section), and what an incremental
+            re-ingest needs: page_fingerprints, ml_decisions and the
+            pipeline_versions they were computed with (None if not stored).
+        """
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+                spans = SpanTable(
+                    page=data['page'], size=data['size'], bbox=data['bbox'],
+                    font_id=data['font_id'], flags=data['flags'], fonts=meta['fonts'],
+                    text=data['text'].tobytes().decode('utf-8'), offsets=data['offsets'],
+                    extra=meta['extra'],
+                )
+                vectors = data['vectors']
+                chunk_vectors = data['chunk_vectors']
+                chunk_bounds = np.r_[0, np.cumsum(data['chunk_counts'])]
+            chunks = [chunk_vectors[a:b] for a, b in zip(chunk_bounds[:-1], chunk_bounds[1:])]
+            os.utime(path)
+        except (OSError, KeyError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Discarding unreadable cache entry {path}: {e}")
+                self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return {'spans': spans, 'outline': meta['outline'], 'sections': meta['sections'],
+                'vectors': vectors, 'chunks': chunks, 'page_fingerprints': meta.get('page_fingerprints'),
+                'ml_decisions': meta.get('ml_decisions'), 'versions': meta.get('versions')}
+
+    def put(self, key, spans, outline, sections, vectors, chunks, page_fingerprints=None, ml_decisions=None):
+        """
+        Store one file's ingest results, then evict old entries if over budget.
+        `chunks` holds each section's chunk vectors (see relevance.encode_section_chunks);
+        page_fingerprints and ml_decisions let a later revision of the file be
+        re-ingested incrementally (see incremental.py).
+        The cache is only an accelerator: a failure to store (unwritable
+        directory, full disk, text that cannot be encoded) is logged and
+        the entry skipped, never failing the ingest.
+        Returns:
+            bool: Whether the entry was stored.
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        try:
+            self._write(tmp_path, spans, outline, sections, vectors, chunks, page_fingerprints, ml_decisions)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError, TypeError) as e:
+            # UnicodeEncodeError (e.g. lone surrogates in span text) is a ValueError
+            print(f"Could not store cache entry {path}: {e}")
+            errors_total.inc(stage="result_cache")
+            self._remove(tmp_path)
+            return False
+        with self._lock:
+            self.stores += 1
+        self.evict()
+        return True
+
+    def _write(self, tmp_path, spans, outline, sections, vectors, chunks, page_fingerprints, ml_decisions):
+        os.makedirs(self.root, exist_ok=True)
+        arrays = {name: getattr(spans, name) for name in _SPAN_COLUMNS}
+        arrays['text'] = np.frombuffer(spans.text_bytes(), dtype=np.uint8)
+        arrays['vectors'] = np.asarray(vectors, dtype=np.float32) if len(sections) else np.empty((0, 0), dtype=np.float32)
+        arrays['chunk_vectors'] = np.vstack(chunks).astype(np.float32) if len(chunks) else np.empty((0, 0), dtype=np.float32)
+        arrays['chunk_counts'] = np.array([len(c) for c in chunks], dtype=np.int64)
+        arrays['meta'] = _json_bytes({
+            'fonts': spans.fonts,
+            'extra': spans.extra,
+            'outline': outline,
+            'sections': sections,
+            'page_fingerprints': page_fingerprints,
+            'ml_decisions': ml_decisions,
+            'versions': pipeline_versions(),
+        })
+        # Written to a temp file first so concurrent readers never see a partial entry
+        np.savez(tmp_path, **arrays)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _entries(self):
+        # (mtime, size, path) per cache entry, oldest first
+        entries = []
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return entries
+        for name in names:
+            if name.endswith('.npz') and not name.endswith('.tmp.npz'):
+                path = os.path.join(self.root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self):
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
+
+
+_cache = None
+
+
+def get_result_cache():
+    global _cache
+    if _cache is None:
+        _cache = ResultCache()
+    return _cache
@@ -0,0 +1,251 @@
+from collections.abc import Mapping, Sequence
+import numpy as np
+
+# Bits of SpanTable.flags
+BOLD = 1
+HAS_BBOX = 2
+
+_SPAN_KEYS = ('page', 'text', 'font_name', 'font_size', 'font_weight', 'bbox')
+# Spans a SpanTableBuilder holds as Python objects before packing them into arrays
+_BUILDER_CHUNK = 4096
+
+
+class SpanView(Mapping):
+    """Read-only dict-style view of one row of a SpanTable."""
+
+    __slots__ = ('_table', '_i')
+
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    def __getitem__(self, key):
+        table, i = self._table, self._i
+        if key == 'page':
+            return int(table.page[i])
+        if key == 'text':
+            return table.text(i)
+        if key == 'font_name':
+            return table.fonts[table.font_id[i]]
+        if key == 'font_size':
+            return float(table.size[i])
+        if key == 'font_weight':
+            return 'bold' if table.flags[i] & BOLD else 'normal'
+        if key == 'bbox':
+            return table.bbox[i].tolist() if table.flags[i] & HAS_BBOX else None
+        if key in table.extra:
+            return table.extra[key][i]
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield from _SPAN_KEYS
+        yield from self._table.extra
+
+    def __len__(self):
+        return len(_SPAN_KEYS) + len(self._table.extra)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class SpanTable(Sequence):
+    """
+    Columnar store for parsed text spans: NumPy arrays for page, font size,
+    bbox and flags, interned font names, and all span text in one string
+    with offsets. Indexing and iteration yield dict-compatible SpanViews, so
+    code written against lists of span dicts keeps working.
+    """
+
+    def __init__(self, page, size, bbox, font_id, flags, fonts, text, offsets, extra=None):
+        self.page = page          # int32
+        self.size = size          # float64, kept exact so font thresholds do not shift
+        self.bbox = bbox          # float64, shape (n, 4), as fitz reports it; valid where flags & HAS_BBOX
+        self.font_id = font_id    # uint16 index into fonts
+        self.flags = flags        # uint8 bitmask of BOLD / HAS_BBOX
+        self.fonts = fonts        # interned font names
+        self._text = text         # all span text concatenated
+        self.offsets = offsets    # int64, len n + 1
+        self.extra = extra or {}  # optional per-span columns, e.g. DOCX 'style'
+
+    def __len__(self):
+        return len(self.page)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [SpanView(self, j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return SpanView(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield SpanView(self, i)
+
+    def text(self, i):
+        return self._text[self.offsets[i]:self.offsets[i + 1]]
+
+    def text_bytes(self):
+        # All span text as UTF-8; offsets index the decoded string
+        return self._text.encode('utf-8')
+
+    def texts(self):
+        offsets = self.offsets.tolist()
+        return [self._text[offsets[i]:offsets[i + 1]] for i in range(len(self))]
+
+    @property
+    def bold(self):
+        return (self.flags & BOLD).astype(bool)
+
+    @property
+    def has_bbox(self):
+        return (self.flags & HAS_BBOX).astype(bool)
+
+    def take(self, indices):
+        """A new table of the given rows, in the given order."""
+        indices = np.asarray(indices, dtype=np.int64)
+        starts, ends = self.offsets[indices], self.offsets[indices + 1]
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(ends - starts, out=offsets[1:])
+        return SpanTable(
+            page=self.page[indices],
+            size=self.size[indices],
+            bbox=self.bbox[indices],
+            font_id=self.font_id[indices],
+            flags=self.flags[indices],
+            fonts=list(self.fonts),
+            text=''.join(self._text[a:b] for a, b in zip(starts.tolist(), ends.tolist())),
+            offsets=offsets,
+            extra={k: [v[i] for i in indices.tolist()] for k, v in self.extra.items()},
+        )
+
+    def to_dicts(self):
+        return [dict(view) for view in self]
+
+    @classmethod
+    def from_dicts(cls, spans):
+        builder = SpanTableBuilder()
+        for span in spans:
+            builder.append(span)
+        return builder.build()
+
+    @classmethod
+    def concat(cls, tables):
+        tables = [t for t in tables if len(t)]
+        if not tables:
+            return SpanTableBuilder().build()
+        fonts = []
+        font_index = {}
+        font_ids = []
+        for t in tables:
+            remap = np.empty(len(t.fonts), dtype=np.uint16)
+            for j, name in enumerate(t.fonts):
+                if name not in font_index:
+                    font_index[name] = len(fonts)
+                    fonts.append(name)
+                remap[j] = font_index[name]
+            font_ids.append(remap[t.font_id])
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for t in tables:
+            offsets.append(t.offsets[1:] + base)
+            base += int(t.offsets[-1])
+        keys = []
+        for t in tables:
+            keys.extend(k for k in t.extra if k not in keys)
+        extra = {k: [v for t in tables for v in t.extra.get(k, [None] * len(t))] for k in keys}
+        return cls(
+            page=np.concatenate([t.page for t in tables]),
+            size=np.concatenate([t.size for t in tables]),
+            bbox=np.concatenate([t.bbox for t in tables]),
+            font_id=np.concatenate(font_ids),
+            flags=np.concatenate([t.flags for t in tables]),
+            fonts=fonts,
+            text=''.join(t._text for t in tables),
+            offsets=np.concatenate(offsets),
+            extra=extra,
+        )
+
+
+class SpanTableBuilder:
+    """
+    Accumulates spans (as dicts or raw fields) and builds a SpanTable.
+    Has list-style append, so it can be the sink of bulk_writer.collect_into.
+    Spans are packed into arrays every _BUILDER_CHUNK rows, so only the
+    columnar form of a large document is held in memory.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._packed = 0
+        self._fonts = []
+        self._font_index = {}
+        self._reset()
+
+    def _reset(self):
+        self._page = []
+        self._size = []
+        self._bbox = []
+        self._font_id = []
+        self._flags = []
+        self._texts = []
+        self._extra = {}
+
+    def add(self, page, text, font_name, font_size, bold, bbox, **extra):
+        font_id = self._font_index.get(font_name)
+        if font_id is None:
+            font_id = self._font_index[font_name] = len(self._fonts)
+            self._fonts.append(font_name)
+        flags = (BOLD if bold else 0) | (HAS_BBOX if bbox is not None else 0)
+        n = len(self._page)
+        self._page.append(page)
+        self._size.append(font_size or 0.0)
+        self._bbox.append(tuple(bbox) if bbox is not None else (0.0, 0.0, 0.0, 0.0))
+        self._font_id.append(font_id)
+        self._flags.append(flags)
+        self._texts.append(text)
+        for key, value in extra.items():
+            self._extra.setdefault(key, [None] * n).append(value)
+        for key, column in self._extra.items():
+            if len(column) == n:
+                column.append(None)
+        if n + 1 >= _BUILDER_CHUNK:
+            self._parts.append(self._pack())
+            self._packed += n + 1
+            self._reset()
+
+    def append(self, span):
+        extra = {k: v for k, v in span.items() if k not in _SPAN_KEYS}
+        self.add(span['page'], span['text'], span['font_name'], span['font_size'],
+                 span.get('font_weight') == 'bold', span.get('bbox'), **extra)
+
+    def __len__(self):
+        return self._packed + len(self._page)
+
+    def _pack(self):
+        # The spans added since the last pack, as a table
+        lengths = np.fromiter((len(t) for t in self._texts), dtype=np.int64, count=len(self._texts))
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return SpanTable(
+            page=np.array(self._page, dtype=np.int32),
+            size=np.array(self._size, dtype=np.float64),
+            bbox=np.array(self._bbox, dtype=np.float64).reshape(-1, 4),
+            font_id=np.array(self._font_id, dtype=np.uint16),
+            flags=np.array(self._flags, dtype=np.uint8),
+            fonts=list(self._fonts),
+            text=''.join(self._texts),
+            offsets=offsets,
+            extra=self._extra,
+        )
+
+    def build(self):
+        if not self._parts:
+            return self._pack()
+        return SpanTable.concat(self._parts + [self._pack()])
+
+
+def as_span_table(spans):
+    """Return spans as a SpanTable, converting a list of span dicts if needed."""
+    return spans if isinstance(spans, SpanTable) else SpanTable.from_dicts(spans)
@@ -1,7 +1,55 @@
+import numpy as np
 from sumy.summarizers.text_rank import TextRankSummarizer
 from sumy.parsers.plaintext import PlaintextParser
 from sumy.nlp.tokenizers import Tokenizer
 
+
+class MatrixTextRankSummarizer(TextRankSummarizer):
+    """
+    TextRankSummarizer with the sentence similarity matrix built from a
+    bag-of-words count matrix in one product, instead of comparing every
+    sentence pair in Python. Produces the same weights, so the same summaries.
+    """
+
+    def _create_matrix(self, document):
+        sentences_as_words = [self._to_words_set(sent) for sent in document.sentences]
+        sentences_count = len(sentences_as_words)
+        vocabulary = {}
+        rows, cols = [], []
+        for i, words in enumerate(sentences_as_words):
+            for word in words:
+                rows.append(i)
+                cols.append(vocabulary.setdefault(word, len(vocabulary)))
+        counts = np.zeros((sentences_count, len(vocabulary)))
+        np.add.at(counts, (rows, cols), 1.0)
+        # Shared words of i and j, counted with repetition: sum over w in i of count(w in j)
+        overlap = counts @ counts.T
+        with np.errstate(divide='ignore'):
+            log_lengths = np.log(counts.sum(axis=1))
+        norm = log_lengths[:, np.newaxis] + log_lengths[np.newaxis, :]
+        # Single-word pairs have a zero norm and keep the raw overlap, as in sumy
+        single = np.isclose(norm, 0.0)
+        weights = np.divide(overlap, norm, out=overlap.copy(), where=~single)
+        weights[overlap == 0] = 0.0
+
+        weights /= (weights.sum(axis=1)[:, np.newaxis] + self._ZERO_DIVISION_PREVENTION)
+        return np.full((sentences_count, sentences_count), (1. - self.damping) / sentences_count) \
+            + self.damping * weights
+
+
+# Built once per process: the tokenizer loads its punkt model on construction
+_tokenizer = None
+_summarizer = None
+
+
+def _get_summarizer():
+    global _tokenizer, _summarizer
+    if _summarizer is None:
+        _tokenizer = Tokenizer("english")
+        _summarizer = MatrixTextRankSummarizer()
+    return _tokenizer, _summarizer
+
+
 def summarize_section(text: str, sentences_count: int = 2) -> str:
     """
     Summarize a section using extractive TextRank summarization.
@@ -11,8 +59,33 @@ def summarize_section(text: str, sentences_count: int = 2) -> str:
     Returns:
         str: Extractive summary.
     """
-    parser = PlaintextParser.from_string(text, Tokenizer("english"))
-    summarizer = TextRankSummarizer()
+    tokenizer, summarizer = _get_summarizer()
+    parser = PlaintextParser.from_string(text, tokenizer)
     summary_sentences = summarizer(parser.document, sentences_count)
     summary = " ".join(str(sentence) for sentence in summary_sentences)
-    return summary 
\ No newline at end of file
+    return summary
+
+
+def summarize_sections(texts, sentences_count=2):
+    """
+    Summarize many sections in one call, e.g. one process-pool task per analysis.
+    Args:
+        texts (List[str]): Section texts.
+        sentences_count (int): Number of sentences per summary.
+    Returns:
+        List[Optional[str]]: Summary per text, None where summarization failed.
+    """
+    summaries = []
+    for text in texts:
+        try:
+            summaries.append(summarize_section(text, sentences_count))
+        except Exception as e:
+            print(f"Summarization failed: {e}")
+            summaries.append(None)
+    return summaries
+
+
+def lead_sentences(text, sentences_count=2):
+    """Fallback summary: the first sentences of the text."""
+    sentences = text.split('.')[:sentences_count]
+    return '. '.join(sentences) + '.'
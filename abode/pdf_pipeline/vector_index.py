@@ -0,0 +1,275 @@
+import os
+import threading
+from contextlib import contextmanager
+import numpy as np
+from pdf_pipeline.embedding_store import model_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, single writer assumed
+    fcntl = None
+
+# Where the corpus-wide section index is persisted
+VECTOR_INDEX_PATH = os.getenv(
+    "VECTOR_INDEX_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'index', 'sections.npz'))
+)
+# Rows per inverted list the approximate (IVF) mode aims for
+IVF_LIST_SIZE = int(os.getenv("IVF_LIST_SIZE", "256"))
+# Inverted lists scanned per query in IVF mode
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+
+
+def normalize(vectors):
+    """L2-normalize rows as float32 so a dot product is cosine similarity."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first, without a full sort."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind='stable')]
+
+
+class VectorIndex:
+    """
+    Corpus-wide index of normalized section embeddings keyed by
+    (pdf_name, section_id). Exact search is one matrix-vector product;
+    the optional IVF mode clusters rows with spherical k-means and scans
+    only the lists closest to the query.
+    """
+
+    def __init__(self, dim=0, model=None):
+        self.model = model or model_hash()  # embedding model the vectors come from
+        # Set when PDFs already in Mongo may be missing (new or discarded index)
+        self.needs_backfill = False
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.pdf_names = []
+        self.section_ids = []
+        self.centroids = None
+        self.assignments = None
+        self._trained_size = 0
+        self._rows = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.section_ids)
+
+    def _reindex(self):
+        self._rows = {key: i for i, key in enumerate(zip(self.pdf_names, self.section_ids))}
+
+    def has_pdf(self, pdf_name):
+        return pdf_name in set(self.pdf_names)
+
+    def add(self, pdf_name, section_ids, vectors, replace=True):
+        """
+        Add a PDF's section vectors.
+        Args:
+            pdf_name (str): PDF the sections belong to.
+            section_ids (List[str]): Section ids, one per vector row.
+            vectors (np.ndarray): Section embeddings (normalized here).
+            replace (bool): Drop the PDF's existing rows first; otherwise
+                only rows with the same section_id are overwritten.
+        """
+        if len(section_ids) == 0:
+            if replace:
+                self.remove(pdf_name)
+            return
+        vectors = normalize(vectors)
+        with self._lock:
+            if replace:
+                self.remove(pdf_name)
+            if len(self) == 0:
+                self.vectors = np.empty((0, vectors.shape[1]), dtype=np.float32)
+            new_rows = []
+            for section_id, vector in zip(section_ids, vectors):
+                row = self._rows.get((pdf_name, section_id))
+                if row is None:
+                    new_rows.append((section_id, vector))
+                else:
+                    self.vectors[row] = vector
+                    if self.assignments is not None:
+                        self.assignments[row] = self._nearest_list(vector[None, :])[0]
+            if new_rows:
+                added = np.vstack([v for _, v in new_rows])
+                start = len(self)
+                self.vectors = np.vstack([self.vectors, added])
+                for offset, (section_id, _) in enumerate(new_rows):
+                    self.pdf_names.append(pdf_name)
+                    self.section_ids.append(section_id)
+                    self._rows[(pdf_name, section_id)] = start + offset
+                if self.assignments is not None:
+                    self.assignments = np.concatenate([self.assignments, self._nearest_list(added)])
+            # Retrain the coarse quantizer once the corpus has doubled
+            if self.centroids is not None and len(self) > 2 * self._trained_size:
+                self.build_ivf()
+
+    def remove(self, pdf_name):
+        with self._lock:
+            keep = np.array([name != pdf_name for name in self.pdf_names], dtype=bool)
+            if keep.all():
+                return
+            self.vectors = self.vectors[keep]
+            self.pdf_names = [n for n, k in zip(self.pdf_names, keep) if k]
+            self.section_ids = [s for s, k in zip(self.section_ids, keep) if k]
+            if self.assignments is not None:
+                self.assignments = self.assignments[keep]
+            self._reindex()
+
+    def _nearest_list(self, vectors):
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def build_ivf(self, nlist=None, iterations=10, seed=0):
+        """Train the IVF coarse quantizer (spherical k-means) over all rows."""
+        with self._lock:
+            n = len(self)
+            if n == 0:
+                return
+            nlist = nlist or max(1, n // IVF_LIST_SIZE)
+            nlist = min(nlist, n)
+            rng = np.random.default_rng(seed)
+            centroids = self.vectors[rng.choice(n, nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assignments = np.argmax(self.vectors @ centroids.T, axis=1)
+                for c in range(nlist):
+                    members = self.vectors[assignments == c]
+                    if len(members):
+                        centroids[c] = members.sum(axis=0)
+                centroids = normalize(centroids)
+            self.centroids = centroids
+            self.assignments = self._nearest_list(self.vectors)
+            self._trained_size = n
+
+    def search(self, query, k=5, pdf_names=None, mode="exact", nprobe=None):
+        """
+        Global top-k over the indexed sections.
+        Args:
+            query (np.ndarray): Query embedding.
+            k (int): Number of results.
+            pdf_names (List[str]): Restrict results to these PDFs (default all).
+            mode (str): "exact" for brute force, "ivf" for approximate search.
+            nprobe (int): Inverted lists scanned in IVF mode.
+        Returns:
+            List[Tuple[str, str, float]]: (pdf_name, section_id, score), best first.
+        """
+        with self._lock:
+            if len(self) == 0:
+                return []
+            q = normalize(query)[0]
+            candidates = None
+            if pdf_names is not None:
+                wanted = set(pdf_names)
+                candidates = np.fromiter((n in wanted for n in self.pdf_names), dtype=bool, count=len(self))
+            if mode == "ivf":
+                if self.centroids is None:
+                    self.build_ivf()
+                probe = top_k(self.centroids @ q, nprobe or IVF_NPROBE)
+                in_lists = np.isin(self.assignments, probe)
+                candidates = in_lists if candidates is None else candidates & in_lists
+            elif mode != "exact":
+                raise ValueError(f"Unknown search mode: {mode}")
+            rows = np.arange(len(self)) if candidates is None else np.flatnonzero(candidates)
+            scores = self.vectors[rows] @ q
+            best = top_k(scores, k)
+            return [(self.pdf_names[rows[i]], self.section_ids[rows[i]], float(scores[i])) for i in best]
+
+    def save(self, path=VECTOR_INDEX_PATH):
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            arrays = {
+                'vectors': self.vectors,
+                'pdf_names': np.array(self.pdf_names, dtype=str),
+                'section_ids': np.array(self.section_ids, dtype=str),
+                'trained_size': np.array(self._trained_size),
+                'model': np.array(self.model),
+            }
+            if self.centroids is not None:
+                arrays['centroids'] = self.centroids
+                arrays['assignments'] = self.assignments
+            # Write to a temp file first so readers never see a partial index
+            tmp_path = path + '.tmp.npz'
+            np.savez(tmp_path, **arrays)
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=VECTOR_INDEX_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            # Indexes saved before the model was recorded have none
+            index = cls(model=str(data['model']) if 'model' in data else 'unknown')
+            index.vectors = data['vectors'].astype(np.float32, copy=False)
+            index.pdf_names = data['pdf_names'].tolist()
+            index.section_ids = data['section_ids'].tolist()
+            index._trained_size = int(data['trained_size'])
+            if 'centroids' in data:
+                index.centroids = data['centroids']
+                index.assignments = data['assignments']
+        index._reindex()
+        return index
+
+
+_index = None
+_index_path = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+@contextmanager
+def _file_lock(path):
+    # Serializes read-modify-write of the index file between processes (API and CLI)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + '.lock', 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _mtime(path):
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else None
+
+
+def get_index(path=VECTOR_INDEX_PATH):
+    """
+    Process-wide index, loaded from disk on first use and reloaded when
+    another process (e.g. the CLI ingest) has rewritten the file. An index
+    built with another embedding model (or dimension) is discarded: its
+    vectors cannot be compared with the current model's queries.
+    """
+    global _index, _index_path, _index_mtime
+    with _index_lock:
+        mtime = _mtime(path)
+        if _index is None or path != _index_path or (mtime is not None and mtime != _index_mtime):
+            _index = VectorIndex.load(path) if mtime is not None else None
+            if _index is None or _index.model != model_hash():
+                if _index is not None:
+                    print(f"Discarding vector index built with another model ({_index.model}); "
+                          f"PDFs are re-added from stored embeddings")
+                _index = VectorIndex()
+                _index.needs_backfill = True
+            _index_path, _index_mtime = path, mtime
+        return _index
+
+
+def update_index(pdf_name, section_ids, vectors, replace=True, path=VECTOR_INDEX_PATH):
+    """
+    Add a PDF's section vectors to the shared index and persist it. Blocking
+    (file lock and a full rewrite of the file): call it off the event loop.
+    """
+    global _index_mtime
+    with _file_lock(path):
+        # Reloads first if another process saved since, so its updates are kept
+        index = get_index(path)
+        index.add(pdf_name, section_ids, vectors, replace=replace)
+        with _index_lock:
+            index.save(path)
+            _index_mtime = _mtime(path)
+    return index
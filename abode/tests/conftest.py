@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules import each other as `pdf_pipeline.*` / `app.*`, relative to abode/
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
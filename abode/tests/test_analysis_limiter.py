@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.executors import AnalysisLimiter
+from app.headings_api import stream_from
+
+
+def test_full_queue_is_rejected_before_waiting():
+    async def run():
+        limiter = AnalysisLimiter(max_running=1, max_queued=0)
+        await limiter.acquire()
+        with pytest.raises(HTTPException) as rejected:
+            await limiter.acquire()
+        assert rejected.value.status_code == 429
+        limiter.release()
+        async with limiter.slot():
+            assert limiter.running == 1
+        assert limiter.running == 0
+
+    asyncio.run(run())
+
+
+def test_stream_releases_its_slot_when_dropped_early():
+    async def run():
+        limiter = AnalysisLimiter(max_running=1, max_queued=0)
+
+        async def events():
+            try:
+                for event in ("metadata", "document", "done"):
+                    yield event
+            finally:
+                limiter.release()
+
+        await limiter.acquire()
+        stream = events()
+        # As in persona_query_stream: the first event is produced before the response
+        stream = stream_from(await stream.__anext__(), stream)
+        assert await stream.__anext__() == "metadata"
+        # The client disconnects after the first event
+        await stream.aclose()
+        assert limiter.running == 0
+        await asyncio.wait_for(limiter.acquire(), 1)
+
+    asyncio.run(run())
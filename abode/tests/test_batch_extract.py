@@ -0,0 +1,28 @@
+import json
+import os
+from pdf_pipeline import batch_extract
+
+
+def test_a_failing_file_does_not_stop_the_sequential_run(tmp_path, monkeypatch, capsys):
+    input_dir, output_dir = tmp_path / 'in', tmp_path / 'out'
+    input_dir.mkdir()
+    for name in ('a.pdf', 'corrupt.pdf', 'c.pdf'):
+        (input_dir / name).write_bytes(name.encode())
+
+    def process_pdf(pdf_path):
+        if pdf_path.endswith('corrupt.pdf'):
+            raise RuntimeError('cannot open broken document')
+        return {'title': os.path.basename(pdf_path), 'outline': []}
+
+    monkeypatch.setattr(batch_extract, 'process_pdf', process_pdf)
+    batch_extract.main(str(input_dir), str(output_dir))
+    assert sorted(os.listdir(output_dir)) == ['.batch_manifest.json', 'a.json', 'c.json']
+    manifest = json.loads((output_dir / '.batch_manifest.json').read_text())
+    assert sorted(manifest) == ['a.pdf', 'c.pdf']
+    out = capsys.readouterr().out
+    assert 'Failed corrupt.pdf: cannot open broken document' in out
+    assert 'Total: 2 files' in out and 'Failed: 1 files (corrupt.pdf)' in out
+    # The failed file is retried on the next run, the others are up to date
+    batch_extract.main(str(input_dir), str(output_dir))
+    out = capsys.readouterr().out
+    assert 'Skipped a.pdf' in out and 'Failed corrupt.pdf' in out
@@ -0,0 +1,20 @@
+import pytest
+from benchmark import compare
+
+
+def _report(pages_per_sec=100.0, f1=0.9, **settings):
+    return {"inference_backend": "torch", "ml": True, "embeddings": False, **settings,
+            "suites": {"ground_truth": {"pages_per_sec": pages_per_sec, "f1": f1}}}
+
+
+def test_flags_throughput_and_f1_regressions():
+    assert compare(_report(90.0, 0.9), _report()) == []
+    failures = compare(_report(70.0, 0.85), _report())
+    assert len(failures) == 2
+    assert failures[0].startswith("ground_truth: throughput")
+
+
+@pytest.mark.parametrize("setting", [{"ml": False}, {"embeddings": True}, {"inference_backend": "onnx"}])
+def test_refuses_baselines_run_with_other_settings(setting):
+    with pytest.raises(ValueError):
+        compare(_report(), _report(**setting))
@@ -0,0 +1,88 @@
+import mongomock
+import pytest
+from pdf_pipeline import span_table
+from pdf_pipeline.bulk_writer import current_filter, new_ingest_id, switch_outline, write_pdf_docs
+from pdf_pipeline.span_table import SpanTable, SpanTableBuilder
+
+
+def _sections(prefix, n):
+    return [{'section_id': str(i), 'text': f'{prefix} {i}'} for i in range(n)]
+
+
+def _read(db, pdf_name):
+    outline = db.outlines.find_one({'pdf_name': pdf_name})
+    return sorted(doc['text'] for doc in db.sections.find(current_filter(pdf_name, outline.get('ingest_id'))))
+
+
+def test_readers_see_one_ingest_until_the_outline_switches():
+    db = mongomock.MongoClient().db
+    old = new_ingest_id()
+    write_pdf_docs(db, 'sections', 'a.pdf', _sections('old', 3), old)
+    db.outlines.insert_one({'pdf_name': 'a.pdf', 'ingest_id': old})
+    new = new_ingest_id()
+    write_pdf_docs(db, 'sections', 'a.pdf', _sections('new', 2), new, chunk_size=1)
+    # Both sets are stored, but readers still see only the old one
+    assert db.sections.count_documents({'pdf_name': 'a.pdf'}) == 5
+    assert _read(db, 'a.pdf') == ['old 0', 'old 1', 'old 2']
+    replaced = switch_outline(db, {'pdf_name': 'a.pdf', 'ingest_id': new})
+    assert replaced['ingest_id'] == old
+    assert _read(db, 'a.pdf') == ['new 0', 'new 1']
+    assert db.sections.count_documents({'pdf_name': 'a.pdf'}) == 2
+
+
+def test_concurrent_reingests_never_delete_the_winner():
+    db = mongomock.MongoClient().db
+    first, second = new_ingest_id(), new_ingest_id()
+    write_pdf_docs(db, 'sections', 'a.pdf', _sections('first', 2), first)
+    switch_outline(db, {'pdf_name': 'a.pdf', 'ingest_id': first})
+    # Two re-ingests write side by side; the one that switches last wins
+    a, b = new_ingest_id(), new_ingest_id()
+    write_pdf_docs(db, 'sections', 'a.pdf', _sections('a', 2), a)
+    write_pdf_docs(db, 'sections', 'a.pdf', _sections('b', 3), b)
+    switch_outline(db, {'pdf_name': 'a.pdf', 'ingest_id': b})
+    assert _read(db, 'a.pdf') == ['b 0', 'b 1', 'b 2']
+    switch_outline(db, {'pdf_name': 'a.pdf', 'ingest_id': a})
+    assert _read(db, 'a.pdf') == ['a 0', 'a 1']
+    assert db.sections.count_documents({'pdf_name': 'a.pdf'}) == 2
+
+
+def test_switching_from_a_legacy_outline_drops_untagged_docs():
+    db = mongomock.MongoClient().db
+    db.sections.insert_many(_sections('legacy', 2) + [dict(s, pdf_name='other.pdf') for s in _sections('x', 1)])
+    db.sections.update_many({'pdf_name': {'$exists': False}}, {'$set': {'pdf_name': 'a.pdf'}})
+    db.outlines.insert_one({'pdf_name': 'a.pdf'})
+    new = new_ingest_id()
+    write_pdf_docs(db, 'sections', 'a.pdf', _sections('new', 1), new)
+    switch_outline(db, {'pdf_name': 'a.pdf', 'ingest_id': new})
+    assert _read(db, 'a.pdf') == ['new 0']
+    assert db.sections.count_documents({}) == 2
+
+
+def test_failed_write_leaves_no_partial_set():
+    db = mongomock.MongoClient().db
+
+    def docs():
+        yield from _sections('new', 2)
+        raise RuntimeError('parser failed')
+
+    with pytest.raises(RuntimeError):
+        write_pdf_docs(db, 'sections', 'a.pdf', docs(), new_ingest_id(), chunk_size=1)
+    assert db.sections.count_documents({}) == 0
+
+
+def test_legacy_outline_matches_every_document():
+    assert current_filter('a.pdf') == {'pdf_name': 'a.pdf'}
+
+
+def test_builder_packs_chunks_into_the_same_table(monkeypatch):
+    spans = [{'page': i // 10 + 1, 'text': f'line {i}', 'font_name': f'F{i % 3}', 'font_size': 10.0 + i % 4,
+              'font_weight': 'bold' if i % 5 == 0 else 'normal', 'bbox': [i, i, i + 1, i + 1] if i % 7 else None}
+             for i in range(25)]
+    spans[12]['style'] = 'Heading 1'
+    whole = SpanTable.from_dicts(spans)
+    monkeypatch.setattr(span_table, '_BUILDER_CHUNK', 4)
+    builder = SpanTableBuilder()
+    for span in spans:
+        builder.append(span)
+    assert len(builder) == 25
+    assert builder.build().to_dicts() == whole.to_dicts()
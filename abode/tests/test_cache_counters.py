@@ -0,0 +1,44 @@
+import threading
+import numpy as np
+from pdf_pipeline import heading_cache, persona_encoder
+
+
+class _Encoder:
+    def encode(self, text):
+        return np.ones(4)
+
+
+def _in_threads(fn, threads=8):
+    workers = [threading.Thread(target=fn, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def test_query_encodes_are_all_counted(monkeypatch):
+    monkeypatch.setattr(persona_encoder, 'get_model', lambda: _Encoder())
+    monkeypatch.setattr(persona_encoder, 'QUERY_CACHE_DB', '')
+    before = persona_encoder.query_cache_stats()['encodes']
+
+    def encode(n):
+        for i in range(200):
+            persona_encoder.compute_query_embedding(f'counter test {n} {i}')
+
+    _in_threads(encode)
+    assert persona_encoder.query_cache_stats()['encodes'] - before == 1600
+
+
+def test_classified_texts_are_all_counted(monkeypatch):
+    monkeypatch.setattr(heading_cache, 'HEADING_CACHE_DB', '')
+    before = heading_cache.heading_cache_stats()['classified']
+
+    def store(n):
+        for i in range(200):
+            heading_cache.store_results({f'counter test {n} {i}': {'label': 'LABEL_0', 'score': 0.5}})
+
+    try:
+        _in_threads(store)
+        assert heading_cache.heading_cache_stats()['classified'] - before == 1600
+    finally:
+        heading_cache.clear_memory()
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from pdf_pipeline.embedding_store import (dequantize, decode_doc_chunks, decode_doc_vector, embedding_docs,
+                                          match_section_vectors, quantize)
+
+
+def _vectors(rows=20, dim=384):
+    return np.random.default_rng(0).normal(size=(rows, dim)).astype(np.float32)
+
+
+@pytest.mark.parametrize('dtype, tolerance', [('float32', 0.0), ('float16', 1e-3), ('int8', 1 / 127)])
+def test_quantize_round_trips_within_the_dtype_precision(dtype, tolerance):
+    vectors = _vectors()
+    vectors[3] = 0.0
+    rows, scales = quantize(vectors, dtype)
+    assert rows.dtype == np.dtype(dtype)
+    assert (scales is not None) == (dtype == 'int8')
+    restored = dequantize(rows, scales)
+    assert restored.dtype == np.float32
+    # Relative to each row's largest component, which int8 maps to 127
+    peak = np.abs(vectors).max(axis=1, keepdims=True)
+    assert np.all(np.abs(restored - vectors) <= tolerance * np.maximum(peak, 1e-6) + 1e-7)
+    # An all-zero row stays zero instead of dividing by a zero scale
+    assert not restored[3].any()
+
+
+def test_int8_rows_use_the_full_range():
+    vectors = _vectors()
+    vectors[3] = 0.0
+    rows, scales = quantize(vectors, 'int8')
+    assert np.abs(rows).max(axis=1)[[0, 1, 2, 4]].tolist() == [127] * 4
+    assert scales[3] == 1.0
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'float16', 'int8'])
+def test_stored_docs_decode_and_match_their_sections(dtype):
+    vectors = _vectors(3, 8)
+    sections = [{'section_id': str(n), 'text': f'Section {n}'} for n in range(3)]
+    chunks = [None, vectors[:2], vectors[1:2]]
+    docs = embedding_docs('a.pdf', sections, vectors, chunks, dtype=dtype)
+    assert [doc['chunks'] for doc in docs] == [1, 2, 1]
+    np.testing.assert_allclose(decode_doc_vector(docs[0]), vectors[0], atol=0.05)
+    np.testing.assert_allclose(decode_doc_chunks(docs[1]), vectors[:2], atol=0.05)
+    assert decode_doc_chunks(docs[2]) is None
+    # A section whose text changed since it was encoded needs a new vector
+    sections[1] = {'section_id': '1', 'text': 'Rewritten'}
+    matched, stale = match_section_vectors(sections, docs)
+    assert stale == [1] and matched[1] is None and matched[2] is not None
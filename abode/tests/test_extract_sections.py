@@ -0,0 +1,67 @@
+from pdf_pipeline.ingest import extract_sections
+
+
+def _span(page, text, y, x=72.0, size=11.0):
+    return {'page': page, 'text': text, 'font_name': 'Times', 'font_size': size, 'font_weight': 'normal',
+            'bbox': [x, y, x + 200.0, y + 12.0]}
+
+
+def _outline(*headings):
+    return {'title': 'T', 'outline': [{'level': level, 'text': text, 'page': page} for level, text, page in headings]}
+
+
+def test_headings_sharing_a_page_get_their_own_text():
+    # Stored out of reading order: the second column and lower lines come first
+    spans = [
+        _span(1, 'Methods', 300.0, size=14.0),
+        _span(1, 'Method text.', 320.0),
+        _span(1, 'Introduction', 100.0, size=14.0),
+        _span(1, 'Intro text.', 120.0),
+        _span(1, 'More intro,', 140.0),
+        _span(1, 'continued.', 140.0, x=300.0),
+        _span(2, 'Results', 100.0, size=14.0),
+        _span(2, 'Result text.', 120.0),
+    ]
+    outline = _outline(('H1', 'Introduction', 1), ('H2', 'Methods', 1), ('H1', 'Results', 2))
+    sections = extract_sections(spans, outline)
+    assert [(s['section_id'], s['level'], s['text']) for s in sections] == [
+        ('1', 'H1', 'Introduction\nIntro text.\nMore intro,\ncontinued.'),
+        ('2', 'H2', 'Methods\nMethod text.'),
+        ('3', 'H1', 'Results\nResult text.'),
+    ]
+    # Reading-order offsets, end exclusive, covering every span exactly once
+    assert [(s['span_start'], s['span_end']) for s in sections] == [(0, 4), (4, 6), (6, 8)]
+    assert [(s['page_start'], s['page_end']) for s in sections] == [(1, 1), (1, 1), (2, 2)]
+
+
+def test_last_section_runs_to_the_end_of_the_document():
+    spans = [_span(1, 'Only heading', 100.0)] + [_span(page, f'Page {page} text', 200.0) for page in range(1, 4)]
+    sections = extract_sections(spans, _outline(('H1', 'Only heading', 1)))
+    assert len(sections) == 1
+    assert sections[0]['text'].endswith('Page 3 text')
+    assert (sections[0]['page_end'], sections[0]['span_end']) == (3, 4)
+
+
+def test_repeated_heading_text_is_matched_in_document_order():
+    spans = [_span(1, 'Summary', 100.0), _span(1, 'First.', 120.0), _span(1, 'Summary', 200.0), _span(1, 'Second.', 220.0)]
+    sections = extract_sections(spans, _outline(('H1', 'Summary', 1), ('H1', 'Summary', 1)))
+    assert [s['text'] for s in sections] == ['Summary\nFirst.', 'Summary\nSecond.']
+
+
+def test_unmatched_heading_starts_at_its_page_or_is_dropped():
+    spans = [_span(1, 'Intro', 100.0), _span(1, 'Intro text.', 120.0),
+             _span(2, 'Body of page 2.', 100.0), _span(2, 'More.', 120.0)]
+    # Detected text that no span carries verbatim (e.g. merged from two spans)
+    outline = _outline(('H1', 'Intro', 1), ('H1', 'Chapter Two', 2), ('H1', 'Appendix', 9))
+    sections = extract_sections(spans, outline)
+    # The heading on page 2 falls back to the page's first span; the one on
+    # a page without spans cuts nothing
+    assert [(s['text'], s['span_start'], s['span_end']) for s in sections] == [
+        ('Intro\nIntro text.', 0, 2),
+        ('Body of page 2.\nMore.', 2, 4),
+    ]
+
+
+def test_no_outline_or_spans_gives_no_sections():
+    assert extract_sections([_span(1, 'Text', 100.0)], {'title': '', 'outline': []}) == []
+    assert extract_sections([], _outline(('H1', 'Intro', 1))) == []
@@ -0,0 +1,91 @@
+import pytest
+from pdf_pipeline import heading_cache, heading_detection
+from pdf_pipeline.heading_detection import classify_headings, detect_headings, repeated_lines
+from pdf_pipeline.span_table import SpanTable
+
+
+def _line(page, text, y, size=10.0):
+    return {'page': page, 'text': text, 'font_name': 'Times', 'font_size': size, 'font_weight': 'normal',
+            'bbox': [72.0, y, 400.0, y + 12.0]}
+
+
+def _document(pages=4):
+    spans = []
+    for page in range(1, pages + 1):
+        spans += [
+            _line(page, 'ACME Annual Report', 20.0),
+            _line(page, f'Body text of page {page}.', 100.0),
+            # Numbered like the footer but mid-page, so digits still count
+            _line(page, f'Table {page} shows results', 300.0),
+            _line(page, 'Revenue' if page <= 2 else f'Notes {page}', 400.0),
+            _line(page, f'Page {page} of {pages}', 760.0),
+        ]
+    return spans
+
+
+def _texts(spans, mask):
+    return [span['text'] for span, on in zip(spans, mask.tolist()) if on]
+
+
+def test_running_headers_and_numbered_footers_repeat():
+    spans = _document()
+    table = SpanTable.from_dicts(spans)
+    mask = repeated_lines(table, [t.strip() for t in table.texts()])
+    assert _texts(spans, mask) == ['ACME Annual Report', 'Page 1 of 4'] + \
+        [text for page in range(2, 5) for text in ('ACME Annual Report', f'Page {page} of 4')]
+
+
+def test_short_documents_have_no_repeated_lines():
+    spans = _document(pages=2)
+    table = SpanTable.from_dicts(spans)
+    assert not repeated_lines(table, [t.strip() for t in table.texts()]).any()
+
+
+def test_repeated_lines_are_not_classified(monkeypatch):
+    classified = []
+
+    def classify(texts, batch_size=None):
+        classified.extend(texts)
+        return [False] * len(texts)
+
+    monkeypatch.setattr(heading_detection, 'classify_headings', classify)
+    # Most text is larger than the lines above, which leaves those to the classifier
+    paragraphs = [_line(page, f'Paragraph {n}', 120.0 + 20 * n, size=12.0) for page in range(1, 5) for n in range(6)]
+    spans = _document() + paragraphs
+    detect_headings(spans, 'report.pdf', candidate_filter=lambda text, level: True)
+    assert classified
+    assert not [text for text in classified if text.startswith(('ACME', 'Page '))]
+
+
+@pytest.fixture
+def classifier(monkeypatch):
+    """Fake classifier recording its batches; texts ending in ':' are headings."""
+    monkeypatch.setattr(heading_cache, 'HEADING_CACHE_DB', '')
+    heading_cache.clear_memory()
+    batches = []
+
+    def classify(texts, batch_size, truncation):
+        batches.append(list(texts))
+        return [{'label': 'LABEL_1', 'score': 0.95 if t.endswith(':') else 0.4} for t in texts]
+
+    monkeypatch.setattr(heading_detection, 'get_heading_classifier', lambda: classify)
+    yield batches
+    heading_cache.clear_memory()
+
+
+def test_classify_headings_batches_each_distinct_text_once(classifier):
+    texts = ['Scope:', 'ok', '', 'A longer body sentence.', 'Scope:', '  Scope:  ', 'Goals and aims:', 'Notes']
+    assert classify_headings(texts, batch_size=2) == [True, False, False, False, True, True, True, False]
+    # Short texts never reach the model; duplicates (after normalizing) go once, shortest first
+    assert classifier == [['Notes', 'Scope:'], ['Goals and aims:', 'A longer body sentence.']]
+
+
+def test_classify_headings_reuses_cached_decisions(classifier):
+    classify_headings(['Scope:', 'Body text here'])
+    classifier.clear()
+    assert classify_headings(['Scope:', 'New heading:', 'Body text here']) == [True, True, False]
+    assert classifier == [['New heading:']]
+    assert classify_headings(['Scope:', 'New heading:']) == [True, True]
+    assert classifier == [['New heading:']]
+    # The threshold is applied to the cached score, not stored with it
+    assert classify_headings(['Scope:'], threshold=0.99) == [False]
@@ -0,0 +1,90 @@
+import hashlib
+import fitz
+import numpy as np
+import pytest
+from pdf_pipeline import heading_cache, heading_detection, incremental
+from pdf_pipeline.incremental import ingest_results, parse_revision
+from pdf_pipeline.parse_pdf import page_fingerprints, parse_pdf
+
+
+def _fake_encode(texts):
+    vectors = np.array([np.frombuffer(hashlib.sha256(t.encode()).digest()[:8], dtype=np.uint8)
+                        for t in texts], dtype=np.float32).reshape(len(texts), 8)
+    return vectors, [v[None, :] for v in vectors]
+
+
+def _fake_classifier(texts, batch_size=None, truncation=True):
+    return [{'label': 'LABEL_1' if hashlib.md5(t.encode()).digest()[0] % 3 == 0 else 'LABEL_0', 'score': 0.9}
+            for t in texts]
+
+
+@pytest.fixture(autouse=True)
+def fake_models(monkeypatch):
+    monkeypatch.setattr(incremental, 'encode_section_chunks', _fake_encode)
+    monkeypatch.setattr(heading_detection, 'get_heading_classifier', lambda: _fake_classifier)
+    monkeypatch.setattr(heading_cache, 'HEADING_CACHE_DB', '')
+    heading_cache.clear_memory()
+
+
+def _write_pdf(path, pages):
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page()
+        for i, (text, size) in enumerate(lines):
+            page.insert_text((72, 72 + 30 * i), text, fontsize=size, fontname="helv")
+    doc.save(path)
+    doc.close()
+
+
+def _pages(n):
+    return [[(f"Chapter {p} title", 20), (f"Part {p} subheading", 14), (f"Body line one of page {p}.", 10),
+             (f"Small print {p}", 8)] for p in range(1, n + 1)]
+
+
+@pytest.fixture
+def revision(tmp_path):
+    v1, v2 = str(tmp_path / 'v1.pdf'), str(tmp_path / 'v2.pdf')
+    pages = _pages(12)
+    _write_pdf(v1, pages)
+    revised = pages[:4] + [[("Inserted appendix", 20), ("New body text here.", 10)]] + pages[4:]
+    revised[8] = revised[8] + [("An added paragraph.", 10)]
+    _write_pdf(v2, revised)
+    return v1, v2
+
+
+def _previous(v1):
+    results = ingest_results(v1, 'doc.pdf')
+    return {**results, 'versions': None}
+
+
+def test_parse_revision_matches_full_parse(revision):
+    v1, v2 = revision
+    previous = _previous(v1)
+    spans, parsed = parse_revision(v2, page_fingerprints(v2), previous)
+    assert parsed == [5, 9]
+    assert spans.to_dicts() == parse_pdf(v2).to_dicts()
+
+
+def test_incremental_ingest_matches_full_ingest(revision):
+    v1, v2 = revision
+    incremental_results = ingest_results(v2, 'doc.pdf', _previous(v1))
+    full = ingest_results(v2, 'doc.pdf')
+    assert incremental_results['incremental']['parsed_pages'] == 2
+    assert incremental_results['incremental']['encoded_sections'] < len(full['sections'])
+    for key in ('outline', 'sections', 'page_fingerprints'):
+        assert incremental_results[key] == full[key]
+    # Earlier decisions about text still in the document are kept as well
+    decisions = incremental_results['ml_decisions']
+    assert {text: decisions[text] for text in full['ml_decisions']} == full['ml_decisions']
+    assert incremental_results['spans'].to_dicts() == full['spans'].to_dicts()
+    np.testing.assert_array_equal(incremental_results['vectors'], full['vectors'])
+
+
+def test_malformed_previous_falls_back_to_full_pdf_ingest(revision):
+    v1, v2 = revision
+    previous = {**_previous(v1), 'page_fingerprints': None}
+    results = ingest_results(v2, 'doc.pdf', previous)
+    assert 'incremental' not in results
+    # Parsed as a PDF, not through the DOCX route
+    assert results['page_fingerprints'] == page_fingerprints(v2)
+    assert results['spans'].to_dicts() == parse_pdf(v2).to_dicts()
@@ -0,0 +1,35 @@
+import asyncio
+import os
+import app.main
+from app.jobs import jobs
+
+
+def test_ingests_of_one_pdf_run_one_at_a_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.main, 'UPLOAD_DIR', str(tmp_path))
+    running, seen = [], {}
+
+    async def fake_ingest(job_id, pdf_path, pdf_name):
+        assert pdf_name not in running
+        running.append(pdf_name)
+        await asyncio.sleep(0.01)
+        with open(pdf_path) as f:
+            seen[job_id] = f.read()
+        running.remove(pdf_name)
+
+    monkeypatch.setattr(app.main, 'ingest_file', fake_ingest)
+    staged = {}
+
+    async def run():
+        runs = []
+        for n, name in enumerate(['a.pdf', 'a.pdf', 'b.pdf', 'a.pdf']):
+            job_id = jobs.create(name)['job_id']
+            staged[job_id] = f'version {n}'
+            path = tmp_path / f'.{job_id}.upload'
+            path.write_text(staged[job_id])
+            runs.append(app.main.run_ingest_job(job_id, str(path), name))
+        await asyncio.gather(*runs)
+
+    asyncio.run(run())
+    # Every job read its own upload, never one staged by a later job
+    assert seen == staged
+    assert sorted(os.listdir(tmp_path)) == ['a.pdf', 'b.pdf']
@@ -0,0 +1,45 @@
+import threading
+from app.jobs import JobRegistry
+
+
+def test_only_finished_jobs_are_evicted_oldest_first():
+    registry = JobRegistry(max_jobs=3)
+    running = registry.create('running.pdf')['job_id']
+    registry.stage(running, 'parsing')
+    first, second = registry.create('first.pdf')['job_id'], registry.create('second.pdf')['job_id']
+    registry.finish(second, result={})
+    registry.finish(first, error='boom')
+    registry.create('next.pdf')
+    # second finished first, so it goes; the running job stays although it is the oldest
+    assert registry.get(second) is None
+    assert registry.get(running)['stage'] == 'parsing'
+    assert registry.get(first)['status'] == 'failed'
+
+
+def test_registry_grows_rather_than_drop_active_jobs():
+    registry = JobRegistry(max_jobs=2)
+    ids = [registry.create(f'{n}.pdf')['job_id'] for n in range(4)]
+    assert [registry.get(job_id)['status'] for job_id in ids] == ['queued'] * 4
+    for job_id in ids:
+        registry.finish(job_id, result={})
+    registry.create('later.pdf')
+    assert [registry.get(job_id) for job_id in ids[:3]] == [None] * 3
+    assert registry.get(ids[3])['status'] == 'done'
+
+
+def test_concurrent_updates_keep_every_job():
+    registry = JobRegistry(max_jobs=50)
+
+    def worker():
+        for _ in range(200):
+            job_id = registry.create('a.pdf')['job_id']
+            registry.stage(job_id, 'parsing')
+            registry.finish(job_id, result={})
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(registry._jobs) == 50
+    assert all(job['status'] == 'done' for job in registry._jobs.values())
@@ -0,0 +1,72 @@
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+import app.db
+from app.main import app as api
+from types import SimpleNamespace
+from pdf_pipeline import mongo_utils
+from pdf_pipeline.metrics import Counter, Histogram, MongoCommandMetrics, _registry, render, stage_breakdown
+
+
+@pytest.fixture
+def registry():
+    # Metrics created by a test are removed from the scrape afterwards
+    before = list(_registry)
+    yield
+    _registry[:] = before
+
+
+def test_histogram_renders_cumulative_buckets(registry):
+    latency = Histogram('test_latency_seconds', 'Test latency.', buckets=(0.1, 1.0), labelnames=('route',))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        latency.observe(value, route='/a')
+    Counter('test_errors_total', 'Test errors.', labelnames=('stage',)).inc(stage='say "hi"\n')
+    text = render()
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1\n' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="1"} 3\n' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 4\n' in text
+    assert 'test_latency_seconds_sum{route="/a"} 6.25\n' in text
+    assert 'test_latency_seconds_count{route="/a"} 4\n' in text
+    assert 'test_errors_total{stage="say \\"hi\\"\\n"} 1\n' in text
+
+
+def _count(text, labels):
+    prefix = f'abode_http_request_seconds_count{{{labels}}} '
+    return next((int(line[len(prefix):]) for line in text.splitlines() if line.startswith(prefix)), 0)
+
+
+def test_requests_are_labelled_by_route_template(monkeypatch):
+    monkeypatch.setattr(app.db, 'db', AsyncMongoMockClient()['abode'])
+    client = TestClient(api)
+    sections = 'method="GET",route="/sections/{pdf_name}",status="200"'
+    unmatched = 'method="GET",route="unmatched",status="404"'
+    before = client.get('/metrics').text
+    client.get('/sections/metrics-a.pdf')
+    client.get('/sections/metrics-b.pdf')
+    assert client.get('/no-such-route/metrics-c').status_code == 404
+    text = client.get('/metrics').text
+    assert _count(text, sections) == _count(before, sections) + 2
+    assert _count(text, unmatched) == _count(before, unmatched) + 1
+    # Raw paths would give every PDF its own series
+    assert 'metrics-a.pdf' not in text and 'metrics-c' not in text
+
+
+def test_mongo_commands_add_up_in_the_stage_breakdown():
+    listener = MongoCommandMetrics()
+    with stage_breakdown() as stages:
+        listener.succeeded(SimpleNamespace(duration_micros=1500, command_name='insert'))
+        listener.failed(SimpleNamespace(duration_micros=500, command_name='find'))
+    assert stages == {'mongo': 0.002}
+    # Outside a breakdown only the histogram records it
+    listener.succeeded(SimpleNamespace(duration_micros=1500, command_name='insert'))
+    assert 'abode_mongo_command_seconds_count{command="find",status="failed"}' in render()
+
+
+def test_cli_clients_are_instrumented(monkeypatch):
+    monkeypatch.setattr(mongo_utils, '_clients', {})
+    # Clients connect lazily, so no server is needed
+    _, client = mongo_utils.get_db('mongodb://localhost:1', 'abode')
+    try:
+        assert any(isinstance(listener, MongoCommandMetrics) for listener in client.options.event_listeners)
+    finally:
+        mongo_utils.close_clients()
@@ -0,0 +1,29 @@
+import threading
+from pdf_pipeline import model_registry
+from pdf_pipeline.model_registry import get_model, model_stats
+
+
+def test_concurrent_uses_are_all_counted(monkeypatch):
+    # Thread settings apply to torch, which this test does not need
+    monkeypatch.setattr(model_registry, '_threads_configured', True)
+    loads = []
+
+    def loader(name, backend):
+        loads.append(name)
+        return object()
+
+    def use():
+        for _ in range(2000):
+            get_model('test-model', loader, 'torch')
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert loads == ['test-model']
+        assert model_stats()['test-model']['uses'] == 16000
+    finally:
+        model_registry._models.pop('test-model', None)
+        model_registry._stats.pop('test-model', None)
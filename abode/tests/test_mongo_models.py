@@ -0,0 +1,45 @@
+import mongomock
+from pdf_pipeline.mongo_models import MODELS, check_coverage, covering_index, ensure_indexes
+
+KEYS = [('pdf_name', 1), ('ingest_id', 1), ('span_start', 1)]
+
+
+def test_covering_index_matches_leading_keys():
+    assert covering_index(('pdf_name', 'ingest_id'), KEYS) == 'full'
+    # Equality fields may be listed in any order
+    assert covering_index(('ingest_id', 'pdf_name', 'span_start'), KEYS) == 'full'
+    assert covering_index(('pdf_name', 'section_id'), KEYS) == 'partial'
+    assert covering_index(('ingest_id',), KEYS) is None
+    assert covering_index(('span_start', 'pdf_name'), [('_id', 1)]) is None
+
+
+def test_model_indexes_cover_every_query_shape():
+    db = mongomock.MongoClient()['abode']
+    assert ensure_indexes(db) == []
+    # Running again leaves the existing indexes alone
+    assert ensure_indexes(db) == []
+
+
+def test_check_coverage_reports_missing_indexes():
+    db = mongomock.MongoClient()['abode']
+    ensure_indexes(db)
+    info = {model.collection_name: db[model.collection_name].index_information() for model in MODELS}
+    info['sections'] = {name: index for name, index in info['sections'].items() if 'span_start' not in dict(index['key'])}
+    del info['summaries']
+    problems = check_coverage(info)
+    assert 'sections query on pdf_name, ingest_id, span_start is only partially covered' in problems
+    assert 'summaries query on text_hash, sentences_count is not covered (collection scan)' in problems
+    assert not [problem for problem in problems if problem.startswith(('spans', 'outlines', 'embeddings'))]
+
+
+def test_legacy_outlines_are_deduplicated_before_the_unique_index():
+    db = mongomock.MongoClient()['abode']
+    # As the baseline left them: one outline per upload, under a non-unique index
+    db.outlines.create_index('pdf_name')
+    db.outlines.insert_many([{'pdf_name': 'a.pdf', 'title': f'upload {n}'} for n in range(3)]
+                            + [{'pdf_name': 'b.pdf', 'title': 'only'}])
+    assert 'outlines unique index on pdf_name is missing (duplicates are possible)' in check_coverage(
+        {'outlines': db.outlines.index_information()})
+    assert ensure_indexes(db) == []
+    assert sorted(doc['title'] for doc in db.outlines.find()) == ['only', 'upload 2']
+    assert db.outlines.index_information()['pdf_name_1']['unique']
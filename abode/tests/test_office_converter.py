@@ -0,0 +1,129 @@
+import os
+import shutil
+import stat
+import sys
+import pytest
+from pdf_pipeline import office_converter
+from pdf_pipeline.office_converter import ConversionError, ConverterPool
+
+# Stand-in for LibreOffice's uno module: "converting" copies the file, and
+# files named bad.* (or non-PDFs forced through the PDF import filter) cannot be opened
+FAKE_UNO = '''
+import shutil
+
+def systemPathToFileUrl(path):
+    return "file://" + path
+
+class _Doc:
+    def __init__(self, src):
+        self.src = src
+    def storeToURL(self, url, props):
+        shutil.copy(self.src, url[len("file://"):])
+    def close(self, force):
+        pass
+
+class _Desktop:
+    def loadComponentFromURL(self, url, frame, flags, props):
+        path = url[len("file://"):]
+        pdf_filter = any(p.Name == "FilterName" and p.Value == "writer_pdf_import" for p in props)
+        if path.rsplit("/", 1)[-1].startswith("bad.") or pdf_filter != path.endswith(".pdf"):
+            return None
+        return _Doc(path)
+
+class _Context:
+    def __init__(self, service):
+        self.ServiceManager = self
+        self.service = service
+    def createInstanceWithContext(self, name, ctx):
+        return self.service
+    def resolve(self, url):
+        return _Context(_Desktop())
+
+def getComponentContext():
+    return _Context(_Context(None))
+'''
+
+
+def _executable(path, text):
+    path.write_text(text)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+@pytest.fixture
+def bridge(tmp_path, monkeypatch):
+    fake = tmp_path / 'fake_uno'
+    (fake / 'com' / 'sun' / 'star').mkdir(parents=True)
+    (fake / 'uno.py').write_text(FAKE_UNO)
+    (fake / 'com' / 'sun' / 'star' / 'beans.py').write_text("class PropertyValue:\n    pass\n")
+    python = _executable(tmp_path / 'soffice-python',
+                         f'#!/bin/sh\nPYTHONPATH={fake} exec {sys.executable} "$@"\n')
+    soffice = _executable(tmp_path / 'soffice', '#!/bin/sh\nexec sleep 300\n')
+    monkeypatch.setattr(office_converter, 'SOFFICE_PATH', soffice)
+    monkeypatch.setattr(office_converter, 'SOFFICE_PYTHON', python)
+    office_converter.bridge_python.cache_clear()
+    yield
+    office_converter.bridge_python.cache_clear()
+
+
+def test_bridge_keeps_instance_running_between_conversions(bridge, tmp_path):
+    assert office_converter.converter_mode() == 'bridge'
+    src = tmp_path / 'in.pdf'
+    src.write_bytes(b'%PDF-fake')
+    pool = ConverterPool(size=1)
+    try:
+        pool.convert(str(src), str(tmp_path / 'one.docx'))
+        process = pool.instances[0].process
+        pool.convert(str(src), str(tmp_path / 'two.docx'))
+        assert pool.instances[0].process is process and process.poll() is None
+        assert (tmp_path / 'two.docx').read_bytes() == b'%PDF-fake'
+        # A failed conversion is reported and the instance restarted next time
+        (tmp_path / 'bad.pdf').write_bytes(b'')
+        with pytest.raises(ConversionError):
+            pool.convert(str(tmp_path / 'bad.pdf'), str(tmp_path / 'bad.docx'))
+        assert pool.instances[0].process is None
+        pool.convert(str(src), str(tmp_path / 'three.docx'))
+        assert os.path.exists(tmp_path / 'three.docx')
+        # Other formats are opened with the filter soffice detects
+        (tmp_path / 'notes.odt').write_bytes(b'odt')
+        pool.convert(str(tmp_path / 'notes.odt'), str(tmp_path / 'notes.docx'))
+        assert (tmp_path / 'notes.docx').read_bytes() == b'odt'
+    finally:
+        pool.close()
+
+
+def test_cli_failures_raise_conversion_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(office_converter, 'converter_mode', lambda: 'cli')
+    src = tmp_path / 'in.pdf'
+    src.write_bytes(b'')
+    for soffice in (str(tmp_path / 'missing-soffice'), shutil.which('false')):
+        monkeypatch.setattr(office_converter, 'SOFFICE_PATH', soffice)
+        pool = ConverterPool(size=1)
+        try:
+            with pytest.raises(ConversionError):
+                pool.convert(str(src), str(tmp_path / 'in.docx'))
+        finally:
+            pool.close()
+
+
+@pytest.mark.parametrize('name, infilter', [('in.pdf', ['--infilter=writer_pdf_import']), ('in.odt', [])])
+def test_cli_forces_the_pdf_filter_only_for_pdfs(tmp_path, monkeypatch, name, infilter):
+    monkeypatch.setattr(office_converter, 'converter_mode', lambda: 'cli')
+    args_file = tmp_path / 'args'
+    # Records its arguments and writes <outdir>/<stem>.docx like soffice --convert-to
+    soffice = _executable(tmp_path / 'soffice', f"""#!{sys.executable}
+import os, sys
+open({str(args_file)!r}, 'w').write('\\n'.join(sys.argv[1:]))
+out_dir, src = sys.argv[-2], sys.argv[-1]
+open(os.path.join(out_dir, os.path.splitext(os.path.basename(src))[0] + '.docx'), 'w').write('docx')
+""")
+    monkeypatch.setattr(office_converter, 'SOFFICE_PATH', soffice)
+    (tmp_path / name).write_bytes(b'')
+    pool = ConverterPool(size=1)
+    try:
+        pool.convert(str(tmp_path / name), str(tmp_path / 'out.docx'))
+    finally:
+        pool.close()
+    args = args_file.read_text().split('\n')
+    assert [arg for arg in args if arg.startswith('--infilter')] == infilter
+    assert (tmp_path / 'out.docx').read_text() == 'docx'
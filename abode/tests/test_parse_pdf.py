@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+import pytest
+from pdf_pipeline import parse_pdf as parse_module
+from pdf_pipeline.parse_pdf import iter_page_spans, parse_pdf
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / 'doc.pdf'
+    with fitz.open() as doc:
+        for n in range(1, 8):
+            page = doc.new_page()
+            page.insert_text((72, 72), f'Heading {n}', fontsize=16)
+            page.insert_text((72, 120), f'Body of page {n}', fontsize=11)
+        doc.save(str(path))
+    return str(path)
+
+
+def _failing_on(pages, page_spans):
+    def spans(page, page_number):
+        if page_number in pages:
+            raise RuntimeError('broken content stream')
+        return page_spans(page, page_number)
+    return spans
+
+
+def test_a_bad_page_is_skipped_and_recorded(pdf_path, monkeypatch):
+    monkeypatch.setattr(parse_module, '_page_spans', _failing_on({2, 5}, parse_module._page_spans))
+    failed = []
+    assert [page for page, _ in iter_page_spans(pdf_path, failed_pages=failed)] == [1, 3, 4, 6, 7]
+    assert failed == [2, 5]
+    table = parse_pdf(pdf_path, workers=1)
+    assert table.failed_pages == [2, 5]
+    assert sorted(set(table.page.tolist())) == [1, 3, 4, 6, 7]
+
+
+def test_a_document_with_no_readable_page_fails(pdf_path, monkeypatch):
+    monkeypatch.setattr(parse_module, '_page_spans', _failing_on(set(range(1, 8)), parse_module._page_spans))
+    with pytest.raises(Exception, match='Failed to parse any of the 7 pages'):
+        parse_pdf(pdf_path, workers=1)
+
+
+def test_shards_merge_back_in_page_order(pdf_path, monkeypatch):
+    sequential = parse_pdf(pdf_path, workers=1)
+    assert sequential.texts()[:4] == ['Heading 1', 'Body of page 1', 'Heading 2', 'Body of page 2']
+    # Three shards of 2-3 pages, in worker processes even on a single-CPU machine
+    monkeypatch.setattr(parse_module, 'PARSE_MIN_PAGES_PER_WORKER', 2)
+    monkeypatch.setattr(parse_module.os, 'cpu_count', lambda: 4)
+    pools = []
+
+    def pool(max_workers, **kwargs):
+        pools.append(max_workers)
+        return ProcessPoolExecutor(max_workers=max_workers, **kwargs)
+
+    monkeypatch.setattr(parse_module, 'ProcessPoolExecutor', pool)
+    sharded = parse_pdf(pdf_path, workers=3)
+    assert pools == [3]
+    assert sharded.to_dicts() == sequential.to_dicts()
+    assert sharded.failed_pages == []
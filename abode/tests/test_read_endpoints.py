@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+import app.db
+from pdf_pipeline.embedding_store import text_hash
+from app.main import app as api
+
+
+@pytest.fixture
+def db(monkeypatch):
+    mock = AsyncMongoMockClient()['abode']
+    monkeypatch.setattr(app.db, 'db', mock)
+    return mock
+
+
+def _ingest(db, pdf_name, count, legacy=False):
+    outline = {'pdf_name': pdf_name, 'title': 'T', 'outline': []}
+    sections = [{'pdf_name': pdf_name, 'section_id': str(n), 'level': 'H1' if n % 3 == 1 else 'H2',
+                 'text': f'Section {n}', 'page_start': n, 'page_end': n} for n in range(1, count + 1)]
+    if legacy:
+        # Written before span_start, ingest_id and cache_key existed, not necessarily in order
+        sections.reverse()
+    else:
+        outline.update(cache_key=f'key-{pdf_name}', ingest_id='run-2')
+        for n, section in enumerate(sections):
+            section.update(span_start=10 * n, span_end=10 * n + 10, ingest_id='run-2')
+        # A re-ingest still being written is not visible
+        sections.append({**sections[0], 'section_id': '99', 'ingest_id': 'run-3'})
+
+    async def insert():
+        await db.outlines.insert_one(outline)
+        await db.sections.insert_many(sections)
+
+    asyncio.run(insert())
+
+
+def _all_pages(client, pdf_name, **params):
+    ids, cursor = [], None
+    while True:
+        query = {'fields': 'section_id', 'limit': 3, **params, **({'cursor': cursor} if cursor else {})}
+        response = client.get(f'/sections/{pdf_name}', params=query)
+        assert response.status_code == 200
+        ids += [section['section_id'] for section in response.json()]
+        cursor = response.headers.get('x-next-cursor')
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize('legacy', [False, True])
+def test_sections_page_in_reading_order(db, legacy):
+    pdf_name = f'paged-{legacy}.pdf'
+    _ingest(db, pdf_name, 10, legacy)
+    client = TestClient(api)
+    expected = [str(n) for n in range(1, 11)]
+    assert _all_pages(client, pdf_name) == expected
+    assert _all_pages(client, pdf_name, level='H1') == ['1', '4', '7', '10']
+    ranged = client.get(f'/sections/{pdf_name}', params={'fields': 'section_id', 'section_from': '3', 'section_to': '5'})
+    assert [section['section_id'] for section in ranged.json()] == ['3', '4', '5']
+    assert client.get(f'/sections/{pdf_name}', params={'section_from': '42'}).status_code == 404
+
+
+def test_etag_answers_304_until_the_pdf_changes(db):
+    _ingest(db, 'etag.pdf', 4)
+    client = TestClient(api)
+    first = client.get('/sections/etag.pdf')
+    etag = first.headers['etag']
+    assert client.get('/sections/etag.pdf', headers={'If-None-Match': etag}).status_code == 304
+    # Other parameters are another response
+    other = client.get('/sections/etag.pdf', params={'fields': 'section_id'})
+    assert other.status_code == 200 and other.headers['etag'] != etag
+    asyncio.run(db.outlines.update_one({'pdf_name': 'etag.pdf'}, {'$set': {'cache_key': 'key-new'}}))
+    again = client.get('/sections/etag.pdf', headers={'If-None-Match': etag})
+    assert again.status_code == 200 and again.headers['etag'] != etag
+
+
+def test_legacy_pdf_etag_comes_from_the_body(db):
+    _ingest(db, 'old.pdf', 2, legacy=True)
+    client = TestClient(api)
+    etag = client.get('/sections/old.pdf').headers['etag']
+    # Without a version the response is rebuilt, then matched on its content
+    assert client.get('/sections/old.pdf', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_summary_matches_the_requested_sentence_count(db):
+    _ingest(db, 'summaries.pdf', 1)
+    key = text_hash('Section 1')
+    asyncio.run(db.summaries.insert_many([
+        {'text_hash': key, 'sentences_count': 3, 'summary_text': 'three sentences'},
+        {'text_hash': key, 'sentences_count': 2, 'summary_text': 'two sentences'},
+    ]))
+    client = TestClient(api)
+    assert client.get('/summaries/summaries.pdf/1').json() == {'summary_text': 'two sentences'}
+    assert client.get('/summaries/summaries.pdf/1', params={'sentences_count': 3}).json() == {'summary_text': 'three sentences'}
+    assert client.get('/summaries/summaries.pdf/1', params={'sentences_count': 5}).status_code == 404
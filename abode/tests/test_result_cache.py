@@ -0,0 +1,38 @@
+import os
+import numpy as np
+from pdf_pipeline.result_cache import ResultCache
+from pdf_pipeline.span_table import SpanTable
+
+
+def _spans(text='Heading'):
+    return SpanTable.from_dicts([{'page': 1, 'text': text, 'font_name': 'Helvetica', 'font_size': 12.0,
+                                  'font_weight': 'bold', 'bbox': [72.0, 60.5, 140.25, 74.0]}])
+
+
+def _put(cache, key, spans):
+    sections = [{'section_id': '1', 'level': 'H1', 'text': 'Heading'}]
+    vectors = np.ones((1, 4), dtype=np.float32)
+    return cache.put(key, spans, {'title': '', 'outline': []}, sections, vectors, [vectors])
+
+
+def test_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    assert _put(cache, 'k', _spans())
+    cached = cache.get('k')
+    assert cached['spans'].to_dicts() == _spans().to_dicts()
+    assert cached['sections'][0]['text'] == 'Heading'
+
+
+def test_unencodable_text_is_skipped_not_raised(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    assert not _put(cache, 'k', _spans('broken \ud800 surrogate'))
+    assert cache.get('k') is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_unwritable_directory_is_skipped_not_raised(tmp_path):
+    blocker = tmp_path / 'not-a-dir'
+    blocker.write_text('')
+    cache = ResultCache(str(blocker / 'cache'))
+    assert not _put(cache, 'k', _spans())
+    assert cache.stats()['stores'] == 0
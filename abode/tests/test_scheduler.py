@@ -0,0 +1,57 @@
+import asyncio
+import time
+from app import analysis
+from app import scheduler
+from app.scheduler import Deadline, StageCosts, split_by_cost
+
+
+def _costs(rate):
+    return StageCosts({"encode": rate, "summarize": rate})
+
+
+def test_split_by_cost_keeps_order_and_bounds_batches():
+    texts = ["a" * 100, "b" * 100, "c" * 250, "d" * 50, "e" * 50]
+    assert split_by_cost(texts, "summarize", seconds=2.0, costs=_costs(0.01)) == [[0, 1], [2], [3, 4]]
+    assert split_by_cost([], "summarize", costs=_costs(0.01)) == []
+
+
+def test_plan_summaries_spends_the_budget_in_order(monkeypatch):
+    monkeypatch.setattr(scheduler, "DEGRADED_TEXT_CHARS", 2000)
+    # 10 s deadline: 8 s of budget at 1 ms per character
+    deadline = Deadline(10, costs=_costs(0.001))
+    modes = deadline.plan_summaries(["x" * 4000, "y" * 4000, "z" * 4000, "w" * 3000])
+    # 4 s full, then 2 s truncated; the rest no longer fits even truncated
+    assert modes == ["full", "truncated", "lead", "lead"]
+    assert deadline.report() == [
+        {"degradation": "truncated_section_text", "sections": 1, "chars": 2000},
+        {"degradation": "lead_sentence_summaries", "sections": 2},
+    ]
+
+
+def test_plan_summaries_without_pressure_summarizes_everything():
+    deadline = Deadline(10, costs=_costs(1e-6))
+    assert deadline.plan_summaries(["x" * 4000] * 3) == ["full"] * 3
+    assert deadline.report() == []
+
+
+def test_summarize_batches_stops_submitting_at_the_deadline(monkeypatch):
+    submitted = []
+
+    def fake_summarize(texts, sentences_count):
+        time.sleep(0.2)
+        return [text.upper() for text in texts]
+
+    async def fake_run_cpu(fn, *args):
+        submitted.append(args[0])
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    monkeypatch.setattr(analysis, "summarize_sections", fake_summarize)
+    monkeypatch.setattr(analysis, "run_cpu", fake_run_cpu)
+    monkeypatch.setattr(analysis, "cpu_workers", lambda: 1)
+    monkeypatch.setattr(analysis, "split_by_cost", lambda texts, stage: [[i] for i in range(len(texts))])
+    texts = [f"text {i}" for i in range(10)]
+    results = asyncio.run(analysis.summarize_batches(texts, 2, Deadline(0.5)))
+    # Roughly two or three batches fit; the rest were never sent to the pool
+    assert 1 <= len(submitted) < 5
+    assert results[0] == "TEXT 0"
+    assert results[-1] is None
@@ -0,0 +1,36 @@
+import numpy as np
+from pdf_pipeline.span_table import SpanTable
+
+
+def _span(page, text, font='Helvetica', size=11.0, bold=False, bbox=(72.123456789, 100.5, 300.987654321, 112.25), **extra):
+    return {'page': page, 'text': text, 'font_name': font, 'font_size': size,
+            'font_weight': 'bold' if bold else 'normal', 'bbox': list(bbox) if bbox is not None else None, **extra}
+
+
+def test_dicts_round_trip_exactly():
+    spans = [_span(1, 'Title', 'Helvetica-Bold', 18.0, True), _span(1, 'Body'), _span(2, 'DOCX line', bbox=None)]
+    table = SpanTable.from_dicts(spans)
+    assert table.bbox.dtype == np.float64
+    # fitz coordinates come back unchanged, not rounded to float32
+    assert table.to_dicts() == spans
+    assert table[0]['bbox'][0] == 72.123456789
+
+
+def test_take_reorders_rows_with_their_text_and_extras():
+    spans = [_span(1, 'a'), _span(1, 'bb', style='Heading 1'), _span(2, 'ccc', bold=True)]
+    table = SpanTable.from_dicts(spans)
+    taken = table.take([2, 0])
+    assert [dict(span) for span in taken] == [dict(spans[2], style=None), dict(spans[0], style=None)]
+    assert taken.texts() == ['ccc', 'a']
+    assert len(table.take(np.empty(0, dtype=np.int64))) == 0
+
+
+def test_concat_merges_fonts_and_extra_columns():
+    first = SpanTable.from_dicts([_span(1, 'one', 'Times'), _span(1, 'two', 'Arial')])
+    second = SpanTable.from_dicts([_span(2, 'three', 'Arial', style='Title'), _span(2, 'four', 'Courier')])
+    merged = SpanTable.concat([first, SpanTable.from_dicts([]), second])
+    assert merged.texts() == ['one', 'two', 'three', 'four']
+    assert [span['font_name'] for span in merged] == ['Times', 'Arial', 'Arial', 'Courier']
+    assert merged.fonts == ['Times', 'Arial', 'Courier']
+    assert merged.extra == {'style': [None, None, 'Title', None]}
+    assert len(SpanTable.concat([])) == 0
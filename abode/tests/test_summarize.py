@@ -0,0 +1,49 @@
+import re
+import numpy as np
+import pytest
+from sumy.parsers.plaintext import PlaintextParser
+from sumy.summarizers.text_rank import TextRankSummarizer
+from pdf_pipeline import summarize
+from pdf_pipeline.summarize import MatrixTextRankSummarizer, summarize_section
+
+TEXTS = [
+    "The pipeline reads a PDF. It finds the headings. Headings split the PDF into sections. "
+    "Each section is summarized. The summaries are stored with the sections.",
+    "Revenue grew in the third quarter. Costs fell. Revenue and costs are reported per quarter. "
+    "The board approved the report. Growth is expected to continue next year.",
+    # Single-word sentences, repeated words and a sentence sharing nothing with the rest
+    "Yes. Yes yes. Cats chase mice. Dogs chase cats and cats chase mice. Zebra.",
+]
+
+
+class _Tokenizer:
+    """Regex stand-in for sumy's punkt tokenizer, which needs NLTK data."""
+    language = 'english'
+
+    def to_sentences(self, paragraph):
+        return [s for s in re.split(r'(?<=[.!?])\s+', paragraph) if s.strip()]
+
+    def to_words(self, sentence):
+        return re.findall(r"\w+", sentence)
+
+
+@pytest.fixture
+def tokenizer(monkeypatch):
+    tokenizer = _Tokenizer()
+    monkeypatch.setattr(summarize, '_tokenizer', tokenizer)
+    monkeypatch.setattr(summarize, '_summarizer', MatrixTextRankSummarizer())
+    return tokenizer
+
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_matrix_matches_sumy(tokenizer, text):
+    document = PlaintextParser.from_string(text, tokenizer).document
+    expected = TextRankSummarizer()._create_matrix(document)
+    np.testing.assert_allclose(MatrixTextRankSummarizer()._create_matrix(document), expected)
+
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_summaries_match_sumy(tokenizer, text):
+    document = PlaintextParser.from_string(text, tokenizer).document
+    expected = " ".join(str(sentence) for sentence in TextRankSummarizer()(document, 2))
+    assert summarize_section(text, 2) == expected
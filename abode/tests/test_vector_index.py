@@ -0,0 +1,39 @@
+import subprocess
+import sys
+import numpy as np
+from pdf_pipeline import vector_index
+from pdf_pipeline.vector_index import VectorIndex, get_index, update_index
+
+
+def test_save_records_model_and_load_restores_it(tmp_path):
+    path = str(tmp_path / 'sections.npz')
+    index = VectorIndex()
+    index.add('a.pdf', ['1', '2'], np.eye(2, 4))
+    index.save(path)
+    loaded = VectorIndex.load(path)
+    assert loaded.model == vector_index.model_hash()
+    assert loaded.search(np.array([1.0, 0, 0, 0]), k=1)[0][:2] == ('a.pdf', '1')
+
+
+def test_index_from_another_model_is_discarded(tmp_path):
+    path = str(tmp_path / 'sections.npz')
+    index = VectorIndex(model='other-model')
+    index.add('old.pdf', ['1'], np.ones((1, 8)))
+    index.save(path)
+    current = get_index(path)
+    assert len(current) == 0
+    assert current.needs_backfill
+    # New-dimension vectors can be added without clashing with the old ones
+    update_index('new.pdf', ['1'], np.ones((1, 16)), path=path)
+    assert VectorIndex.load(path).pdf_names == ['new.pdf']
+
+
+def test_updates_from_another_process_are_kept(tmp_path):
+    path = str(tmp_path / 'sections.npz')
+    update_index('a.pdf', ['1'], np.random.rand(1, 8), path=path)
+    code = ("import sys, numpy as np; sys.path.insert(0, sys.argv[1]);"
+            "from pdf_pipeline.vector_index import update_index;"
+            "update_index('b.pdf', ['1'], np.random.rand(1, 8), path=sys.argv[2])")
+    subprocess.run([sys.executable, '-c', code, sys.path[0], path], check=True)
+    update_index('c.pdf', ['1'], np.random.rand(1, 8), path=path)
+    assert sorted(VectorIndex.load(path).pdf_names) == ['a.pdf', 'b.pdf', 'c.pdf']